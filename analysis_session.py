@@ -0,0 +1,242 @@
+# analysis_session.py
+#
+# Инкрементальный анализ: сессия хранит результаты по парам TX×RX и по IM-продуктам
+# и при изменении сайта пересчитывает только затронутые строки (TX), столбцы (RX) и продукты.
+# Юниты сопоставляются по индексу в списке; изменённым считается юнит, у которого поменялся
+# отпечаток параметров (или который добавлен/удалён).
+
+import copy
+import json
+import hashlib
+import functools
+import threading
+import numpy as np
+from ems_matrix import ANTENNA_FILE, EMCMatrixResult, RESULT_FIELDS, analyze_site_matrix, unit_column
+from im_engine import RxWindowIndex, IMResult, generate_im_products, compute_im_levels
+
+# Ключи, не влияющие на расчёт
+IGNORED_KEYS = ('label',)
+
+BOOL_FIELDS = ('block_considered', 'block_passed', 'induced_considered', 'induced_passed', 'Pint_passed', 'valid')
+
+
+def _locked(method):
+    """Анализы сессии выполняются по одному (веб-приложение вызывает их из фоновых заданий, см. jobs.py)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def unit_fingerprint(unit):
+    data = {k: v for k, v in unit.items() if k not in IGNORED_KEYS}
+    raw = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def diff_units(old_fps, units):
+    """Индексы юнитов, отличающихся от старых отпечатков (включая добавленные), и новые отпечатки"""
+    fps = [unit_fingerprint(u) for u in units]
+    changed = [i for i, fp in enumerate(fps) if i >= len(old_fps) or old_fps[i] != fp]
+    return changed, fps
+
+
+def diff_sites(site_a, site_b):
+    """Что поменялось между двумя конфигурациями сайта (по индексам юнитов)"""
+    out = {}
+    for role in ('tx_list', 'rx_list'):
+        a, b = site_a.get(role, []), site_b.get(role, [])
+        changed, _ = diff_units([unit_fingerprint(u) for u in a], b)
+        out[role] = {
+            'changed': [i for i in changed if i < len(a)],
+            'added': list(range(len(a), len(b))),
+            'removed': list(range(len(b), len(a))),
+        }
+    return out
+
+
+class AnalysisSession:
+    """
+    Хранит результаты последнего анализа и пересчитывает только изменившееся.
+    После каждого вызова analyze_emc / analyze_im в self.stats — сколько результатов переиспользовано
+    и сколько пересчитано.
+    """
+
+    def __init__(self, antenna_file=ANTENNA_FILE):
+        self.antenna_file = antenna_file
+        self.stats = {}
+        self._emc_fps = ([], [])
+        self._emc_arrays = None
+        self._im_fps = ([], [])
+        self._im_options = None
+        self._im_levels = {}  # ключ продукта (order, i, j, k) -> уровни на всех RX
+        self._lock = threading.RLock()
+
+    def reset(self):
+        self.__init__(self.antenna_file)
+
+    # === ЭМС по парам ===
+    @_locked
+    def analyze_emc(self, tx_list, rx_list):
+        """Матрица ЭМС (EMCMatrixResult); пересчитываются строки изменённых TX и столбцы изменённых RX"""
+        tx_changed, tx_fps = diff_units(self._emc_fps[0], tx_list)
+        rx_changed, rx_fps = diff_units(self._emc_fps[1], rx_list)
+        n, m = len(tx_list), len(rx_list)
+        old = self._emc_arrays
+        if old is None:
+            tx_changed, rx_changed = list(range(n)), list(range(m))
+        tx_rest = [i for i in range(n) if i not in set(tx_changed)]
+
+        arrays = {key: np.full((n, m), False if key in BOOL_FIELDS else np.nan,
+                               dtype=bool if key in BOOL_FIELDS else float) for key in RESULT_FIELDS}
+        if old is not None:
+            kn, km = min(n, old['Pint'].shape[0]), min(m, old['Pint'].shape[1])
+            for key in RESULT_FIELDS:
+                arrays[key][:kn, :km] = old[key][:kn, :km]
+
+        recomputed = np.zeros((n, m), dtype=bool)
+        if tx_changed and m:
+            rows = analyze_site_matrix([tx_list[i] for i in tx_changed], rx_list, self.antenna_file)
+            for key in RESULT_FIELDS:
+                arrays[key][tx_changed, :] = rows[key]
+            recomputed[tx_changed, :] = True
+        if rx_changed and tx_rest:
+            cols = analyze_site_matrix([tx_list[i] for i in tx_rest], [rx_list[j] for j in rx_changed],
+                                       self.antenna_file)
+            for key in RESULT_FIELDS:
+                arrays[key][np.ix_(tx_rest, rx_changed)] = cols[key]
+            recomputed[np.ix_(tx_rest, rx_changed)] = True
+
+        self._emc_arrays = dict(arrays)
+        self._emc_fps = (tx_fps, rx_fps)
+        arrays['_block_limit'] = unit_column(rx_list, 'Freq_offset_block')
+
+        n_re = int(recomputed.sum())
+        self.stats['emc'] = {'tx_changed': tx_changed, 'rx_changed': rx_changed,
+                             'reused': n * m - n_re, 'recomputed': n_re}
+        return EMCMatrixResult([tx.get('device_name', '') for tx in tx_list],
+                               [rx.get('device_name', '') for rx in rx_list], arrays)
+
+    # === IM-продукты ===
+    @_locked
+    def analyze_im(self, tx_list, rx_list, tx_ids=None, orders=(3,), three_tone=False, only_hits=True):
+        """
+        IM-анализ (IMResult). Уровни продукта переиспользуются, если ни один его TX не изменился;
+        для них пересчитываются только столбцы изменённых RX. Смена опций — полный пересчёт.
+        """
+        options = (tuple(tx_ids) if tx_ids is not None else None, tuple(orders), three_tone, only_hits)
+        if options != self._im_options:
+            self._im_levels = {}
+            self._im_fps = ([], [])
+        tx_changed, tx_fps = diff_units(self._im_fps[0], tx_list)
+        rx_changed, rx_fps = diff_units(self._im_fps[1], rx_list)
+        old_m = len(self._im_fps[1])
+        tx_changed_set = set(tx_changed)
+        m = len(rx_list)
+
+        index = RxWindowIndex.from_units(tx_list, rx_list, tx_ids) if only_hits else None
+        products = generate_im_products(tx_list, tx_ids, orders, three_tone, index)
+        f_rx = unit_column(rx_list, 'frequency_mhz')[None, :]
+        delta_bw = 1.5 * (unit_column(tx_list, 'BW_khz')[products.i][:, None]
+                          + unit_column(rx_list, 'BW_khz')[None, :]) / 1000
+        delta_f = np.abs(products.freq[:, None] - f_rx)
+        if only_hits and len(products):
+            keep = np.any(delta_f < delta_bw, axis=1)
+            products, delta_f, delta_bw = products.subset(keep), delta_f[keep], delta_bw[keep]
+        keys = list(zip(products.order.tolist(), products.i.tolist(), products.j.tolist(), products.k.tolist()))
+
+        levels = np.full((len(products), m), np.nan)
+        full, partial = [], []
+        for n, key in enumerate(keys):
+            participants = {key[1], key[2], key[3]}
+            if key in self._im_levels and not (participants & tx_changed_set):
+                partial.append(n)
+            else:
+                full.append(n)
+
+        # продукты с изменившимися участниками — на всех RX
+        if full:
+            sub = products.subset(np.array(full))
+            levels[full, :] = compute_im_levels(sub, tx_list, rx_list, self.antenna_file)[0]
+        # остальные — переиспользуем, пересчитывая только изменившиеся RX
+        rx_re = [j for j in rx_changed if j < m]
+        rx_keep = [j for j in range(min(m, old_m)) if j not in set(rx_re)]
+        if partial:
+            for n in partial:
+                levels[n, rx_keep] = self._im_levels[keys[n]][rx_keep]
+            if rx_re:
+                sub = products.subset(np.array(partial))
+                levels[np.ix_(partial, rx_re)] = compute_im_levels(
+                    sub, tx_list, [rx_list[j] for j in rx_re], self.antenna_file)[0]
+
+        self._im_levels = {key: levels[n].copy() for n, key in enumerate(keys)}
+        self._im_fps = (tx_fps, rx_fps)
+        self._im_options = options
+
+        cells_re = len(full) * m + len(partial) * len(rx_re)
+        self.stats['im'] = {'tx_changed': tx_changed, 'rx_changed': rx_changed, 'products': len(products),
+                            'reused': len(products) * m - cells_re, 'recomputed': cells_re}
+
+        return IMResult(products, rx_list, levels, delta_f, delta_bw)
+
+    def summary(self):
+        """Короткая строка для UI: сколько переиспользовано / пересчитано"""
+        parts = []
+        for name, label in (('emc', 'ЕМС пари'), ('im', 'IM продукти×RX')):
+            st = self.stats.get(name)
+            if st:
+                parts.append(f"{label}: перераховано {st['recomputed']}, використано повторно {st['reused']}")
+        return "; ".join(parts)
+
+
+def compare_sites(site_a, site_b, device_file="DeviceDB.xlsx", antenna_file=ANTENNA_FILE, tolerance_db=0.01):
+    """
+    Оценка влияния изменения конфигурации: анализ site_a, затем инкрементально site_b.
+    Возвращает diff_sites, статистику пересчёта и список пар, у которых Pint изменился больше tolerance_db.
+    """
+    from site_loader import process_site
+    a = process_site(copy.deepcopy(site_a), device_file, antenna_file)
+    b = process_site(copy.deepcopy(site_b), device_file, antenna_file)
+
+    session = AnalysisSession(antenna_file)
+    before = session.analyze_emc(a['tx_list'], a['rx_list'])
+    after = session.analyze_emc(b['tx_list'], b['rx_list'])
+
+    impact = []
+    n = min(before.shape[0], after.shape[0])
+    m = min(before.shape[1], after.shape[1])
+    for i, j in zip(*np.nonzero(np.abs(after['Pint'][:n, :m] - before['Pint'][:n, :m]) > tolerance_db)):
+        impact.append({'tx': int(i), 'rx': int(j), 'Pint_before': float(before['Pint'][i, j]),
+                       'Pint_after': float(after['Pint'][i, j]),
+                       'passed_before': bool(before['Pint_passed'][i, j]),
+                       'passed_after': bool(after['Pint_passed'][i, j])})
+    return {'diff': diff_sites(site_a, site_b), 'stats': dict(session.stats['emc']), 'impact': impact,
+            'after': after}
+
+
+def load_site_file(path):
+    """Конфигурация сайта из .json или .py (переменная site, как в site_config.py)"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    import runpy
+    return runpy.run_path(path)['site']
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    import sys
+
+    if len(sys.argv) < 3:
+        print("Використання: python analysis_session.py site_a.(py|json) site_b.(py|json)")
+        sys.exit(1)
+    result = compare_sites(load_site_file(sys.argv[1]), load_site_file(sys.argv[2]))
+    for role, d in result['diff'].items():
+        print(f"🔁 {role}: змінено {d['changed']}, додано {d['added']}, видалено {d['removed']}")
+    st = result['stats']
+    print(f"♻️ Пари: перераховано {st['recomputed']}, використано повторно {st['reused']}")
+    for row in result['impact']:
+        mark = "✅" if row['passed_after'] else "❌"
+        print(f"{mark} TX #{row['tx'] + 1} → RX #{row['rx'] + 1}: Pint {row['Pint_before']:.2f} → {row['Pint_after']:.2f} dBm")
@@ -2,7 +2,10 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from instrumentation import counted, in_stage
+from polarization_loss import polarization_code
 
+@counted
 def load_antenna_pattern(file_path, sheet_name):
     """Загружает горизонтальную и вертикальную ДН из Excel"""
     df = pd.read_excel(file_path, sheet_name=sheet_name)
@@ -21,6 +24,7 @@ def load_antenna_pattern(file_path, sheet_name):
 
     return hor_df, vert_df
 
+@counted
 def load_antenna_pattern_with_info(file_path, sheet_name):
     """
     Загружает ДН (горизонтальную и вертикальную) и параметры антенны из Excel.
@@ -51,6 +55,78 @@ def load_antenna_pattern_with_info(file_path, sheet_name):
 
     return hor_df, vert_df, info
 
+# === Потоковое чтение всей книги ДН ===
+INFO_ROWS = 6
+AZIMUTH_HEADER = "Azimuth (°)"      # столбец A, данные — столбцы A:B ниже заголовка
+ELEVATION_HEADER = "Elevation (°)"  # столбец E, данные — столбцы E:F ниже заголовка
+
+
+def _cell_number(value):
+    """Число из ячейки как pd.to_numeric(errors='coerce'); None — не число"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+
+def _sheet_pattern(name, rows):
+    """
+    Разбор листа за один проход по строкам (кортежи значений): параметры из первых INFO_ROWS строк,
+    ДН по азимуту (A:B) и углу места (E:F) ниже своих заголовков — сразу в массивы NumPy.
+    Семантика та же, что у load_antenna_pattern_with_info.
+    """
+    info = {}
+    hor, vert = [], []
+    in_hor = in_vert = False
+    for n, row in enumerate(rows):
+        row = tuple(row) + (None,) * (6 - len(row))
+        if n < INFO_ROWS:
+            info[str(row[0]).strip()] = float('nan') if row[1] is None else row[1]
+        if in_hor:
+            az, att = _cell_number(row[0]), _cell_number(row[1])
+            if az is not None and att is not None:
+                hor.append((az, att))
+        elif row[0] == AZIMUTH_HEADER:
+            in_hor = True
+        if in_vert:
+            el, att = _cell_number(row[4]), _cell_number(row[5])
+            if el is not None and att is not None:
+                vert.append((el, att))
+        elif row[4] == ELEVATION_HEADER:
+            in_vert = True
+    if not (in_hor and in_vert):
+        raise ValueError(f"лист '{name}': не знайдено заголовки '{AZIMUTH_HEADER}' / '{ELEVATION_HEADER}'")
+    hor = np.array(hor, dtype=float).reshape(-1, 2)
+    vert = np.array(vert, dtype=float).reshape(-1, 2)
+    return AntennaPattern(name, hor[:, 0], hor[:, 1], vert[:, 0], vert[:, 1], info)
+
+
+@counted
+def load_antenna_library(file_path):
+    """
+    Все ДН книги AntennaDN.xlsx за один проход: openpyxl в режиме read-only, без DataFrame.
+    Возвращает {имя листа: AntennaPattern} в порядке листов; листы без таблиц ДН пропускаются с предупреждением.
+    """
+    import openpyxl
+    from diagnostics import get_logger
+
+    library = {}
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            try:
+                library[ws.title] = _sheet_pattern(ws.title, ws.iter_rows(max_col=6, values_only=True))
+            except ValueError as e:
+                get_logger(__name__).warning("⚠️ %s: %s", file_path, e)
+    finally:
+        wb.close()
+    return library
+
+@counted
 def interpolate_gain(df, angle, angle_col):
     """
     Интерполирует ослабление по направлению.
@@ -71,6 +147,133 @@ def interpolate_gain(df, angle, angle_col):
 
     return float(np.interp(angle, angles, gains))
 
+# Шаг таблиц (LUT) для ДН, градусы. Меняется через set_lut_resolution().
+LUT_RESOLUTION_DEG = 0.1
+
+
+def set_lut_resolution(resolution_deg):
+    """Задаёт шаг LUT; таблицы у уже загруженных ДН перестроятся при следующем обращении"""
+    global LUT_RESOLUTION_DEG
+    LUT_RESOLUTION_DEG = float(resolution_deg)
+
+
+class GainLUT:
+    """
+    Таблица ослабления на равномерной сетке start, start+step, ...
+    Чтение — O(1): индекс ячейки + линейная интерполяция между соседними узлами
+    (mode='nearest' — без интерполяции, ближайший узел).
+    """
+    __slots__ = ('start', 'step', 'values', 'mode')
+
+    def __init__(self, start, step, values, mode='linear'):
+        self.start = float(start)
+        self.step = float(step)
+        self.values = np.asarray(values, dtype=float)
+        self.mode = mode
+
+    def __call__(self, angle):
+        pos = (np.asarray(angle, dtype=float) - self.start) / self.step
+        last = len(self.values) - 1
+        finite = np.isfinite(pos)
+        # за пределами таблицы — крайние значения, как np.interp; NaN/inf — временно узел 0, в ответе NaN
+        pos = np.where(finite, np.clip(pos, 0, last), 0)
+        if self.mode == 'nearest':
+            out = self.values[np.rint(pos).astype(np.intp)]
+        else:
+            idx = np.minimum(pos.astype(np.intp), last - 1) if last > 0 else np.zeros_like(pos, dtype=np.intp)
+            frac = pos - idx
+            nxt = np.minimum(idx + 1, last)
+            out = self.values[idx] * (1 - frac) + self.values[nxt] * frac
+        return out if finite.all() else np.where(finite, out, np.nan)
+
+
+class AntennaPattern:
+    """
+    ДН антенны в виде массивов NumPy (без DataFrame) + параметры из шапки листа.
+    Азимутальная ДН хранится сразу «развёрнутой» на 720°, чтобы не склеивать её при каждом вызове.
+    Для расчётов ДН заранее переводится в LUT с шагом LUT_RESOLUTION_DEG.
+    """
+    __slots__ = ('name', 'azimuth_deg', 'azimuth_att', 'elevation_deg', 'elevation_att', 'info', 'polarization_code',
+                 '_az_wrap', '_az_att_wrap', '_az_lut', '_el_lut', '_lut_resolution')
+
+    def __init__(self, name, azimuth_deg, azimuth_att, elevation_deg, elevation_att, info=None):
+        self.name = name
+        self.azimuth_deg = np.asarray(azimuth_deg, dtype=float)
+        self.azimuth_att = np.asarray(azimuth_att, dtype=float)
+        self.elevation_deg = np.asarray(elevation_deg, dtype=float)
+        self.elevation_att = np.asarray(elevation_att, dtype=float)
+        self.info = info or {}
+        self.polarization_code = polarization_code(self.info.get('Polarisation', 'вертик'), source=name)
+        self._az_wrap = np.concatenate([self.azimuth_deg, self.azimuth_deg + 360])
+        self._az_att_wrap = np.concatenate([self.azimuth_att, self.azimuth_att])
+        self._lut_resolution = None
+
+    def build_luts(self, resolution_deg=None):
+        """Строит LUT по азимуту [0, 360] и по углу места [min, max] из исходной ДН"""
+        step = float(resolution_deg or LUT_RESOLUTION_DEG)
+        az_grid = np.linspace(0, 360, int(round(360 / step)) + 1)
+        self._az_lut = GainLUT(0, az_grid[1] - az_grid[0], self.azimuth_gain_exact(az_grid))
+        el_lo, el_hi = float(self.elevation_deg.min()), float(self.elevation_deg.max())
+        n_el = max(int(round((el_hi - el_lo) / step)), 1) + 1
+        el_grid = np.linspace(el_lo, el_hi, n_el)
+        el_step = el_grid[1] - el_grid[0] if n_el > 1 else 1.0
+        self._el_lut = GainLUT(el_lo, el_step, self.elevation_gain_exact(el_grid))
+        self._lut_resolution = step
+
+    def _luts(self):
+        if self._lut_resolution != LUT_RESOLUTION_DEG:
+            self.build_luts()
+        return self._az_lut, self._el_lut
+
+    def azimuth_gain(self, angle):
+        """Ослабление по азимуту (дБ) из LUT, angle — скаляр или массив"""
+        g = self._luts()[0](np.mod(angle, 360))
+        return float(g) if np.ndim(g) == 0 else g
+
+    def elevation_gain(self, angle):
+        """Ослабление по углу места (дБ) из LUT, angle — скаляр или массив"""
+        g = self._luts()[1](angle)
+        return float(g) if np.ndim(g) == 0 else g
+
+    def azimuth_gain_exact(self, angle):
+        """Ослабление по азимуту прямой интерполяцией исходной ДН (как interpolate_gain)"""
+        g = np.interp(np.mod(angle, 360), self._az_wrap, self._az_att_wrap)
+        return float(g) if np.ndim(g) == 0 else g
+
+    def elevation_gain_exact(self, angle):
+        """Ослабление по углу места прямой интерполяцией исходной ДН (как interpolate_gain)"""
+        g = np.interp(angle, self.elevation_deg, self.elevation_att)
+        return float(g) if np.ndim(g) == 0 else g
+
+    def lut_error(self, resolution_deg=None, probe_step=0.01):
+        """
+        Погрешность LUT относительно прямой интерполяции на сетке с шагом probe_step.
+        Возвращает {'azimuth': (max, rms), 'elevation': (max, rms)} в дБ.
+        """
+        if resolution_deg is not None and resolution_deg != self._lut_resolution:
+            self.build_luts(resolution_deg)
+        else:
+            self._luts()
+        az = np.arange(0, 360, probe_step)
+        el = np.arange(self.elevation_deg.min(), self.elevation_deg.max(), probe_step)
+        err_az = self._az_lut(az) - self.azimuth_gain_exact(az)
+        err_el = self._el_lut(el) - self.elevation_gain_exact(el)
+        stats = lambda e: (float(np.max(np.abs(e))), float(np.sqrt(np.mean(e ** 2)))) if len(e) else (0.0, 0.0)
+        return {'azimuth': stats(err_az), 'elevation': stats(err_el)}
+
+    def to_frames(self):
+        """Обратное преобразование в hor_df, vert_df (для графиков)"""
+        hor_df = pd.DataFrame({'azimuth_deg': self.azimuth_deg, 'attenuation_db': self.azimuth_att})
+        vert_df = pd.DataFrame({'elevation_deg': self.elevation_deg, 'attenuation_db': self.elevation_att})
+        return hor_df, vert_df
+
+
+def pattern_from_frames(name, hor_df, vert_df, info=None):
+    return AntennaPattern(name,
+                          hor_df['azimuth_deg'].values, hor_df['attenuation_db'].values,
+                          vert_df['elevation_deg'].values, vert_df['attenuation_db'].values,
+                          info)
+
 def auto_scale(ax, data, title):
     min_val = np.min(data)
     max_val = 0.5
@@ -82,6 +285,7 @@ def auto_scale(ax, data, title):
     ax.set_title(title)
     ax.grid(True)
 
+@in_stage("plotting")
 def plot_antenna_patterns(hor_df, vert_df, sheet_name=""):
     plt.close('all')
     angles_hor = np.deg2rad(hor_df['azimuth_deg'].values)
@@ -111,3 +315,19 @@ def plot_antenna_patterns(hor_df, vert_df, sheet_name=""):
    # plt.show()
 
 
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    # Отчёт о погрешности LUT: python antenna_utils.py [AntennaDN.xlsx] [шаг, °]
+    import sys
+    from pattern_cache import get_antenna_pattern, load_antenna_names
+
+    file_path = sys.argv[1] if len(sys.argv) > 1 else "AntennaDN.xlsx"
+    resolution = float(sys.argv[2]) if len(sys.argv) > 2 else LUT_RESOLUTION_DEG
+    print(f"Погрешність LUT (крок {resolution}°) відносно interpolate_gain, дБ:")
+    for name in load_antenna_names(file_path):
+        err = get_antenna_pattern(file_path, name).lut_error(resolution)
+        print(f"  {name:20s}  азимут: max {err['azimuth'][0]:.2e}, rms {err['azimuth'][1]:.2e}   "
+              f"кут місця: max {err['elevation'][0]:.2e}, rms {err['elevation'][1]:.2e}")
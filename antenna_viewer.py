@@ -7,6 +7,7 @@ from site_config import site
 from site_loader import process_site
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 import matplotlib.ticker as mticker
+from instrumentation import in_stage
 
 
 class SmartFormatter(mticker.Formatter):
@@ -85,10 +86,8 @@ def check_antenna_position(ant, mast_size):
     return warnings
 
 
-def visualize_all_antennas(tx_list, rx_list, mast_size=(5, 5, 50), show=True, print_warnings=False):
-    fig = plt.figure()
-    ax = fig.add_subplot(111, projection='3d')
-
+def draw_scene(ax, tx_list, rx_list, mast_size=(5, 5, 50)):
+    """Мачта, антенны TX/RX, подписи и пределы осей на 3D-оси ax. Возвращает предупреждения по позициям."""
     draw_mast(ax, *mast_size)
 
     all_warnings = []
@@ -139,6 +138,15 @@ def visualize_all_antennas(tx_list, rx_list, mast_size=(5, 5, 50), show=True, pr
     leg = ax.legend(fontsize=8)
     for t in leg.get_texts():
         t.set_fontweight('bold')
+    return all_warnings
+
+
+@in_stage("plotting")
+def visualize_all_antennas(tx_list, rx_list, mast_size=(5, 5, 50), show=True, print_warnings=False):
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection='3d')
+
+    all_warnings = draw_scene(ax, tx_list, rx_list, mast_size)
 
     plt.tight_layout()
 
@@ -0,0 +1,273 @@
+# batch_runner.py
+#
+# Пакетный анализ многих сайтов: каталог файлов конфигурации (JSON/YAML, схема как site_config.site)
+# обрабатывается в пуле процессов. Каталог устройств и ДН антенн загружаются один раз в главном процессе
+# и передаются воркерам при старте пула.
+#
+# Результаты:
+#   <out>/sites/<файл>.pairs.<fmt> — матрица ЭМС сайта (одна строка на пару TX→RX); <файл> — имя с расширением
+#   <out>/sites/<файл>.im.<fmt>    — IM-продукты, попадающие в полосу RX
+#   <out>/summary.<fmt>            — сводка по всем сайтам
+#   <out>/all_pairs.<fmt>          — все пары всех сайтов
+#   <out>/batch_state.jsonl        — журнал выполненных сайтов; при повторном запуске они пропускаются,
+#                                    если не изменились файл сайта, опции, формат и книги каталога
+#
+# Использование:
+#   python batch_runner.py sites/ -o batch_out [--format csv|parquet] [--workers N] [--orders 3 5] [--three-tone]
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import contextlib
+import io
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from device_catalog import load_device_catalog
+from pattern_cache import PATTERN_CACHE, get_antenna_pattern, load_antenna_names
+from catalog_registry import file_state
+import instrumentation
+
+SITE_EXTENSIONS = ('.json', '.yaml', '.yml')
+STATE_FILE = "batch_state.jsonl"
+
+# Каталоги, переданные воркеру при старте пула
+_worker = {}
+
+
+def load_site_file(path):
+    """Конфигурация сайта из JSON или YAML"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            return json.load(f)
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("Для файлів YAML потрібен пакет PyYAML (pip install pyyaml)")
+        return yaml.safe_load(f)
+
+
+def find_site_files(directory):
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.lower().endswith(SITE_EXTENSIONS))
+
+
+def site_key(path, options):
+    """Ключ выполненной задачи: содержимое файла + опции анализа (в т.ч. формат и состояние книг каталога)"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        h.update(f.read())
+    h.update(json.dumps(options, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def site_table_path(out_dir, path, kind, fmt):
+    """
+    Таблица сайта: <out>/sites/<файл>.<kind>.<fmt> (kind — 'pairs' или 'im').
+    Имя файла — с расширением, чтобы a.json и a.yaml из одного каталога не перезаписывали таблицы друг друга.
+    """
+    return os.path.join(out_dir, 'sites', f"{os.path.basename(path)}.{kind}.{fmt}")
+
+
+def write_table(df, path, fmt):
+    """Атомарная запись таблицы (временный файл + os.replace)"""
+    tmp = path + ".tmp"
+    if fmt == 'parquet':
+        df.to_parquet(tmp, index=False)
+    else:
+        df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def read_table(path, fmt):
+    import pandas as pd
+    return pd.read_parquet(path) if fmt == 'parquet' else pd.read_csv(path)
+
+
+def _init_worker(catalog, patterns, antenna_file, profile=False):
+    """Старт воркера: готовые каталог устройств и ДН антенн кладутся в кэши процесса"""
+    from diagnostics import set_quiet
+    set_quiet(True)
+    if profile:
+        instrumentation.enable()
+    _worker['catalog'] = catalog
+    _worker['antenna_file'] = antenna_file
+    path = os.path.abspath(antenna_file)
+    mtime = os.stat(path).st_mtime_ns
+    PATTERN_CACHE.maxsize = max(PATTERN_CACHE.maxsize, len(patterns))
+    for name, pattern in patterns.items():
+        PATTERN_CACHE.put((path, mtime, name), pattern)
+
+
+def analyze_site(site, catalog, antenna_file, orders=(3,), three_tone=False):
+    """
+    Анализ одного сайта: матрица ЭМС + IM-продукты.
+    Возвращает (сводка dict, DataFrame пар, DataFrame IM-попаданий).
+    """
+    from site_loader import process_site
+    from ems_matrix import analyze_site_matrix
+    from im_engine import analyze_im_site
+    from interference_aggregate import aggregate_interference
+
+    site = process_site(site, catalog, antenna_file)
+    tx_list, rx_list = site['tx_list'], site['rx_list']
+
+    matrix = analyze_site_matrix(tx_list, rx_list, antenna_file)
+    pairs = matrix.to_dataframe()
+
+    im = analyze_im_site(tx_list, rx_list, orders=orders, three_tone=three_tone, antenna_file=antenna_file)
+    im_df = im.to_dataframe()
+    im_df = im_df[im_df['in_band']].reset_index(drop=True)
+
+    valid = matrix['valid']
+    margin = np.where(valid, matrix['threshold'] - matrix['Pint'], np.nan)
+    aggregate = aggregate_interference(tx_list, rx_list, antenna_file, matrix=matrix, im=im)
+    summary = {
+        'n_tx': len(tx_list),
+        'n_rx': len(rx_list),
+        'pairs': int(valid.sum()),
+        'pint_violations': int(np.count_nonzero(valid & ~matrix['Pint_passed'])),
+        'block_violations': int(np.count_nonzero(matrix['block_considered'] & ~matrix['block_passed'])),
+        'induced_violations': int(np.count_nonzero(matrix['induced_considered'] & ~matrix['induced_passed'])),
+        'im_products': len(im.products),
+        'im_hits': int(np.count_nonzero(im.in_band & im.exceeds)),
+        'worst_margin_db': float(np.nanmin(margin)) if np.any(valid) else None,
+        'aggregate_violations': int(np.count_nonzero(~aggregate.passed)),
+        'aggregate_only_violations': int(np.count_nonzero(aggregate.aggregate_only)),
+        'worst_aggregate_margin_db': float(np.min(aggregate.margin_db)) if len(rx_list) else None,
+    }
+    return summary, pairs, im_df
+
+
+def _run_site(path, out_dir, fmt, options):
+    """Задача воркера: анализ файла сайта и запись его таблиц. Ошибки возвращаются в сводке."""
+    start = time.time()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    row = {'file': os.path.basename(path), 'site': stem, 'status': 'ok', 'error': ''}
+    stderr = io.StringIO()
+    instrumentation.reset()
+    try:
+        site = load_site_file(path)
+        row['site'] = site.get('name', stem)
+        with contextlib.redirect_stderr(stderr):
+            summary, pairs, im_df = analyze_site(site, _worker['catalog'], _worker['antenna_file'],
+                                                 tuple(options['orders']), options['three_tone'])
+        row.update(summary)
+        write_table(pairs, site_table_path(out_dir, path, 'pairs', fmt), fmt)
+        write_table(im_df, site_table_path(out_dir, path, 'im', fmt), fmt)
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = "; ".join(str(e).splitlines()) or type(e).__name__  # SiteValidationError — все ошибки сайта
+    row['elapsed_s'] = round(time.time() - start, 3)
+    if instrumentation.enabled():
+        row['_profile'] = instrumentation.report()
+    return row
+
+
+def load_state(out_dir):
+    """Выполненные сайты из журнала: ключ -> строка сводки"""
+    done = {}
+    path = os.path.join(out_dir, STATE_FILE)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # оборванная последняя строка после прерывания
+                done[entry['key']] = entry['row']
+    return done
+
+
+def run_batch(site_dir, out_dir, fmt='csv', workers=None, orders=(3,), three_tone=False, resume=True,
+              device_file="DeviceDB.xlsx", antenna_file="AntennaDN.xlsx", progress=None, profile=False):
+    """
+    Анализ всех сайтов каталога. Возвращает DataFrame сводки.
+    progress(n_done, n_total, row) вызывается после каждого сайта.
+    profile=True — счётчики instrumentation из воркеров суммируются в главном процессе.
+    """
+    import pandas as pd
+
+    os.makedirs(os.path.join(out_dir, 'sites'), exist_ok=True)
+    options = {'orders': sorted(orders), 'three_tone': bool(three_tone)}
+    # формат и (mtime_ns, размер) книг входят в ключ: иначе повторный запуск в другом формате или после
+    # правки каталога пропустил бы сайты и оставил таблицы, которых нет / которые устарели
+    key_options = dict(options, format=fmt, device_file=file_state(device_file), antenna_file=file_state(antenna_file))
+    files = find_site_files(site_dir)
+    keys = {path: site_key(path, key_options) for path in files}
+
+    state_path = os.path.join(out_dir, STATE_FILE)
+    if not resume and os.path.exists(state_path):
+        os.remove(state_path)
+    done = load_state(out_dir)
+    # выполненный сайт повторяется, если его таблица пар пропала
+    todo = [path for path in files
+            if keys[path] not in done or not os.path.exists(site_table_path(out_dir, path, 'pairs', fmt))]
+
+    if todo:
+        catalog = load_device_catalog(device_file)
+        patterns = {name: get_antenna_pattern(antenna_file, name) for name in load_antenna_names(antenna_file)}
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker,
+                                 initargs=(catalog, patterns, antenna_file, profile)) as pool, \
+                open(state_path, 'a', encoding='utf-8') as state:
+            futures = {pool.submit(_run_site, path, out_dir, fmt, options): path for path in todo}
+            for n, fut in enumerate(as_completed(futures), 1):
+                path = futures[fut]
+                row = fut.result()
+                if '_profile' in row:
+                    instrumentation.merge(row.pop('_profile'))
+                done[keys[path]] = row
+                if row['status'] == 'ok':  # сайты с ошибкой повторяются при следующем запуске
+                    state.write(json.dumps({'key': keys[path], 'row': row}, ensure_ascii=False) + "\n")
+                    state.flush()
+                if progress:
+                    progress(len(files) - len(todo) + n, len(files), row)
+
+    rows = [done[keys[path]] for path in files]
+    summary = pd.DataFrame(rows)
+    write_table(summary, os.path.join(out_dir, f"summary.{fmt}"), fmt)
+
+    parts = []
+    for path, row in zip(files, rows):
+        pairs_file = site_table_path(out_dir, path, 'pairs', fmt)
+        if row['status'] == 'ok' and os.path.exists(pairs_file):
+            df = read_table(pairs_file, fmt)
+            df.insert(0, 'site', row['site'])
+            parts.append(df)
+    if parts:
+        write_table(pd.concat(parts, ignore_index=True), os.path.join(out_dir, f"all_pairs.{fmt}"), fmt)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетний аналіз ЕМС для каталогу файлів сайтів (JSON/YAML)")
+    parser.add_argument("site_dir")
+    parser.add_argument("-o", "--output", default="batch_out")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--orders", type=int, nargs="+", default=[3])
+    parser.add_argument("--three-tone", action="store_true")
+    parser.add_argument("--no-resume", action="store_true", help="не пропускати вже оброблені сайти")
+    parser.add_argument("--device-file", default="DeviceDB.xlsx")
+    parser.add_argument("--antenna-file", default="AntennaDN.xlsx")
+    parser.add_argument("--profile", action="store_true", help="лічильники та час етапів (instrumentation)")
+    args = parser.parse_args()
+    if args.profile:
+        instrumentation.enable()
+
+    def report(n, total, row):
+        mark = "✅" if row['status'] == 'ok' else "❌"
+        detail = f"{row.get('pint_violations', 0)} Pint, {row.get('im_hits', 0)} IM" if row['status'] == 'ok' \
+            else row['error']
+        print(f"{mark} [{n}/{total}] {row['file']}: {detail} ({row['elapsed_s']:.2f} s)")
+
+    summary = run_batch(args.site_dir, args.output, args.format, args.workers, tuple(args.orders),
+                        args.three_tone, not args.no_resume, args.device_file, args.antenna_file, progress=report,
+                        profile=args.profile)
+    n_err = int((summary['status'] != 'ok').sum()) if len(summary) else 0
+    print(f"📊 Сайтів: {len(summary)}, з помилками: {n_err}. Результати: {args.output}")
+    if args.profile:
+        print(instrumentation.format_report())
+    sys.exit(1 if n_err else 0)
@@ -0,0 +1,280 @@
+# benchmark.py
+#
+# Бенчмарк этапов анализа на синтетических сайтах из реальных записей DeviceDB.xlsx / AntennaDN.xlsx.
+# Для каждого размера сайта (число юнитов, TX + RX) замеряются отдельно:
+#   catalog_load  — загрузка каталога устройств и ДН антенн (холодные кэши)
+#   validation    — process_site
+#   emc_matrix    — analyze_site_matrix (все пары)
+#   emc_scalar    — analyze_tx_to_rx на выборке пар (время на пару, для сравнения с матрицей)
+#   im_search     — analyze_im_site по всем RX (блоками по IM_RX_BLOCK)
+#   plotting      — visualize_all_antennas + PNG
+#   pdf_export    — отчёты по первому RX + build_pdf_report
+# и пиковая память (tracemalloc на этап, ru_maxrss на процесс). Результат — JSON для сравнения между запусками.
+#
+# Использование:
+#   python benchmark.py [--sizes 5 50 200 1000 2000] [--repeat 3] [-o bench.json] [--compare old.json]
+
+import io
+import sys
+import contextlib
+import copy
+import json
+import time
+import random
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+DEFAULT_SIZES = (5, 20, 50, 200, 500, 1000, 2000)
+STAGES = ('catalog_load', 'validation', 'emc_matrix', 'emc_scalar', 'im_search', 'plotting', 'pdf_export')
+SCALAR_SAMPLE = 200  # пар для emc_scalar
+IM_RX_BLOCK = 16     # RX на один вызов analyze_im_site (матрица продуктов P×M растёт как N² × M)
+
+
+def synthetic_site(n_units, device_file="DeviceDB.xlsx", antenna_file="AntennaDN.xlsx", tx_fraction=0.5,
+                   mast_size=(10, 10, 60), seed=0):
+    """
+    Синтетический сайт из n_units юнитов: реальные устройства, частоты на сетке BW внутри Freq Min/Max,
+    антенна подбирается по рабочему диапазону, позиции — на гранях мачты без совпадений.
+    """
+    from device_catalog import load_device_catalog
+    from pattern_cache import get_antenna_pattern, load_antenna_names
+
+    rng = random.Random(seed)
+    catalog = load_device_catalog(device_file)
+    antennas = [get_antenna_pattern(antenna_file, name).info for name in load_antenna_names(antenna_file)]
+
+    def antennas_for(freq):
+        names = [a['Name'] for a in antennas if a.get('Freq Min (MHz)', 0) <= freq <= a.get('Freq Max (MHz)', 0)]
+        return names or [a['Name'] for a in antennas]
+
+    n_tx = max(1, int(round(n_units * tx_fraction)))
+    n_rx = max(1, n_units - n_tx)
+    w, d, h = mast_size
+    faces = ((0, d / 2 + 0.5, 0), (w / 2 + 0.5, 0, 90), (0, -d / 2 - 0.5, 180), (-w / 2 - 0.5, 0, 270))
+
+    used = set()
+    tx_list, rx_list = [], []
+    for n in range(n_tx + n_rx):
+        role = 'tx' if n < n_tx else 'rx'
+        record = rng.choice(list(catalog))
+        step = min(record.bw_options) / 1000
+        freq = round(record.freq_min + step * rng.randrange(int((record.freq_max - record.freq_min) / step) + 1), 6)
+        while True:
+            x, y, az = rng.choice(faces)
+            pos = (round(x + rng.uniform(-w / 2, w / 2) * (x == 0), 2),
+                   round(y + rng.uniform(-d / 2, d / 2) * (y == 0), 2),
+                   round(rng.uniform(1, h), 2))
+            if pos not in used:
+                used.add(pos)
+                break
+        unit = {
+            'device_name': record.name,
+            'antenna_name': rng.choice(antennas_for(freq)),
+            'frequency_mhz': freq,
+            'BW_khz': rng.choice(record.bw_options),
+            'azimuth': float((az + rng.choice((-45, 0, 45))) % 360),
+            'elevation': 0,
+            'coords': pos,
+            'loss': round(rng.uniform(1, 4), 1),
+        }
+        if role == 'tx':
+            unit['power_dbm'] = round(rng.uniform(record.tx_power_min, record.tx_power_max), 1)
+            tx_list.append(unit)
+        else:
+            if record.rx_sensitivity_default is not None:
+                unit['sensitivity_dbm'] = record.rx_sensitivity_default
+            rx_list.append(unit)
+    return {'name': f"synthetic_{n_units}", 'tx_list': tx_list, 'rx_list': rx_list}
+
+
+def _measure(func, repeat, trace_memory):
+    """(минимальное время, с; пиковая память tracemalloc, байт; результат последнего вызова)"""
+    times, peak, result = [], None, None
+    for _ in range(repeat):
+        if trace_memory:
+            tracemalloc.start()
+        t0 = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t0)
+        if trace_memory:
+            peak = max(peak or 0, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return min(times), peak, result
+
+
+def run_size(n_units, device_file="DeviceDB.xlsx", antenna_file="AntennaDN.xlsx", repeat=1, trace_memory=True,
+             im_orders=(3,), three_tone=False, stages=STAGES, seed=0):
+    """Замеры всех этапов для одного синтетического сайта"""
+    import device_catalog
+    from device_catalog import load_device_catalog
+    from pattern_cache import PATTERN_CACHE, LIBRARY_CACHE, get_antenna_pattern, load_antenna_names
+    from site_loader import process_site
+    from ems_matrix import analyze_site_matrix
+    from ems_local_analyzer import analyze_tx_to_rx, format_ems_result
+    from im_engine import analyze_im_site
+    from im3_analyzer import format_im_report
+
+    site = synthetic_site(n_units, device_file, antenna_file, seed=seed)
+    out = {'units': n_units, 'n_tx': len(site['tx_list']), 'n_rx': len(site['rx_list']), 'stages': {}}
+
+    def record(stage, func, **extra):
+        if stage not in stages:
+            return None
+        seconds, peak, result = _measure(func, repeat, trace_memory)
+        out['stages'][stage] = dict({'seconds': seconds, 'peak_bytes': peak}, **extra)
+        return result
+
+    def load_catalog():
+        device_catalog._CATALOG_CACHE.clear()
+        PATTERN_CACHE.clear()
+        LIBRARY_CACHE.clear()
+        load_device_catalog(device_file)
+        for name in load_antenna_names(antenna_file):
+            get_antenna_pattern(antenna_file, name)
+
+    record('catalog_load', load_catalog)
+    catalog = load_device_catalog(device_file)
+
+    processed = record('validation', lambda: process_site(copy.deepcopy(site), catalog, antenna_file))
+    if processed is None:
+        processed = process_site(copy.deepcopy(site), catalog, antenna_file)
+    tx_list, rx_list = processed['tx_list'], processed['rx_list']
+
+    matrix = record('emc_matrix', lambda: analyze_site_matrix(tx_list, rx_list, antenna_file),
+                    pairs=len(tx_list) * len(rx_list))
+
+    rng = random.Random(seed)
+    sample = [(rng.randrange(len(tx_list)), rng.randrange(len(rx_list)))
+              for _ in range(min(SCALAR_SAMPLE, len(tx_list) * len(rx_list)))]
+
+    def scalar_pairs():
+        for i, j in sample:
+            try:
+                analyze_tx_to_rx(tx_list[i], rx_list[j])
+            except ValueError:
+                pass  # нулевое расстояние
+
+    record('emc_scalar', scalar_pairs, pairs=len(sample))
+    if 'emc_scalar' in out['stages'] and sample:
+        stage = out['stages']['emc_scalar']
+        stage['seconds_per_pair'] = stage['seconds'] / len(sample)
+
+    def im_search():
+        products = hits = 0
+        for b in range(0, len(rx_list), IM_RX_BLOCK):
+            im = analyze_im_site(tx_list, rx_list[b:b + IM_RX_BLOCK], orders=im_orders, three_tone=three_tone,
+                                 antenna_file=antenna_file)
+            products += len(im.products)
+            hits += int(np.count_nonzero(im.in_band & im.exceeds))
+        return products, hits
+
+    counts = record('im_search', im_search)
+    if counts is not None:
+        out['stages']['im_search'].update(products=counts[0], hits=counts[1])
+
+    def plot():
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from antenna_viewer import visualize_all_antennas
+        with contextlib.redirect_stdout(io.StringIO()):  # draw_antenna печатает каждую антенну
+            fig = visualize_all_antennas(tx_list, rx_list, mast_size=(10, 10, 60), show=False)
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=100)
+        plt.close(fig)
+        return buf.getvalue()
+
+    record('plotting', plot)
+
+    def export_pdf():
+        from pdf_report import build_pdf_report
+        rx = rx_list[0]
+        m = matrix if matrix is not None else analyze_site_matrix(tx_list, [rx], antenna_file)
+        ems_text = "\n\n".join(format_ems_result(m.pair(i, 0), tx_index=i, rx=rx) for i in range(len(tx_list))
+                               if m['valid'][i, 0])
+        im = analyze_im_site(tx_list, [rx], orders=im_orders, three_tone=three_tone, antenna_file=antenna_file)
+        im_text = format_im_report(rx, 0, im.products, im.levels[:, 0], show_levels=True)
+        return build_pdf_report(tx_list, rx, im_text, ems_text)
+
+    pdf = record('pdf_export', export_pdf)
+    if pdf is not None:
+        out['stages']['pdf_export']['pdf_bytes'] = len(pdf)
+    return out
+
+
+def peak_rss_bytes():
+    """Пиковый RSS процесса (ru_maxrss: КБ в Linux, байты в macOS)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, repeat=1, trace_memory=True, stages=STAGES, progress=None, **kwargs):
+    """Бенчмарк по всем размерам. Возвращает dict, готовый для json.dump."""
+    from diagnostics import set_quiet
+    set_quiet(True)
+    results = []
+    for n in sizes:
+        res = run_size(n, repeat=repeat, trace_memory=trace_memory, stages=stages, **kwargs)
+        res['peak_rss_bytes'] = peak_rss_bytes()
+        results.append(res)
+        if progress:
+            progress(res)
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'trace_memory': trace_memory,
+        'results': results,
+    }
+
+
+def compare(old, new, threshold=0.2):
+    """Этапы, ставшие медленнее больше чем на threshold (доля): [(юниты, этап, было, стало)]"""
+    old_by_size = {r['units']: r['stages'] for r in old['results']}
+    slower = []
+    for r in new['results']:
+        for stage, data in r['stages'].items():
+            before = old_by_size.get(r['units'], {}).get(stage)
+            if before and before['seconds'] > 0 and data['seconds'] > before['seconds'] * (1 + threshold):
+                slower.append((r['units'], stage, before['seconds'], data['seconds']))
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк етапів аналізу на синтетичних сайтах")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--no-tracemalloc", action="store_true", help="без tracemalloc (точніші часи)")
+    parser.add_argument("--orders", type=int, nargs="+", default=[3])
+    parser.add_argument("--three-tone", action="store_true")
+    parser.add_argument("-o", "--output", default="benchmark.json")
+    parser.add_argument("--compare", default=None, help="попередній JSON для порівняння")
+    args = parser.parse_args()
+
+    def report(res):
+        parts = [f"{stage} {data['seconds'] * 1000:.1f} ms" for stage, data in res['stages'].items()]
+        print(f"⏱ {res['units']} юнітів ({res['n_tx']} TX × {res['n_rx']} RX): " + ", ".join(parts))
+
+    data = run_benchmark(args.sizes, args.repeat, not args.no_tracemalloc, tuple(args.stages), progress=report,
+                         im_orders=tuple(args.orders), three_tone=args.three_tone)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"✅ Результати записано: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            slower = compare(json.load(f), data)
+        for units, stage, before, after in slower:
+            print(f"🐢 {units} юнітів, {stage}: {before * 1000:.1f} → {after * 1000:.1f} ms")
+        if not slower:
+            print("✅ Регресій не знайдено")
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,216 @@
+# catalog_registry.py
+#
+# Реестр каталога для долго работающих процессов (веб-приложение): следит за DeviceDB.xlsx и AntennaDN.xlsx
+# (опрос mtime и размера; inotify через пакет inotify_simple, если он установлен) и при изменении
+# в фоновом потоке перечитывает только изменившуюся книгу. Новый снимок каталога подменяется атомарно
+# (одним присваиванием), номер версии увеличивается — зависимые кэши сбрасываются по нему (см. web_cache).
+#
+#   registry = CatalogRegistry("DeviceDB.xlsx", "AntennaDN.xlsx").start()
+#   snap = registry.snapshot()          # CatalogSnapshot: version, devices, antennas, имена
+#   snap.device_names, snap.antenna_names
+#
+# CLI: python catalog_registry.py [--interval 2] — печатает версии каталога при изменениях файлов.
+
+import os
+import time
+import threading
+from dataclasses import dataclass, field, replace
+from device_catalog import DeviceCatalog, load_device_catalog
+from pattern_cache import get_antenna_library
+from compiled_catalog import find_compiled_catalog
+from diagnostics import get_logger
+
+log = get_logger(__name__)
+
+POLL_INTERVAL_S = 2.0
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Неизменяемый снимок каталога: устройства + ДН антенн + состояние исходных файлов"""
+    version: int
+    devices: DeviceCatalog
+    antennas: dict  # имя листа -> AntennaPattern
+    sources: dict = field(default_factory=dict)  # 'device' / 'antenna' -> (mtime_ns, size)
+    loaded_at: float = 0.0
+
+    @property
+    def device_names(self):
+        return list(self.devices.names)
+
+    @property
+    def antenna_names(self):
+        return list(self.antennas)
+
+
+def file_state(path):
+    """(mtime_ns, size) файла или None, если файла нет"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_antennas(antenna_file):
+    """Все ДН книги: из скомпилированного каталога, если он актуален, иначе один проход по Excel"""
+    compiled = find_compiled_catalog(antenna_file, 'antenna')
+    if compiled is not None:
+        return {name: compiled.pattern(name) for name in compiled.antenna_names}
+    return dict(get_antenna_library(antenna_file))
+
+
+class CatalogRegistry:
+    """
+    Текущий снимок каталога + фоновый наблюдатель за файлами.
+    snapshot() всегда возвращает целостный снимок: во время перечитывания книги виден предыдущий.
+    """
+
+    def __init__(self, device_file="DeviceDB.xlsx", antenna_file="AntennaDN.xlsx", poll_interval=POLL_INTERVAL_S):
+        self.device_file = os.path.abspath(device_file)
+        self.antenna_file = os.path.abspath(antenna_file)
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self.last_error = None
+        self._failed = {}  # состояние файлов, которые не удалось разобрать (повторно не читаются)
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._inotify = None
+
+    # === Загрузка ===
+    def _load(self, kind):
+        if kind == 'device':
+            return load_device_catalog(self.device_file)
+        return load_antennas(self.antenna_file)
+
+    def load(self):
+        """Первая (синхронная) загрузка обеих книг"""
+        with self._lock:
+            if self._snapshot is None:
+                sources = {'device': file_state(self.device_file), 'antenna': file_state(self.antenna_file)}
+                self._snapshot = CatalogSnapshot(1, self._load('device'), self._load('antenna'), sources, time.time())
+        return self._snapshot
+
+    def snapshot(self):
+        return self._snapshot if self._snapshot is not None else self.load()
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def check(self):
+        """
+        Сверяет mtime/размер файлов со снимком; изменившуюся книгу перечитывает и подменяет снимок.
+        Возвращает True, если версия изменилась. Ошибка разбора (файл ещё пишется) — снимок остаётся прежним,
+        книга перечитывается, когда файл изменится снова.
+        """
+        current = self.snapshot()
+        changed = {kind: state for kind, path in (('device', self.device_file), ('antenna', self.antenna_file))
+                   if (state := file_state(path)) is not None and state != current.sources.get(kind)}
+        if not changed or changed == self._failed:
+            return False
+        updates = {}
+        try:
+            if 'device' in changed:
+                updates['devices'] = self._load('device')
+            if 'antenna' in changed:
+                updates['antennas'] = self._load('antenna')
+        except Exception as e:
+            self._failed = changed
+            self.last_error = f"{', '.join(changed)}: {e}"
+            log.warning("⚠️ Не вдалося перечитати каталог (%s), залишається версія %d", self.last_error,
+                        current.version)
+            return False
+        with self._lock:
+            base = self._snapshot
+            self._snapshot = replace(base, version=base.version + 1, sources=dict(base.sources, **changed),
+                                     loaded_at=time.time(), **updates)
+        self.reloads += 1
+        self.last_error = None
+        self._failed = {}
+        log.info("🔄 Каталог оновлено (%s), версія %d", ", ".join(changed), self._snapshot.version)
+        return True
+
+    # === Фоновое наблюдение ===
+    def start(self):
+        """Загружает каталог (если ещё не загружен) и запускает фоновый поток наблюдения"""
+        self.load()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._inotify = self._open_inotify()
+                self._thread = threading.Thread(target=self._watch, name="catalog-registry", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    @property
+    def watching(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def _open_inotify(self):
+        """inotify на каталоги с книгами (редакторы часто заменяют файл переименованием); None — без inotify"""
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            return None
+        try:
+            notify = INotify()
+            mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE
+            for directory in {os.path.dirname(self.device_file), os.path.dirname(self.antenna_file)}:
+                notify.add_watch(directory, mask)
+            return notify
+        except OSError:
+            return None
+
+    def _wait(self):
+        if self._inotify is None:
+            self._stop.wait(self.poll_interval)
+        else:  # событие или таймаут; файлы всё равно сверяются по mtime/размеру
+            self._inotify.read(timeout=int(self.poll_interval * 1000))
+
+    def _watch(self):
+        while not self._stop.is_set():
+            self._wait()
+            if self._stop.is_set():
+                break
+            try:
+                self.check()
+            except Exception:
+                log.exception("❌ Помилка спостереження за каталогом")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Спостереження за DeviceDB.xlsx / AntennaDN.xlsx")
+    parser.add_argument("device_file", nargs="?", default="DeviceDB.xlsx")
+    parser.add_argument("antenna_file", nargs="?", default="AntennaDN.xlsx")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_S)
+    args = parser.parse_args()
+
+    registry = CatalogRegistry(args.device_file, args.antenna_file, args.interval).start()
+    snap = registry.snapshot()
+    print(f"📚 Каталог v{snap.version}: {len(snap.device_names)} пристроїв, {len(snap.antenna_names)} антен "
+          f"({registry.mode}). Ctrl+C — вихід.")
+    try:
+        while True:
+            time.sleep(args.interval)
+            if registry.snapshot() is not snap:
+                snap = registry.snapshot()
+                print(f"🔄 v{snap.version}: {len(snap.device_names)} пристроїв, {len(snap.antenna_names)} антен")
+    except KeyboardInterrupt:
+        registry.stop()
@@ -0,0 +1,172 @@
+# compiled_catalog.py
+#
+# Скомпилированный каталог: DeviceDB.xlsx + AntennaDN.xlsx в одном бинарном файле.
+#
+# Формат файла:
+#   8 байт   — сигнатура b'LEMSCAT1'
+#   8 байт   — длина JSON-заголовка (uint64, little-endian)
+#   N байт   — JSON-заголовок (устройства, параметры антенн, смещения массивов ДН)
+#   выравнивание до 64 байт
+#   float64  — все массивы ДН подряд (читаются через np.memmap без копирования)
+#
+# Использование:
+#   python compiled_catalog.py [DeviceDB.xlsx] [AntennaDN.xlsx] [-o LocalEMS_catalog.bin]
+
+import os
+import sys
+import json
+import struct
+import argparse
+import numpy as np
+
+MAGIC = b'LEMSCAT1'
+ALIGN = 64
+COMPILED_CATALOG = "LocalEMS_catalog.bin"
+
+
+def _json_value(v):
+    if isinstance(v, np.generic):
+        return v.item()
+    if isinstance(v, float) and v != v:  # NaN
+        return None
+    return v
+
+
+def _source_info(path):
+    st = os.stat(path)
+    return {'name': os.path.basename(path), 'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def compiled_path_for(source_file):
+    """Путь к скомпилированному каталогу рядом с исходной книгой"""
+    return os.path.join(os.path.dirname(os.path.abspath(source_file)), COMPILED_CATALOG)
+
+
+def compile_catalog(device_file="DeviceDB.xlsx", antenna_file="AntennaDN.xlsx", out_file=None):
+    """Читает обе книги Excel и записывает один бинарный файл каталога. Возвращает путь к нему."""
+    from device_catalog import DeviceCatalog
+    from antenna_utils import load_antenna_library
+
+    out_file = out_file or compiled_path_for(device_file)
+
+    devices = DeviceCatalog.from_excel(device_file)
+    header = {
+        'version': 1,
+        'sources': {'device': _source_info(device_file), 'antenna': _source_info(antenna_file)},
+        'devices': {rec.name: {k: _json_value(v) for k, v in rec.params.items()} for rec in devices},
+        'antennas': [],
+    }
+
+    chunks = []
+    offset = 0
+    for sheet, pattern in load_antenna_library(antenna_file).items():
+        entry = {'name': sheet, 'info': {k: _json_value(v) for k, v in pattern.info.items()}}
+        for key in ('azimuth_deg', 'azimuth_att', 'elevation_deg', 'elevation_att'):
+            arr = np.ascontiguousarray(getattr(pattern, key), dtype='<f8')
+            entry[key] = [offset, len(arr)]
+            chunks.append(arr)
+            offset += len(arr)
+        header['antennas'].append(entry)
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    prefix_len = len(MAGIC) + 8 + len(header_bytes)
+    padding = (-prefix_len) % ALIGN
+
+    tmp_file = out_file + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * padding)
+        for arr in chunks:
+            f.write(arr.tobytes())
+    os.replace(tmp_file, out_file)
+    return out_file
+
+
+class CompiledCatalog:
+    """Каталог, прочитанный из бинарного файла: заголовок в памяти, массивы ДН — memmap"""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: не является файлом скомпилированного каталога")
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(header_len).decode('utf-8'))
+        data_offset = len(MAGIC) + 8 + header_len
+        data_offset += (-data_offset) % ALIGN
+        n_values = (os.path.getsize(self.path) - data_offset) // 8
+        self._data = np.memmap(self.path, dtype='<f8', mode='r', offset=data_offset, shape=(n_values,)) \
+            if n_values else np.zeros(0)
+        self._antennas = {a['name']: a for a in self.header['antennas']}
+        self.antenna_names = [a['name'] for a in self.header['antennas']]
+        self.device_names = list(self.header['devices'].keys())
+
+    def is_fresh_for(self, source_file, kind):
+        """
+        True, если каталог собран именно из этой версии файла (kind: 'device' | 'antenna'): совпадают имя,
+        mtime_ns и размер (книга, восстановленная со старой датой через cp -p / rsync -a, — уже не та версия)
+        """
+        src = self.header['sources'].get(kind)
+        if not src or not os.path.exists(source_file):
+            return False
+        if src['name'] != os.path.basename(source_file):
+            return False
+        st = os.stat(source_file)
+        return src.get('mtime_ns') == st.st_mtime_ns and src.get('size') == st.st_size
+
+    def device_catalog(self):
+        from device_catalog import DeviceCatalog, DeviceRecord
+        records = {name: DeviceRecord.from_params(name, params)
+                   for name, params in self.header['devices'].items()}
+        return DeviceCatalog(records, source=self.path)
+
+    def _array(self, entry, key):
+        start, length = entry[key]
+        return self._data[start:start + length]
+
+    def pattern(self, sheet_name):
+        from antenna_utils import AntennaPattern
+        entry = self._antennas[sheet_name]  # KeyError — как у отсутствующего листа
+        return AntennaPattern(sheet_name,
+                              self._array(entry, 'azimuth_deg'), self._array(entry, 'azimuth_att'),
+                              self._array(entry, 'elevation_deg'), self._array(entry, 'elevation_att'),
+                              dict(entry['info']))
+
+
+_LOADED = {}
+
+
+def find_compiled_catalog(source_file, kind):
+    """
+    Возвращает CompiledCatalog, если рядом с source_file лежит актуальный скомпилированный каталог,
+    иначе None (вызывающий код читает Excel).
+    """
+    path = compiled_path_for(source_file)
+    if not os.path.exists(path):
+        return None
+    key = (path, os.stat(path).st_mtime_ns)
+    catalog = _LOADED.get(key)
+    if catalog is None:
+        try:
+            catalog = CompiledCatalog(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        _LOADED.clear()
+        _LOADED[key] = catalog
+    return catalog if catalog.is_fresh_for(source_file, kind) else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Компіляція DeviceDB.xlsx та AntennaDN.xlsx в бінарний каталог")
+    parser.add_argument("device_file", nargs="?", default="DeviceDB.xlsx")
+    parser.add_argument("antenna_file", nargs="?", default="AntennaDN.xlsx")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args()
+
+    out = compile_catalog(args.device_file, args.antenna_file, args.output)
+    cat = CompiledCatalog(out)
+    print(f"✅ Каталог записано: {out} ({os.path.getsize(out) / 1024:.1f} KB, "
+          f"{len(cat.device_names)} пристроїв, {len(cat.antenna_names)} антен)")
+    sys.exit(0)
@@ -0,0 +1,62 @@
+# conftest.py
+#
+# Общие фикстуры тестов: рабочий каталог репозитория (скалярные функции открывают DeviceDB.xlsx /
+# AntennaDN.xlsx по относительному пути) и обработанный сайт site_config.site в нескольких вариантах геометрии.
+
+import os
+import copy
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEVICE_FILE = "DeviceDB.xlsx"
+ANTENNA_FILE = "AntennaDN.xlsx"
+
+
+@pytest.fixture(scope="session", autouse=True)
+def in_repo_dir():
+    cwd = os.getcwd()
+    os.chdir(HERE)
+    yield
+    os.chdir(cwd)
+
+
+def _spread(site):
+    """Приёмники разнесены по горизонтали: азимутальные ДН и ненулевые dx/dy"""
+    for k, rx in enumerate(site['rx_list']):
+        x, y, z = rx['coords']
+        rx['coords'] = (x + 15 * (k + 1), y - 9 * k, z)
+    return site
+
+
+def _float_coords(site):
+    """Координаты float, как их передаёт веб-приложение (разности дают -0.0)"""
+    for unit in site['tx_list'] + site['rx_list']:
+        unit['coords'] = tuple(float(c) for c in unit['coords'])
+        unit['azimuth'] = float(unit['azimuth']) + 30
+    return site
+
+
+def _near(site):
+    """Приёмники в 0.3…1.5 м от TX: учитывается наведённый сигнал (расстояние меньше длины волны)"""
+    for k, rx in enumerate(site['rx_list']):
+        x, y, z = site['tx_list'][k % len(site['tx_list'])]['coords']
+        rx['coords'] = (x + 0.3 + 0.2 * k, y, z + 0.1 * k)
+    return site
+
+
+@pytest.fixture(scope="module", params=["bundled", "float", "spread", "near"])
+def site(request, in_repo_dir):
+    """
+    site_config.site после process_site: bundled — как есть (все юниты на одной вертикали, есть пары
+    с нулевым расстоянием), float — то же с float-координатами, spread — приёмники разнесены по горизонтали, near — приёмники в ближней зоне TX
+    """
+    from site_config import site as config
+    from site_loader import process_site
+    raw = copy.deepcopy(config)
+    if request.param == "spread":
+        raw = _spread(raw)
+    elif request.param == "float":
+        raw = _float_coords(raw)
+    elif request.param == "near":
+        raw = _near(raw)
+    return process_site(raw, DEVICE_FILE, ANTENNA_FILE)
@@ -0,0 +1,142 @@
+# device_catalog.py
+
+import os
+from dataclasses import dataclass, field
+import pandas as pd
+from pattern_cache import LRUCache
+from compiled_catalog import find_compiled_catalog
+from instrumentation import in_stage
+
+
+def _to_float(value, default=None):
+    try:
+        if value is None or pd.isna(value):
+            return default
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_bw_options(bw_opts):
+    """'6.25, 12.5, 25' -> (6.25, 12.5, 25.0); при ошибке — (12.5,) как в process_unit"""
+    try:
+        return tuple(float(b.strip()) for b in str(bw_opts).split(','))
+    except Exception:
+        return (12.5,)
+
+
+@dataclass
+class DeviceRecord:
+    """Параметры одного устройства из DeviceDB.xlsx (числа уже приведены к float)"""
+    name: str
+    tx_power_default: float = None
+    tx_power_min: float = None
+    tx_power_max: float = None
+    rx_sensitivity_default: float = None
+    rx_sensitivity_min: float = None
+    rx_sensitivity_max: float = None
+    rx_acs: float = None
+    tx_freq_default: float = None
+    rx_freq_default: float = None
+    freq_min: float = None
+    freq_max: float = None
+    bw_default: float = None
+    bw_options: tuple = (12.5,)
+    en_freq_limit: float = None
+    en_below_limit: float = None
+    en_above_limit: float = None
+    freq_offset_block: float = None
+    block_rej: float = None
+    params: dict = field(default_factory=dict)  # исходные значения «как в Excel»
+
+    @classmethod
+    def from_params(cls, name, params):
+        p = params
+        return cls(
+            name=name,
+            tx_power_default=_to_float(p.get('TX Power Default (dBm)')),
+            tx_power_min=_to_float(p.get('TX Power Min (dBm)')),
+            tx_power_max=_to_float(p.get('TX Power Max (dBm)')),
+            rx_sensitivity_default=_to_float(p.get('RX Sensitivity Default  (dBm)')),
+            rx_sensitivity_min=_to_float(p.get('RX Sensitivity Min  (dBm)')),
+            rx_sensitivity_max=_to_float(p.get('RX Sensitivity Max  (dBm)')),
+            rx_acs=_to_float(p.get('RX ACS (dB)')),
+            tx_freq_default=_to_float(p.get('TX Frequency Default (MHz)')),
+            rx_freq_default=_to_float(p.get('RX Frequency Default (MHz)')),
+            freq_min=_to_float(p.get('Freq Min (MHz)')),
+            freq_max=_to_float(p.get('Freq Max (MHz)')),
+            bw_default=_to_float(p.get('BW Default (kHz)')),
+            bw_options=parse_bw_options(p.get('BW Options (kHz)', '12.5')),
+            en_freq_limit=_to_float(p.get('EN Freq Limit (MHz)')),
+            en_below_limit=_to_float(p.get('EN Below Limit (dBm)')),
+            en_above_limit=_to_float(p.get('EN Above Limit (dBm)')),
+            freq_offset_block=_to_float(p.get('RX Freq_offset_block (MHz)')),
+            block_rej=_to_float(p.get('RX Block_Rej (dB)')),
+            params=dict(p),
+        )
+
+
+class DeviceCatalog:
+    """
+    Индекс DeviceDB.xlsx: имя устройства -> DeviceRecord.
+    Книга читается один раз, дальше поиск устройства — обычный dict lookup.
+    """
+
+    def __init__(self, records, source=None):
+        self._records = dict(records)
+        self.names = list(self._records.keys())
+        self.source = source
+
+    @classmethod
+    def from_excel(cls, device_file):
+        df = pd.read_excel(device_file, header=None)
+        param_col = df.columns[0]
+        records = {}
+        for col in df.columns[1:]:
+            name = df.iloc[0, col]
+            if pd.isna(name):
+                continue
+            name = str(name).strip()
+            device_params = df[[param_col, col]].dropna().iloc[1:]
+            params = dict(zip(device_params.iloc[:, 0].astype(str).str.strip(), device_params.iloc[:, 1]))
+            records[name] = DeviceRecord.from_params(name, params)
+        return cls(records, source=os.path.abspath(device_file))
+
+    def get(self, name, default=None):
+        return self._records.get(str(name).strip(), default)
+
+    def __getitem__(self, name):
+        return self._records[str(name).strip()]
+
+    def __contains__(self, name):
+        return str(name).strip() in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+
+_CATALOG_CACHE = LRUCache(maxsize=8)
+
+
+def load_device_catalog(device_file):
+    """
+    Возвращает DeviceCatalog для файла (кэш по пути и mtime).
+    Если рядом лежит актуальный скомпилированный каталог — Excel не читается.
+    Если передан уже готовый DeviceCatalog — возвращает его же.
+    """
+    if isinstance(device_file, DeviceCatalog):
+        return device_file
+    path = os.path.abspath(device_file)
+    key = (path, os.stat(path).st_mtime_ns)
+    return _CATALOG_CACHE.get_or_load(key, lambda: _load_catalog(path))
+
+
+@in_stage("catalog_load")
+def _load_catalog(path):
+    compiled = find_compiled_catalog(path, 'device')
+    if compiled is not None:
+        return compiled.device_catalog()
+    return DeviceCatalog.from_excel(path)
@@ -0,0 +1,104 @@
+# diagnostics.py
+#
+# Диагностические сообщения расчётных модулей вместо print:
+#   - один логгер "localems" (дочерние — localems.<модуль>), сообщения форматируются лениво (%-аргументы);
+#   - одинаковые сообщения (шаблон + аргументы) выводятся не чаще burst раз за interval_s, остальные считаются;
+#   - тихий режим (set_quiet(True)) отключает логгер целиком: вызовы возвращаются до форматирования.
+#
+#   from diagnostics import get_logger
+#   log = get_logger(__name__)
+#   log.warning("⚠️ Неизвестная поляризация: '%s'", pol)
+
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+LOGGER_NAME = "localems"
+DEFAULT_LEVEL = logging.WARNING
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Пропускает одно и то же сообщение не более burst раз за interval_s секунд.
+    Ключ — (логгер, уровень, шаблон, аргументы); хранится не более maxkeys последних ключей.
+    """
+
+    def __init__(self, interval_s=60.0, burst=1, maxkeys=1024):
+        super().__init__()
+        self.interval_s = interval_s
+        self.burst = burst
+        self.maxkeys = maxkeys
+        self.suppressed = 0
+        self._seen = OrderedDict()  # ключ -> [время первого вывода в окне, число выводов]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        try:
+            key = (record.name, record.levelno, record.msg, record.args)
+            hash(key)
+        except TypeError:
+            key = (record.name, record.levelno, record.msg, repr(record.args))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is None or now - entry[0] >= self.interval_s:
+                self._seen[key] = [now, 1]
+                self._seen.move_to_end(key)
+                while len(self._seen) > self.maxkeys:
+                    self._seen.popitem(last=False)
+                return True
+            if entry[1] < self.burst:
+                entry[1] += 1
+                return True
+            self.suppressed += 1
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._seen.clear()
+            self.suppressed = 0
+
+
+RATE_LIMIT = RateLimitFilter()
+
+_logger = logging.getLogger(LOGGER_NAME)
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _handler.addFilter(RATE_LIMIT)
+    _logger.addHandler(_handler)
+    _logger.setLevel(DEFAULT_LEVEL)
+    _logger.propagate = False
+
+_state = {'level': DEFAULT_LEVEL, 'quiet': False}
+
+
+def get_logger(name=None):
+    """Логгер модуля: localems.<name>"""
+    if not name or name == "__main__":
+        return _logger
+    return _logger.getChild(name)
+
+
+def set_level(level):
+    """Уровень диагностики (logging.DEBUG — подробные расчёты, logging.WARNING — только предупреждения)"""
+    _state['level'] = level
+    if not _state['quiet']:
+        _logger.setLevel(level)
+
+
+def set_quiet(quiet=True):
+    """Тихий режим: диагностика не форматируется и не выводится"""
+    _state['quiet'] = quiet
+    _logger.setLevel(logging.CRITICAL + 1 if quiet else _state['level'])
+
+
+def is_quiet():
+    return _state['quiet']
+
+
+def suppressed_count():
+    """Сколько повторов отброшено фильтром"""
+    return RATE_LIMIT.suppressed
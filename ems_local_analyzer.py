@@ -2,15 +2,19 @@
 
 import math
 from site_loader import process_site
-from antenna_utils import load_antenna_pattern, interpolate_gain
-from polarization_loss import get_polarization_loss
+from pattern_cache import get_antenna_pattern
+from polarization_loss import unit_polarization_loss
 from spectrum_loss import compute_interference_level, check_blocking_interference, check_field_induced_interference, adjust_tx_gain_by_frequency
 from site_config import site
+from ems_matrix import analyze_site_matrix
+from interference_aggregate import aggregate_interference, format_aggregate_result
 
 def distance_3d(a, b):
     return math.sqrt(sum((ac - bc) ** 2 for ac, bc in zip(a, b))) / 1000
 
 def horizontal_direction(dx, dy):
+    if dx == 0 and dy == 0:  # строго по вертикали: 0°, иначе atan2(-0.0, -0.0) дал бы 180° для float-координат
+        return 0.0
     return (math.degrees(math.atan2(dx, dy)) + 360) % 360
 
 def elevation_angle(dz, dx, dy):
@@ -37,20 +41,20 @@ def analyze_tx_to_rx(tx, rx):
     az_diff_rx = angle_difference(rx['azimuth'], az_rx_to_tx)
     el_diff_rx = angle_difference(rx['elevation'], el_rx_to_tx)
 
-    hor_tx, vert_tx = load_antenna_pattern("AntennaDN.xlsx", tx['antenna_name'])
-    hor_rx, vert_rx = load_antenna_pattern("AntennaDN.xlsx", rx['antenna_name'])
+    pattern_tx = get_antenna_pattern("AntennaDN.xlsx", tx['antenna_name'])
+    pattern_rx = get_antenna_pattern("AntennaDN.xlsx", rx['antenna_name'])
 
-    G_hor_tx = 0 if dx == 0 and dy == 0 else interpolate_gain(hor_tx, az_diff_tx, 'azimuth_deg')
-    G_vert_tx = interpolate_gain(vert_tx, el_diff_tx, 'elevation_deg')
+    G_hor_tx = 0 if dx == 0 and dy == 0 else pattern_tx.azimuth_gain(az_diff_tx)
+    G_vert_tx = pattern_tx.elevation_gain(el_diff_tx)
     tx_max_gain = adjust_tx_gain_by_frequency(tx, rx)
     gt = tx_max_gain + G_hor_tx + G_vert_tx
 
-    G_hor_rx = 0 if dx == 0 and dy == 0 else interpolate_gain(hor_rx, az_diff_rx, 'azimuth_deg')
-    G_vert_rx = interpolate_gain(vert_rx, el_diff_rx, 'elevation_deg')
+    G_hor_rx = 0 if dx == 0 and dy == 0 else pattern_rx.azimuth_gain(az_diff_rx)
+    G_vert_rx = pattern_rx.elevation_gain(el_diff_rx)
     gr = rx['gain_max'] + G_hor_rx + G_vert_rx
 
     Pint = compute_interference_level(tx, rx, d_km, gt, gr)
-    polar_loss = get_polarization_loss(tx['polarization'], rx['polarization'])
+    polar_loss = unit_polarization_loss(tx, rx)
     fspl = 20 * math.log10(d_km) + 20 * math.log10(tx['frequency_mhz']) + 32.44
     prx_dbm = tx['power_dbm'] + gt + gr - fspl - tx['loss'] - rx['loss']
 
@@ -114,16 +118,19 @@ def format_ems_result(res, tx_index=0, rx=None):
 
 
 if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
     site_data = process_site(site, "DeviceDB.xlsx", "AntennaDN.xlsx")
     tx_list = site_data['tx_list']
     rx_list = site_data['rx_list']
+    matrix = analyze_site_matrix(tx_list, rx_list)
 
     for tx_id, tx in enumerate(tx_list):
         for rx_id, rx in enumerate(rx_list):
             print("\n========================================")
             print(f"📡 TX #{tx_id + 1} → RX #{rx_id + 1}: {tx['device_name']} → {rx['device_name']}")
             try:
-                res = analyze_tx_to_rx(tx, rx)
+                res = matrix.pair(tx_id, rx_id)
                 print(f"📏 Distance: {res['distance_m']:.1f} m")
                 print(f"▶ gt = {res['gt']:.2f} dBi, gr = {res['gr']:.2f} dBi")
                 print(f"📉 Loss FSPL: {res['fspl']:.2f} dB")
@@ -156,3 +163,9 @@ if __name__ == "__main__":
                     print("🧲 Induced interference: insufficient data for assessment.")
             except Exception as e:
                 print(f"🚫 Analysis error: {e}")
+
+    # === Сумарна завада на кожному приймачі (Pint + IM по потужності) ===
+    aggregate = aggregate_interference(tx_list, rx_list, matrix=matrix)
+    for rx_id in range(len(rx_list)):
+        print("\n========================================")
+        print(format_aggregate_result(aggregate, rx_id))
@@ -0,0 +1,318 @@
+# ems_matrix.py
+#
+# Матричный расчёт ЭМС: все пары TX×RX сразу через broadcasting NumPy.
+# Физика та же, что в ems_local_analyzer.analyze_tx_to_rx.
+
+import numpy as np
+from pattern_cache import get_antenna_pattern
+from polarization_loss import unit_polarization_code, polarization_loss_matrix
+from spectrum_loss import (fspl_db, en_level_array, adjust_tx_gain_by_frequency_array,
+                           compute_interference_level_array, check_blocking_interference_array,
+                           check_field_induced_interference_array, dbm_to_mw, mw_to_dbm)
+from instrumentation import counted, in_stage
+from site_arrays import UnitArrays
+
+ANTENNA_FILE = "AntennaDN.xlsx"
+
+# Поля результата (все — массивы N×M)
+RESULT_FIELDS = [
+    'distance_m', 'az_diff_tx', 'el_diff_tx', 'az_diff_rx', 'el_diff_rx',
+    'gt', 'gr', 'Pint', 'polar_loss', 'fspl', 'prx_dbm',
+    'block_considered', 'Pblock', 'block_threshold', 'block_passed', 'freq_offset',
+    'induced_considered', 'Pinduced_dbm', 'induced_passed', 'lambda', 'induced_distance_limit',
+    'threshold', 'Pint_passed', 'valid',
+]
+
+
+# Все функции ниже принимают юниты как список словарей process_unit или как site_arrays.UnitArrays
+
+def unit_column(units, key, default=np.nan):
+    """Столбец параметра по списку TX/RX (None → default)"""
+    if isinstance(units, UnitArrays):
+        return units.column(key, default)
+    return np.array([default if u.get(key) is None else u.get(key) for u in units], dtype=float)
+
+
+def unit_coords(units):
+    """Координаты N × 3"""
+    if isinstance(units, UnitArrays):
+        return units.coords()
+    return np.array([u['coords'] for u in units], dtype=float).reshape(-1, 3)
+
+
+def unit_names(units, key='device_name'):
+    """Имена устройств/антенн по юнитам"""
+    if isinstance(units, UnitArrays):
+        return units.names(key)
+    return [u.get(key, '') for u in units]
+
+
+def en_rule_columns(tx_list):
+    """EN_dBm_rule по передатчикам в виде массивов (has_rule, freq_limit, below, above, en_default)"""
+    if isinstance(tx_list, UnitArrays):
+        freq_limit = tx_list.column('en_freq_limit')
+        return (~np.isnan(freq_limit), freq_limit, tx_list.column('en_below'), tx_list.column('en_above'),
+                tx_list.column('EN_dBm', -40))
+    rules = [tx.get('EN_dBm_rule') for tx in tx_list]
+    has_rule = np.array([bool(r) for r in rules])
+    freq_limit = np.array([r['freq_limit_mhz'] if r else np.nan for r in rules], dtype=float)
+    below = np.array([r['below_limit'] if r else np.nan for r in rules], dtype=float)
+    above = np.array([r['above_limit'] if r else np.nan for r in rules], dtype=float)
+    en_default = unit_column(tx_list, 'EN_dBm', -40)
+    return has_rule, freq_limit, below, above, en_default
+
+
+def unit_polarization_codes(units):
+    """Коды поляризаций юнитов (polarization_loss.POLARIZATIONS)"""
+    if isinstance(units, UnitArrays):
+        return units.polarization_codes()
+    return np.array([unit_polarization_code(u) for u in units], dtype=np.intp)
+
+
+def polarization_matrix(tx_list, rx_list):
+    """Потери поляризации N×M: fancy indexing кодов TX/RX в POLARIZATION_LOSS_MATRIX"""
+    return polarization_loss_matrix(unit_polarization_codes(tx_list), unit_polarization_codes(rx_list))
+
+
+def angle_difference_array(a1, a2):
+    d = np.abs(a1 - a2)
+    return np.minimum(d, 360 - d)
+
+
+def pair_geometry(tx_coords, rx_coords):
+    """
+    Геометрия для всех пар: tx_coords (N,3), rx_coords (M,3) → dx, dy, dz, d_km (N×M),
+    азимуты/углы места TX→RX и RX→TX.
+    """
+    delta = rx_coords[None, :, :] - tx_coords[:, None, :]
+    dx, dy, dz = delta[..., 0], delta[..., 1], delta[..., 2]
+    horizontal = np.hypot(dx, dy)
+    d_km = np.hypot(horizontal, dz) / 1000
+
+    # антенны строго друг над другом: азимут 0° в обе стороны (как horizontal_direction)
+    az_tx_to_rx = np.where(horizontal == 0, 0.0, (np.degrees(np.arctan2(dx, dy)) + 360) % 360)
+    el_tx_to_rx = -np.degrees(np.arctan2(dz, horizontal))
+    # обратное направление: +180° по азимуту, угол места с обратным знаком
+    az_rx_to_tx = np.where(horizontal == 0, 0.0, (az_tx_to_rx + 180) % 360)
+    el_rx_to_tx = -el_tx_to_rx
+    return dx, dy, dz, d_km, az_tx_to_rx, el_tx_to_rx, az_rx_to_tx, el_rx_to_tx
+
+
+def pattern_gain_matrix(names, az_diff, el_diff, same_vertical, axis, antenna_file=ANTENNA_FILE):
+    """
+    Ослабление ДН (гор. + верт.) для матрицы углов.
+    names — антенны по строкам (axis=0, TX) или столбцам (axis=1, RX).
+    Для антенн, стоящих строго друг над другом, горизонтальная ДН не учитывается.
+    """
+    gain = np.zeros(az_diff.shape)
+    names = np.asarray(names, dtype=object)
+    for name in dict.fromkeys(names):
+        pattern = get_antenna_pattern(antenna_file, name)
+        sel = names == name
+        idx = (sel, slice(None)) if axis == 0 else (slice(None), sel)
+        g_hor = np.where(same_vertical[idx], 0.0, pattern.azimuth_gain(az_diff[idx]))
+        gain[idx] = g_hor + pattern.elevation_gain(el_diff[idx])
+    return gain
+
+
+class EMCMatrixResult:
+    """
+    Результат analyze_site_matrix: плотные массивы N×M (строки — TX, столбцы — RX).
+    Пары с нулевым расстоянием помечены valid=False, их значения — NaN.
+    """
+
+    def __init__(self, tx_names, rx_names, arrays):
+        self.tx_names = list(tx_names)
+        self.rx_names = list(rx_names)
+        self.arrays = arrays
+        self.shape = arrays['Pint'].shape
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def to_records(self):
+        """Плоская структурированная таблица (одна строка на пару)"""
+        n, m = self.shape
+        ti, ri = np.meshgrid(np.arange(n), np.arange(m), indexing='ij')
+        dtype = [('tx_index', 'i4'), ('rx_index', 'i4')] + [
+            (f, 'bool' if self.arrays[f].dtype == bool else 'f8') for f in RESULT_FIELDS]
+        table = np.empty(n * m, dtype=dtype)
+        table['tx_index'] = ti.ravel()
+        table['rx_index'] = ri.ravel()
+        for f in RESULT_FIELDS:
+            table[f] = self.arrays[f].ravel()
+        return table
+
+    def to_dataframe(self):
+        import pandas as pd
+        df = pd.DataFrame(self.to_records())
+        df.insert(1, 'tx_name', [self.tx_names[i] for i in df['tx_index']])
+        df.insert(3, 'rx_name', [self.rx_names[j] for j in df['rx_index']])
+        return df
+
+    def pair(self, i, j):
+        """Результат одной пары в формате analyze_tx_to_rx (для format_ems_result)"""
+        a = {f: self.arrays[f][i, j] for f in RESULT_FIELDS}
+        if not a['valid']:
+            raise ValueError(f"🚫 Zero distance between TX and RX. Please check the coordinates.")
+        block = None
+        if a['block_considered']:
+            block = {'Pblock': float(a['Pblock']), 'threshold': float(a['block_threshold']),
+                     'passed': bool(a['block_passed']), 'freq_offset': float(a['freq_offset']),
+                     'limit': float(self.arrays['_block_limit'][j])}
+        induced = {'considered': bool(a['induced_considered']), 'distance': float(a['distance_m']),
+                   'lambda': float(a['lambda']), 'distance_limit': float(a['induced_distance_limit'])}
+        if induced['considered']:
+            induced.update({'Pinduced_dbm': float(a['Pinduced_dbm']), 'threshold_dbm': -10,
+                            'passed': bool(a['induced_passed'])})
+        return {
+            'tx_name': self.tx_names[i],
+            'rx_name': self.rx_names[j],
+            'distance_m': float(a['distance_m']),
+            'az_diff_tx': float(a['az_diff_tx']),
+            'el_diff_tx': float(a['el_diff_tx']),
+            'az_diff_rx': float(a['az_diff_rx']),
+            'el_diff_rx': float(a['el_diff_rx']),
+            'gt': float(a['gt']),
+            'gr': float(a['gr']),
+            'Pint': float(a['Pint']),
+            'polar_loss': float(a['polar_loss']),
+            'fspl': float(a['fspl']),
+            'prx_dbm': float(a['prx_dbm']),
+            'block_result': block,
+            'induced_result': induced,
+        }
+
+
+@counted
+def directional_gain_matrix(tx_list, rx_list, antenna_file=ANTENNA_FILE, adjust_tx_gain=True):
+    """
+    Геометрия и направленные усиления gt/gr для всех пар TX×RX.
+    adjust_tx_gain=True — как в analyze_tx_to_rx (gain_max TX корректируется по частоте RX),
+    False — как в im3_analyzer.compute_directional_gains (gain_max без коррекции).
+    d_km может содержать нули (совпадающие координаты) — проверка на стороне вызывающего.
+    """
+    tx_coords = unit_coords(tx_list)
+    rx_coords = unit_coords(rx_list)
+    dx, dy, dz, d_km, az_tr, el_tr, az_rt, el_rt = pair_geometry(tx_coords, rx_coords)
+    same_vertical = (dx == 0) & (dy == 0)
+
+    tx_az, tx_el = unit_column(tx_list, 'azimuth')[:, None], unit_column(tx_list, 'elevation')[:, None]
+    rx_az, rx_el = unit_column(rx_list, 'azimuth')[None, :], unit_column(rx_list, 'elevation')[None, :]
+
+    az_diff_tx = angle_difference_array(tx_az, az_tr)
+    el_diff_tx = angle_difference_array(tx_el, el_tr)
+    az_diff_rx = angle_difference_array(rx_az, az_rt)
+    el_diff_rx = angle_difference_array(rx_el, el_rt)
+
+    gain_max_tx = unit_column(tx_list, 'gain_max', 0)[:, None]
+    if adjust_tx_gain:
+        tx_max_gain = adjust_tx_gain_by_frequency_array(
+            gain_max_tx, unit_column(tx_list, 'gain_oob', -30)[:, None],
+            unit_column(tx_list, 'freq_min', 0)[:, None], unit_column(tx_list, 'freq_max', 0)[:, None],
+            unit_column(rx_list, 'frequency_mhz')[None, :])
+    else:
+        tx_max_gain = gain_max_tx
+    gt = tx_max_gain + pattern_gain_matrix(unit_names(tx_list, 'antenna_name'),
+                                           az_diff_tx, el_diff_tx, same_vertical, 0, antenna_file)
+    gr = unit_column(rx_list, 'gain_max', 0)[None, :] + pattern_gain_matrix(
+        unit_names(rx_list, 'antenna_name'), az_diff_rx, el_diff_rx, same_vertical, 1, antenna_file)
+
+    return {
+        'd_km': d_km, 'same_vertical': same_vertical,
+        'az_diff_tx': az_diff_tx, 'el_diff_tx': el_diff_tx,
+        'az_diff_rx': az_diff_rx, 'el_diff_rx': el_diff_rx,
+        'gt': gt, 'gr': gr,
+    }
+
+
+@in_stage("emc_matrix")
+def analyze_site_matrix(tx_list, rx_list, antenna_file=ANTENNA_FILE):
+    """
+    Анализ ЭМС для всех пар TX×RX за один проход.
+    tx_list / rx_list — уже обработанные process_site/process_unit словари или UnitArrays.
+    """
+    g = directional_gain_matrix(tx_list, rx_list, antenna_file)
+    valid = g['d_km'] > 0
+    d_km = np.where(valid, g['d_km'], np.nan)
+    gt, gr = g['gt'], g['gr']
+
+    col = lambda units, key, default=np.nan: unit_column(units, key, default)
+
+    # --- Параметры TX (столбцы N×1) и RX (строки 1×M) ---
+    p_tx = col(tx_list, 'power_dbm')[:, None]
+    loss_tx = col(tx_list, 'loss')[:, None]
+    f_tx = col(tx_list, 'frequency_mhz')[:, None]
+    bw_tx = col(tx_list, 'BW_khz')[:, None]
+    gain_max_tx = col(tx_list, 'gain_max', 0)[:, None]
+
+    loss_rx = col(rx_list, 'loss')[None, :]
+    f_rx = col(rx_list, 'frequency_mhz')[None, :]
+    bw_rx = col(rx_list, 'BW_khz')[None, :]
+    acs_rx = col(rx_list, 'ACS', 0)[None, :]
+    sens_rx = col(rx_list, 'sensitivity_dbm')[None, :]
+    block_limit = col(rx_list, 'Freq_offset_block')
+
+    polar_loss = polarization_matrix(tx_list, rx_list)
+
+    # --- Уровень помехи ---
+    has_rule, freq_limit, below, above, en_default = (a[:, None] for a in en_rule_columns(tx_list))
+    en_rx = en_level_array(f_rx, has_rule, freq_limit, below, above, en_default)
+    en_avg = en_level_array((f_tx + f_rx) / 2, has_rule, freq_limit, below, above, en_default)
+
+    Pint = compute_interference_level_array(p_tx, loss_tx, f_tx, bw_tx, en_rx, en_avg,
+                                            loss_rx, f_rx, bw_rx, acs_rx, d_km, gt, gr, polar_loss)
+    fspl = fspl_db(d_km, f_tx)
+    prx_dbm = p_tx + gt + gr - fspl - loss_tx - loss_rx
+
+    block = check_blocking_interference_array(p_tx, loss_tx, f_tx, loss_rx, f_rx,
+                                              block_limit[None, :], col(rx_list, 'Block_Rej')[None, :], sens_rx,
+                                              d_km, gt, gr, polar_loss)
+    induced = check_field_induced_interference_array(p_tx, loss_tx, f_tx, gain_max_tx, d_km * 1000, gt)
+    induced_considered = induced['considered'] & valid
+
+    threshold = np.where(np.isnan(sens_rx), -100, sens_rx) + 10 + np.zeros_like(Pint)
+
+    arrays = {
+        'distance_m': d_km * 1000,
+        'az_diff_tx': g['az_diff_tx'], 'el_diff_tx': g['el_diff_tx'],
+        'az_diff_rx': g['az_diff_rx'], 'el_diff_rx': g['el_diff_rx'],
+        'gt': gt, 'gr': gr,
+        'Pint': Pint, 'polar_loss': polar_loss, 'fspl': fspl, 'prx_dbm': prx_dbm,
+        'block_considered': block['considered'] & valid,
+        'Pblock': block['Pblock'], 'block_threshold': block['threshold'],
+        'block_passed': block['passed'], 'freq_offset': block['freq_offset'],
+        'induced_considered': induced_considered,
+        'Pinduced_dbm': induced['Pinduced_dbm'], 'induced_passed': induced['passed'],
+        'lambda': induced['lambda'], 'induced_distance_limit': induced['distance_limit'],
+        'threshold': threshold,
+        'Pint_passed': ~(Pint > threshold),
+        'valid': valid,
+        '_block_limit': block_limit,
+    }
+    shape = (len(tx_list), len(rx_list))
+    for key in RESULT_FIELDS:
+        if np.shape(arrays[key]) != shape:
+            arrays[key] = np.broadcast_to(arrays[key], shape).copy()
+
+    return EMCMatrixResult(unit_names(tx_list), unit_names(rx_list), arrays)
+
+
+def pint_mw_matrix(res):
+    """Pint пар результата analyze_site_matrix в мВт (N×M); недействительные пары — 0"""
+    valid = res['valid']
+    return np.where(valid, dbm_to_mw(np.where(valid, res['Pint'], 0)), 0)
+
+
+def sum_pint_dbm(res):
+    """
+    Суммарная Pint всех TX на каждом RX (сложение по мощности) и номер TX с наибольшим вкладом.
+    Возвращает (pint_dbm, worst_tx) длины M; RX без действительных пар — NaN и -1.
+    """
+    valid = res['valid']
+    any_valid = valid.any(axis=0)
+    with np.errstate(divide='ignore'):
+        total = mw_to_dbm(pint_mw_matrix(res).sum(axis=0))
+    pint = np.where(any_valid, total, np.nan)
+    worst = np.where(any_valid, np.argmax(np.where(valid, res['Pint'], -np.inf), axis=0), -1)
+    return pint, worst
@@ -0,0 +1,216 @@
+# field_map.py
+#
+# Объёмная карта помех вокруг мачты: суммарная помеха Pint от всех TX в каждой точке сетки для заданного
+# типа антенны RX, её ориентации и частоты. Точки сетки — «виртуальные приёмники» UnitArrays (копии RX
+# с разными координатами), которые считаются матричной моделью analyze_site_matrix (направленные усиления
+# по LUT ДН, как compute_directional_gains) блоками с ограничением памяти.
+#
+#   fmap = interference_field(tx_list, rx, mast_size=(10, 10, 60), step=1.0)
+#   fmap.best_points(5)                  # точки с наибольшим запасом
+#   fig = plot_field_map(fmap, tx_list, rx, mast_size=(10, 10, 60))
+#
+# CLI (сайт из site_config.py):
+#   python field_map.py [--rx 0] [--mast 10 10 60] [--step 1] [-o field.png]
+
+import argparse
+import numpy as np
+from site_arrays import UnitArrays, ROW_INDEX
+from ems_matrix import ANTENNA_FILE, analyze_site_matrix, sum_pint_dbm, unit_names
+from instrumentation import in_stage
+
+# Ограничение размера блока: число пар TX × точка сетки за один проход
+FIELD_MAX_CELLS = 250_000
+
+
+def field_grid(mast_size, step=1.0, margin=None):
+    """
+    Оси сетки (xs, ys, zs) вокруг мачты: по X/Y — габарит мачты плюс margin с каждой стороны
+    (по умолчанию 0.6 × max(w, d), как в antenna_viewer), по Z — от 0 до высоты мачты.
+    """
+    if step <= 0:
+        raise ValueError(f"❌ Крок сітки має бути додатним: {step} м")
+    w, d, h = mast_size
+    margin = max(w, d) * 0.6 if margin is None else margin
+    axis = lambda lo, hi: lo + np.arange(int(np.floor((hi - lo) / step + 1e-9)) + 1) * step
+    return axis(-w / 2 - margin, w / 2 + margin), axis(-d / 2 - margin, d / 2 + margin), axis(0.0, h)
+
+
+class FieldMap:
+    """
+    Карта помех на сетке xs × ys × zs (индексация [ix, iy, iz]).
+    pint_dbm — суммарная по мощности помеха от всех TX (NaN — точка совпадает с TX),
+    worst_tx — индекс TX с наибольшим вкладом, threshold — порог RX (чувствительность + 10 дБ).
+    """
+
+    def __init__(self, xs, ys, zs, pint_dbm, worst_tx, threshold, tx_names):
+        self.xs = xs
+        self.ys = ys
+        self.zs = zs
+        self.pint_dbm = pint_dbm
+        self.worst_tx = worst_tx
+        self.threshold = threshold
+        self.tx_names = tx_names
+
+    @property
+    def shape(self):
+        return self.pint_dbm.shape
+
+    @property
+    def margin(self):
+        """Запас по порогу (дБ): > 0 — помеха ниже порога"""
+        return self.threshold - self.pint_dbm
+
+    def nearest_index(self, point):
+        return tuple(int(np.argmin(np.abs(axis - v))) for axis, v in zip((self.xs, self.ys, self.zs), point))
+
+    def value_at(self, point):
+        return float(self.pint_dbm[self.nearest_index(point)])
+
+    def slice(self, axis, value):
+        """Срез плоскостью axis ('x', 'y', 'z') = value: (2D массив Pint, оси (горизонтальная, вертикальная))"""
+        axes = {'x': (0, self.ys, self.zs), 'y': (1, self.xs, self.zs), 'z': (2, self.xs, self.ys)}
+        k, h_axis, v_axis = axes[axis]
+        coord = (self.xs, self.ys, self.zs)[k]
+        i = int(np.argmin(np.abs(coord - value)))
+        return np.take(self.pint_dbm, i, axis=k), (h_axis, v_axis)
+
+    def best_points(self, n=10):
+        """n точек сетки с наибольшим запасом: [(x, y, z, pint_dbm, margin_db), ...]"""
+        margin = np.where(np.isnan(self.pint_dbm), -np.inf, self.margin).ravel()
+        n = min(n, margin.size)
+        order = np.argpartition(-margin, n - 1)[:n] if n else np.array([], dtype=int)
+        order = order[np.argsort(-margin[order])]
+        ix, iy, iz = np.unravel_index(order, self.shape)
+        return [(float(self.xs[a]), float(self.ys[b]), float(self.zs[c]), float(self.pint_dbm[a, b, c]),
+                 float(margin[o])) for a, b, c, o in zip(ix, iy, iz, order)]
+
+    def exceed_surface(self):
+        """
+        Граница области превышения порога (приближение изоповерхности Pint = threshold):
+        точки с превышением, у которых хотя бы один сосед по сетке без превышения. Возвращает массив K × 3.
+        """
+        exceed = ~(self.margin >= 0)  # NaN (точка TX) считается превышением
+        padded = np.pad(exceed, 1, mode='edge')  # края сетки границей не считаются
+        inner = exceed.copy()
+        for k in range(3):
+            for shift in (0, 2):
+                index = [slice(1, -1)] * 3
+                index[k] = slice(shift, shift + exceed.shape[k])
+                inner &= padded[tuple(index)]
+        boundary = exceed & ~inner
+        ix, iy, iz = np.nonzero(boundary)
+        return np.column_stack([self.xs[ix], self.ys[iy], self.zs[iz]])
+
+
+def grid_receivers(rx, points):
+    """Копии приёмника rx (словарь process_unit) в точках points (K × 3) в виде UnitArrays"""
+    base = UnitArrays.from_units([dict(rx, coords=(0.0, 0.0, 0.0))])
+    receivers = base.subset(np.zeros(len(points), dtype=int))
+    receivers.data[ROW_INDEX['x']:ROW_INDEX['z'] + 1] = points.T
+    return receivers
+
+
+@in_stage("field_map")
+def interference_field(tx_list, rx, mast_size=(5, 5, 50), step=1.0, margin=None, antenna_file=ANTENNA_FILE,
+                       max_cells=FIELD_MAX_CELLS, progress=None):
+    """
+    Суммарная помеха от всех TX в каждой точке сетки field_grid(mast_size, step, margin)
+    для антенны, ориентации и частоты приёмника rx. tx_list — словари process_unit или UnitArrays.
+    progress(done, total) вызывается после каждого блока точек (см. jobs.Job.report).
+    """
+    xs, ys, zs = field_grid(mast_size, step, margin)
+    tx = tx_list if isinstance(tx_list, UnitArrays) else UnitArrays.from_units(tx_list)
+    gx, gy, gz = np.meshgrid(xs, ys, zs, indexing='ij')
+    points = np.column_stack([gx.ravel(), gy.ravel(), gz.ravel()])
+
+    n_points = len(points)
+    pint = np.full(n_points, np.nan)
+    worst = np.full(n_points, -1, dtype=np.int32)
+    threshold = np.nan
+    chunk = max(1, max_cells // max(len(tx), 1))
+    for lo in range(0, n_points if len(tx) else 0, chunk):
+        sl = slice(lo, min(lo + chunk, n_points))
+        res = analyze_site_matrix(tx, grid_receivers(rx, points[sl]), antenna_file)
+        pint[sl], worst[sl] = sum_pint_dbm(res)
+        threshold = float(res['threshold'][0, 0])
+        if progress:
+            progress(sl.stop, n_points)
+
+    shape = (len(xs), len(ys), len(zs))
+    return FieldMap(xs, ys, zs, pint.reshape(shape), worst.reshape(shape), threshold, unit_names(tx))
+
+
+@in_stage("plotting")
+def plot_field_map(fmap, tx_list, rx=None, mast_size=(5, 5, 50), slice_at=None):
+    """
+    Мачта с антеннами (antenna_viewer.draw_scene) и граница зоны превышения порога в 3D
+    + три среза карты Pint через точку slice_at (по умолчанию — позиция rx или центр мачты на половине высоты).
+    """
+    import matplotlib.pyplot as plt
+    from antenna_viewer import draw_scene
+
+    if slice_at is None:
+        slice_at = tuple(rx['coords']) if rx and rx.get('coords') else (0.0, 0.0, mast_size[2] / 2)
+    x0, y0, z0 = (float(axis[i]) for axis, i in zip((fmap.xs, fmap.ys, fmap.zs), fmap.nearest_index(slice_at)))
+
+    fig = plt.figure(figsize=(16, 7))
+    grid = fig.add_gridspec(2, 3, width_ratios=[1.3, 1, 1])
+    ax3d = fig.add_subplot(grid[:, 0], projection='3d')
+    draw_scene(ax3d, tx_list, [rx] if rx else [], mast_size)
+    surface = fmap.exceed_surface()
+    if len(surface):
+        ax3d.scatter(surface[:, 0], surface[:, 1], surface[:, 2], s=4, color='tab:orange', alpha=0.3)
+        ax3d.plot([], [], [], color='tab:orange', label='Pint = поріг')
+        ax3d.legend(fontsize=8)
+
+    finite = fmap.pint_dbm[np.isfinite(fmap.pint_dbm)]
+    vmin, vmax = (np.percentile(finite, 1), np.percentile(finite, 99)) if len(finite) else (-120, 0)
+    panels = [('z', z0, grid[0, 1], 'X [м]', 'Y [м]'), ('y', y0, grid[0, 2], 'X [м]', 'Z [м]'),
+              ('x', x0, grid[1, 1], 'Y [м]', 'Z [м]')]
+    image = None
+    for axis, value, cell, xlabel, ylabel in panels:
+        ax = fig.add_subplot(cell)
+        data, (h_axis, v_axis) = fmap.slice(axis, value)
+        image = ax.pcolormesh(h_axis, v_axis, data.T, shading='nearest', cmap='inferno', vmin=vmin, vmax=vmax)
+        if np.any(np.isfinite(data)) and np.nanmin(data) < fmap.threshold < np.nanmax(data):
+            ax.contour(h_axis, v_axis, data.T, levels=[fmap.threshold], colors='cyan', linewidths=1)
+        ax.set_title(f'Pint, {axis.upper()} = {value:.1f} м', fontsize=9)
+        ax.set_xlabel(xlabel, fontsize=8)
+        ax.set_ylabel(ylabel, fontsize=8)
+        ax.set_aspect('equal')
+        ax.tick_params(labelsize=7)
+
+    cax = fig.add_subplot(grid[1, 2])
+    cax.axis('off')
+    if image is not None:
+        fig.colorbar(image, ax=cax, fraction=0.8, label='Pint, дБм (блакитна лінія — поріг)')
+    fig.tight_layout()
+    return fig
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    parser = argparse.ArgumentParser(description="Об'ємна карта завад навколо щогли для антени приймача")
+    parser.add_argument("--rx", type=int, default=0, help="номер приймача в site_config.site (з 0)")
+    parser.add_argument("--mast", type=float, nargs=3, default=[10.0, 10.0, 60.0], metavar=("W", "D", "H"))
+    parser.add_argument("--step", type=float, default=1.0, help="крок сітки, м")
+    parser.add_argument("-o", "--output", default=None, help="PNG з картою")
+    args = parser.parse_args()
+
+    import time
+    from site_config import site
+    from site_loader import process_site
+    site = process_site(site, "DeviceDB.xlsx", ANTENNA_FILE)
+    rx = site['rx_list'][args.rx]
+    start = time.perf_counter()
+    fmap = interference_field(site['tx_list'], rx, tuple(args.mast), args.step)
+    elapsed = time.perf_counter() - start
+    print(f"🗺️ Сітка {fmap.shape[0]}×{fmap.shape[1]}×{fmap.shape[2]} ({np.prod(fmap.shape)} точок): {elapsed:.2f} s")
+    ok = np.count_nonzero(fmap.margin >= 0)
+    print(f"✅ Точок без перевищення порогу {fmap.threshold:.1f} дБм: {ok}")
+    for x, y, z, p, m in fmap.best_points(5):
+        print(f"   ({x:.1f}, {y:.1f}, {z:.1f}) м: Pint = {p:.1f} дБм, запас {m:.1f} дБ")
+    if args.output:
+        plot_field_map(fmap, site['tx_list'], rx, tuple(args.mast)).savefig(args.output, dpi=100)
+        print(f"🖼️ Карту збережено: {args.output}")
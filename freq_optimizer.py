@@ -0,0 +1,228 @@
+# freq_optimizer.py
+#
+# Подбор частотного плана: имитация отжига по частотам TX/RX в пределах Freq Min/Max из DeviceDB
+# с сеткой по BW Options. Цена плана — IM-попадания выше порога + превышения Pint/блокирования.
+# Несколько цепочек отжига работают параллельно в пуле процессов; лучший план выдаётся по мере улучшения.
+#
+# Использование:
+#   python freq_optimizer.py [время, с]
+
+import os
+import sys
+import copy
+import math
+import time
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from device_catalog import load_device_catalog
+from ems_matrix import analyze_site_matrix
+from im_engine import analyze_im_site
+
+# Веса составляющих цены плана
+COST_WEIGHTS = {
+    'im_hits': 10.0,         # IM-продукт в полосе RX и выше порога
+    'pint_violations': 5.0,  # Pint > sensitivity + 10
+    'block_violations': 5.0, # блокирование превышено
+    'excess_db': 0.1,        # суммарное превышение порогов, дБ
+}
+
+
+def allowed_frequencies(unit, catalog, raster_khz=None):
+    """
+    Допустимые частоты устройства (МГц): сетка от Freq Min до Freq Max с шагом raster_khz
+    (по умолчанию — наименьшая из BW Options устройства).
+    """
+    record = catalog.get(unit['device_name'])
+    if record is None or record.freq_min is None or record.freq_max is None:
+        return np.array([unit['frequency_mhz']], dtype=float)
+    step = (raster_khz or min(record.bw_options)) / 1000
+    n = int(math.floor((record.freq_max - record.freq_min) / step + 1e-9)) + 1
+    return np.round(record.freq_min + step * np.arange(n), 6)
+
+
+class PlanEvaluator:
+    """
+    Инкрементальная цена плана: при смене частоты одного TX пересчитывается его строка матрицы ЭМС,
+    одного RX — его столбец; IM-продукты пересчитываются целиком (с отсечением по окнам RX это дёшево).
+    """
+
+    def __init__(self, tx_list, rx_list, weights=None, im_orders=(3,), three_tone=False):
+        self.tx_list = [dict(tx) for tx in tx_list]
+        self.rx_list = [dict(rx) for rx in rx_list]
+        self.weights = dict(COST_WEIGHTS, **(weights or {}))
+        self.im_orders = im_orders
+        self.three_tone = three_tone
+        n, m = len(self.tx_list), len(self.rx_list)
+        self.pint_viol = np.zeros((n, m), dtype=bool)
+        self.block_viol = np.zeros((n, m), dtype=bool)
+        self.excess = np.zeros((n, m))
+        self.evaluations = 0
+        self._update_pairs(analyze_site_matrix(self.tx_list, self.rx_list), slice(None), slice(None))
+        self.im_hits = self._count_im_hits()
+
+    def _update_pairs(self, res, rows, cols):
+        valid = res['valid']
+        pint_over = np.where(valid, res['Pint'] - res['threshold'], 0)
+        block_over = np.where(res['block_considered'], res['Pblock'] - res['block_threshold'], 0)
+        self.pint_viol[rows, cols] = pint_over > 0
+        self.block_viol[rows, cols] = block_over > 0
+        self.excess[rows, cols] = np.maximum(pint_over, 0) + np.maximum(np.nan_to_num(block_over), 0)
+
+    def _count_im_hits(self):
+        if len(self.tx_list) < 2 or not self.rx_list:
+            return 0
+        im = analyze_im_site(self.tx_list, self.rx_list, orders=self.im_orders, three_tone=self.three_tone)
+        return int(np.count_nonzero(im.in_band & im.exceeds))
+
+    def details(self):
+        return {
+            'im_hits': self.im_hits,
+            'pint_violations': int(self.pint_viol.sum()),
+            'block_violations': int(self.block_viol.sum()),
+            'excess_db': float(self.excess.sum()),
+        }
+
+    def cost(self):
+        return sum(self.weights[k] * v for k, v in self.details().items())
+
+    def set_frequency(self, role, index, freq):
+        """Меняет частоту TX/RX и пересчитывает только затронутые пары. Возвращает новую цену."""
+        self.evaluations += 1
+        if role == 'tx':
+            self.tx_list[index]['frequency_mhz'] = freq
+            self._update_pairs(analyze_site_matrix([self.tx_list[index]], self.rx_list), index, slice(None))
+        else:
+            self.rx_list[index]['frequency_mhz'] = freq
+            res = analyze_site_matrix(self.tx_list, [self.rx_list[index]])
+            self._update_pairs({k: v[:, 0] for k, v in res.arrays.items() if np.ndim(v) == 2},
+                               slice(None), index)
+        self.im_hits = self._count_im_hits()
+        return self.cost()
+
+    def plan(self):
+        return {'tx': [tx['frequency_mhz'] for tx in self.tx_list],
+                'rx': [rx['frequency_mhz'] for rx in self.rx_list]}
+
+
+def _anneal_chain(tx_list, rx_list, allowed, start_plan, seed, seconds, t_start, t_end, weights, im_orders, three_tone):
+    """Одна цепочка отжига (выполняется в процессе пула). Возвращает (цена, план, детали, число оценок)."""
+    rng = random.Random(seed)
+    tx_list = copy.deepcopy(tx_list)
+    rx_list = copy.deepcopy(rx_list)
+    for tx, f in zip(tx_list, start_plan['tx']):
+        tx['frequency_mhz'] = f
+    for rx, f in zip(rx_list, start_plan['rx']):
+        rx['frequency_mhz'] = f
+
+    ev = PlanEvaluator(tx_list, rx_list, weights, im_orders, three_tone)
+    cost = ev.cost()
+    best = (cost, ev.plan(), ev.details())
+    movable = [key for key, freqs in allowed.items() if len(freqs) > 1]
+    if not movable:
+        return best + (ev.evaluations,)
+
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        frac = 1 - max(deadline - time.time(), 0) / seconds
+        temperature = t_start * (t_end / t_start) ** frac
+        role, index = rng.choice(movable)
+        freqs = allowed[(role, index)]
+        units = ev.tx_list if role == 'tx' else ev.rx_list
+        old = units[index]['frequency_mhz']
+        # шаг: чаще — соседние каналы, иногда — прыжок в любую точку диапазона
+        if rng.random() < 0.7:
+            pos = int(np.searchsorted(freqs, old))
+            new = float(freqs[min(max(pos + rng.randint(-20, 20), 0), len(freqs) - 1)])
+        else:
+            new = float(rng.choice(freqs))
+        if new == old:
+            continue
+        new_cost = ev.set_frequency(role, index, new)
+        if new_cost <= cost or rng.random() < math.exp((cost - new_cost) / max(temperature, 1e-9)):
+            cost = new_cost
+            if cost < best[0]:
+                best = (cost, ev.plan(), ev.details())
+        else:
+            ev.set_frequency(role, index, old)
+    return best + (ev.evaluations,)
+
+
+def optimize_frequency_plan(site, device_file="DeviceDB.xlsx", time_budget_s=30, workers=None, round_s=None,
+                            allowed=None, fixed=(), raster_khz=None, weights=None, im_orders=(3,), three_tone=False,
+                            seed=None):
+    """
+    Генератор: запускает параллельные цепочки отжига и выдаёт лучший план каждый раз, когда он улучшается.
+    site — уже обработанный process_site сайт.
+    allowed — {('tx'|'rx', индекс): массив частот}, по умолчанию из DeviceDB; fixed — ключи юнитов,
+    частоты которых менять нельзя.
+    Каждый выданный элемент: {'cost', 'plan', 'details', 'elapsed_s', 'evaluations', 'round'}.
+    """
+    catalog = load_device_catalog(device_file)
+    tx_list, rx_list = site['tx_list'], site['rx_list']
+    if allowed is None:
+        allowed = {}
+        for role, units in (('tx', tx_list), ('rx', rx_list)):
+            for i, u in enumerate(units):
+                allowed[(role, i)] = allowed_frequencies(u, catalog, raster_khz)
+    for key in fixed:
+        units = tx_list if key[0] == 'tx' else rx_list
+        allowed[key] = np.array([units[key[1]]['frequency_mhz']], dtype=float)
+
+    workers = workers or os.cpu_count() or 1
+    round_s = round_s or max(min(time_budget_s / 5, 10), 0.5)
+    rng = random.Random(seed)
+    start = time.time()
+
+    ev = PlanEvaluator(tx_list, rx_list, weights, im_orders, three_tone)
+    best = {'cost': ev.cost(), 'plan': ev.plan(), 'details': ev.details(),
+            'elapsed_s': 0.0, 'evaluations': 0, 'round': 0}
+    yield dict(best)
+
+    evaluations = 0
+    round_no = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while time.time() - start < time_budget_s and best['cost'] > 0:
+            round_no += 1
+            seconds = min(round_s, time_budget_s - (time.time() - start))
+            if seconds <= 0.05:
+                break
+            progress = (time.time() - start) / time_budget_s
+            t_start = 5.0 * (1 - progress) + 0.05
+            futures = [pool.submit(_anneal_chain, tx_list, rx_list, allowed, best['plan'], rng.random(), seconds,
+                                   t_start, 0.05, weights, im_orders, three_tone)
+                       for _ in range(workers)]
+            for fut in futures:
+                cost, plan, details, n_eval = fut.result()
+                evaluations += n_eval
+                if cost < best['cost']:
+                    best = {'cost': cost, 'plan': plan, 'details': details,
+                            'elapsed_s': time.time() - start, 'evaluations': evaluations, 'round': round_no}
+                    yield dict(best)
+
+
+def apply_plan(site, plan):
+    """Записывает частоты плана в копию сайта"""
+    site = copy.deepcopy(site)
+    for tx, f in zip(site['tx_list'], plan['tx']):
+        tx['frequency_mhz'] = f
+    for rx, f in zip(site['rx_list'], plan['rx']):
+        rx['frequency_mhz'] = f
+    return site
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    from site_loader import process_site
+    from site_config import site
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    site_data = process_site(site, "DeviceDB.xlsx", "AntennaDN.xlsx")
+    for step in optimize_frequency_plan(site_data, time_budget_s=budget):
+        d = step['details']
+        print(f"⏱ {step['elapsed_s']:.1f} s  💰 cost = {step['cost']:.2f}  "
+              f"(IM: {d['im_hits']}, Pint: {d['pint_violations']}, block: {d['block_violations']}, "
+              f"excess: {d['excess_db']:.1f} dB)")
+        print(f"   TX: {step['plan']['tx']}")
+        print(f"   RX: {step['plan']['rx']}")
@@ -0,0 +1,198 @@
+# freq_sweep.py
+#
+# Развёртка частоты приёмника: суммарная помеха Pint, блокирование и попадания IM-продуктов на каждой частоте
+# сетки (например 140–175 МГц с шагом 6.25 кГц) при неизменных позиции, антенне и ориентации RX.
+# Сетка — набор «виртуальных приёмников» UnitArrays (копии RX с разной частотой), которые считаются теми же
+# матричными моделями, что и весь сайт (analyze_site_matrix, compute_im_levels), блоками по частоте.
+#
+#   sweep = sweep_rx_frequency(tx_list, rx, 140, 175, step_khz=6.25)
+#   sweep.passing_ranges()   # [(f_lo, f_hi), ...] — частоты без превышений
+#
+# CLI (сайт из site_config.py):
+#   python freq_sweep.py [--rx 0] [--start 140] [--stop 175] [--step 6.25] [--orders 3 5] [-o spectrum.png]
+
+import argparse
+import numpy as np
+from site_arrays import UnitArrays, ROW_INDEX
+from ems_matrix import ANTENNA_FILE, analyze_site_matrix, sum_pint_dbm, unit_column, unit_names
+from im_engine import RxWindowIndex, generate_im_products, compute_im_levels
+from instrumentation import in_stage
+
+# Ограничение размера блока: число ячеек матриц (TX или IM-продукты) × частоты за один проход
+SWEEP_MAX_CELLS = 2_000_000
+
+
+def frequency_grid(f_start, f_stop, step_khz):
+    """Сетка частот RX (МГц) от f_start до f_stop включительно с шагом step_khz"""
+    if step_khz <= 0:
+        raise ValueError(f"❌ Крок сітки має бути додатним: {step_khz} кГц")
+    if f_stop < f_start:
+        raise ValueError(f"❌ Кінець діапазону {f_stop} МГц менший за початок {f_start} МГц")
+    n = int(np.floor((f_stop - f_start) * 1000 / step_khz + 1e-9)) + 1
+    return np.round(f_start + np.arange(n) * step_khz / 1000, 9)
+
+
+def sweep_receivers(rx, freqs):
+    """Копии приёмника rx (словарь process_unit) на частотах freqs в виде UnitArrays"""
+    base = UnitArrays.from_units([rx])
+    receivers = base.subset(np.zeros(len(freqs), dtype=int))
+    receivers.data[ROW_INDEX['frequency_mhz']] = freqs
+    return receivers
+
+
+class FrequencySweep:
+    """
+    Результат развёртки: массивы длины F по сетке частот.
+    pint_dbm — суммарная (по мощности) помеха от всех TX, worst_tx — TX с наибольшим вкладом,
+    block_count — число TX с превышением блокирования, im_hits — число IM-продуктов выше порога в полосе RX.
+    """
+
+    def __init__(self, freqs, pint_dbm, worst_tx, threshold, block_count, im_hits, tx_names, rx_name=''):
+        self.freqs = freqs
+        self.pint_dbm = pint_dbm
+        self.worst_tx = worst_tx
+        self.threshold = threshold
+        self.block_count = block_count
+        self.im_hits = im_hits
+        self.tx_names = tx_names
+        self.rx_name = rx_name
+        self.pint_passed = ~(pint_dbm > threshold)
+        self.passed = self.pint_passed & (block_count == 0) & (im_hits == 0)
+
+    def __len__(self):
+        return len(self.freqs)
+
+    def passing_frequencies(self):
+        return self.freqs[self.passed]
+
+    def passing_ranges(self):
+        """Непрерывные участки сетки без превышений: [(f_lo, f_hi), ...]"""
+        edges = np.diff(np.concatenate([[0], self.passed.astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+        return [(float(self.freqs[s]), float(self.freqs[e])) for s, e in zip(starts, ends)]
+
+    def summary(self):
+        return (f"Частот: {len(self)}, без завад: {int(self.passed.sum())}; "
+                f"Pint: {int((~self.pint_passed).sum())}, блокування: {int((self.block_count > 0).sum())}, "
+                f"IM: {int((self.im_hits > 0).sum())}")
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame({
+            'freq_mhz': self.freqs,
+            'pint_dbm': self.pint_dbm,
+            'threshold_dbm': self.threshold,
+            'worst_tx': [self.tx_names[i] if i >= 0 else '' for i in self.worst_tx],
+            'pint_passed': self.pint_passed,
+            'block_count': self.block_count,
+            'im_hits': self.im_hits,
+            'passed': self.passed,
+        })
+
+    @in_stage("plotting")
+    def plot(self, ax=None):
+        """Спектр завад: Pint по частоті, поріг, смуги блокування та IM; повертає figure"""
+        import matplotlib.pyplot as plt
+        if ax is None:
+            fig, ax = plt.subplots(figsize=(12, 5))
+        else:
+            fig = ax.figure
+        ax.plot(self.freqs, self.pint_dbm, lw=1, color='tab:blue', label='Сумарна завада Pint (дБм)')
+        ax.plot(self.freqs, self.threshold, lw=1, ls='--', color='black', label='Поріг')
+        y0, y1 = ax.get_ylim()
+        ax.fill_between(self.freqs, y0, y1, where=self.block_count > 0, step='mid',
+                        color='tab:red', alpha=0.25, lw=0, label='Блокування')
+        ax.fill_between(self.freqs, y0, y1, where=self.im_hits > 0, step='mid',
+                        color='tab:orange', alpha=0.35, lw=0, label='IM-продукти')
+        ax.fill_between(self.freqs, y0, y1, where=self.passed, step='mid',
+                        color='tab:green', alpha=0.12, lw=0, label='Вільні частоти')
+        ax.set_ylim(y0, y1)
+        ax.set_xlabel('Частота RX (МГц)')
+        ax.set_ylabel('дБм')
+        ax.set_title(f'Спектр завад на приймачі {self.rx_name}'.strip())
+        ax.grid(True, alpha=0.4)
+        ax.legend(fontsize=8, loc='upper right')
+        fig.tight_layout()
+        return fig
+
+
+def _im_window_products(products, freqs, width):
+    """IM-продукты, которые могут попасть в полосу хотя бы одной частоты блока"""
+    return products.subset((products.freq > freqs[0] - width) & (products.freq < freqs[-1] + width))
+
+
+@in_stage("freq_sweep")
+def sweep_rx_frequency(tx_list, rx, f_start, f_stop, step_khz=6.25, orders=(3,), three_tone=False,
+                       antenna_file=ANTENNA_FILE, max_cells=SWEEP_MAX_CELLS, progress=None):
+    """
+    Развёртка частоты приёмника rx (словарь process_unit) по сетке frequency_grid(f_start, f_stop, step_khz).
+    tx_list — список словарей process_unit или UnitArrays. Возвращает FrequencySweep.
+    progress(done, total) вызывается после каждого блока частот (см. jobs.Job.report).
+    """
+    freqs = frequency_grid(f_start, f_stop, step_khz)
+    tx = tx_list if isinstance(tx_list, UnitArrays) else UnitArrays.from_units(tx_list)
+    receivers = sweep_receivers(rx, freqs)
+
+    # IM-продукты не зависят от частоты RX: строятся один раз, только попадающие в окна сетки
+    products = generate_im_products(tx, orders=orders, three_tone=three_tone,
+                                    index=RxWindowIndex.from_units(tx, receivers)) if len(tx) >= 2 else None
+    bw_rx = float(unit_column([rx], 'BW_khz')[0])
+    im_width = 1.5 * (np.max(unit_column(tx, 'BW_khz'), initial=0) + bw_rx) / 1000
+
+    n_freq = len(freqs)
+    pint = np.full(n_freq, np.nan)
+    worst = np.full(n_freq, -1)
+    threshold = np.empty(n_freq)
+    block_count = np.zeros(n_freq, dtype=int)
+    im_hits = np.zeros(n_freq, dtype=int)
+
+    rows = max(len(tx), len(products) if products is not None else 0, 1)
+    chunk = max(1, max_cells // rows)
+    for lo in range(0, n_freq, chunk):
+        sl = slice(lo, min(lo + chunk, n_freq))
+        block_rx = receivers.subset(sl)
+        res = analyze_site_matrix(tx, block_rx, antenna_file)
+
+        pint[sl], worst[sl] = sum_pint_dbm(res)
+        threshold[sl] = res['threshold'][0] if len(tx) else np.nan
+        block_count[sl] = np.count_nonzero(res['block_considered'] & ~res['block_passed'], axis=0)
+
+        if products is not None and len(products):
+            near = _im_window_products(products, freqs[sl], im_width)
+            if len(near):
+                levels, delta_f, delta_bw = compute_im_levels(near, tx, block_rx, antenna_file)
+                im_hits[sl] = np.count_nonzero((delta_f < delta_bw) & (levels > threshold[sl][None, :]), axis=0)
+        if progress:
+            progress(sl.stop, n_freq)
+
+    return FrequencySweep(freqs, pint, worst, threshold, block_count, im_hits,
+                          unit_names(tx), rx.get('device_name', ''))
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    parser = argparse.ArgumentParser(description="Розгортка частоти приймача: спектр завад та вільні частоти")
+    parser.add_argument("--rx", type=int, default=0, help="номер приймача в site_config.site (з 0)")
+    parser.add_argument("--start", type=float, default=140.0, help="початок діапазону, МГц")
+    parser.add_argument("--stop", type=float, default=175.0, help="кінець діапазону, МГц")
+    parser.add_argument("--step", type=float, default=6.25, help="крок сітки, кГц")
+    parser.add_argument("--orders", type=int, nargs="+", default=[3])
+    parser.add_argument("--three-tone", action="store_true")
+    parser.add_argument("-o", "--output", default=None, help="PNG зі спектром")
+    args = parser.parse_args()
+
+    from site_config import site
+    from site_loader import process_site
+    site = process_site(site, "DeviceDB.xlsx", ANTENNA_FILE)
+    rx = site['rx_list'][args.rx]
+    sweep = sweep_rx_frequency(site['tx_list'], rx, args.start, args.stop, args.step,
+                               tuple(args.orders), args.three_tone)
+    print(f"📡 RX #{args.rx + 1} {rx['device_name']}: {args.start}–{args.stop} МГц, крок {args.step} кГц")
+    print(f"📊 {sweep.summary()}")
+    print("✅ Вільні діапазони:")
+    for lo, hi in sweep.passing_ranges():
+        print(f"   {lo:.5f} – {hi:.5f} МГц")
+    if args.output:
+        sweep.plot().savefig(args.output, dpi=100)
+        print(f"🖼️ Спектр збережено: {args.output}")
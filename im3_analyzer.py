@@ -4,10 +4,11 @@ import math
 import itertools
 from site_loader import process_site
 from site_config import site
-from polarization_loss import get_polarization_loss
-from antenna_utils import load_antenna_pattern, interpolate_gain
-import io
-import contextlib
+from polarization_loss import unit_polarization_loss
+from pattern_cache import get_antenna_pattern
+from im_engine import generate_im_products, compute_im_levels, RxWindowIndex, IMProducts
+from dataclasses import dataclass
+from instrumentation import counted, in_stage
 
 def compute_fspl(freq_mhz, distance_km):
     if distance_km <= 0:
@@ -18,6 +19,8 @@ def distance_3d(p1, p2):
     return math.sqrt(sum((a - b) ** 2 for a, b in zip(p1, p2))) / 1000
 
 def horizontal_direction(dx, dy):
+    if dx == 0 and dy == 0:  # строго по вертикали: 0°, иначе atan2(-0.0, -0.0) дал бы 180° для float-координат
+        return 0.0
     return (math.degrees(math.atan2(dx, dy)) + 360) % 360
 
 def elevation_angle(dz, dx, dy):
@@ -27,6 +30,7 @@ def elevation_angle(dz, dx, dy):
 def angle_difference(a1, a2):
     return min(abs(a1 - a2), 360 - abs(a1 - a2))
 
+@counted
 def compute_directional_gains(tx, rx):
     dx, dy, dz = (rc - tc for rc, tc in zip(rx['coords'], tx['coords']))
     az_tx_to_rx = horizontal_direction(dx, dy)
@@ -39,26 +43,27 @@ def compute_directional_gains(tx, rx):
     az_diff_rx = angle_difference(rx['azimuth'], az_rx_to_tx)
     el_diff_rx = angle_difference(rx['elevation'], el_rx_to_tx)
 
-    hor_tx, vert_tx = load_antenna_pattern("AntennaDN.xlsx", tx['antenna_name'])
-    hor_rx, vert_rx = load_antenna_pattern("AntennaDN.xlsx", rx['antenna_name'])
+    pattern_tx = get_antenna_pattern("AntennaDN.xlsx", tx['antenna_name'])
+    pattern_rx = get_antenna_pattern("AntennaDN.xlsx", rx['antenna_name'])
 
-    G_hor_tx = 0 if dx == 0 and dy == 0 else interpolate_gain(hor_tx, az_diff_tx, 'azimuth_deg')
-    G_vert_tx = interpolate_gain(vert_tx, el_diff_tx, 'elevation_deg')
+    G_hor_tx = 0 if dx == 0 and dy == 0 else pattern_tx.azimuth_gain(az_diff_tx)
+    G_vert_tx = pattern_tx.elevation_gain(el_diff_tx)
     gt = tx['gain_max'] + G_hor_tx + G_vert_tx
 
-    G_hor_rx = 0 if dx == 0 and dy == 0 else interpolate_gain(hor_rx, az_diff_rx, 'azimuth_deg')
-    G_vert_rx = interpolate_gain(vert_rx, el_diff_rx, 'elevation_deg')
+    G_hor_rx = 0 if dx == 0 and dy == 0 else pattern_rx.azimuth_gain(az_diff_rx)
+    G_vert_rx = pattern_rx.elevation_gain(el_diff_rx)
     gr = rx['gain_max'] + G_hor_rx + G_vert_rx
 
     return gt, gr
 
+@counted
 def compute_im3_level(tx1, tx2, rx, f_im3):
     d_km = distance_3d(tx1['coords'], rx['coords'])
     gt, gr = compute_directional_gains(tx1, rx)
     fspl_tx1 = compute_fspl(tx1['frequency_mhz'], d_km)
     fspl_tx2 = compute_fspl(tx2['frequency_mhz'], d_km)
     fspl_rx = compute_fspl(rx['frequency_mhz'], d_km)
-    polar_loss = get_polarization_loss(tx1.get('polarization'), rx.get('polarization'))
+    polar_loss = unit_polarization_loss(tx1, rx)
 
     delta_f = abs(f_im3 - rx['frequency_mhz'])
     delta_bw = 1.5 * (tx1['BW_khz'] + rx['BW_khz']) / 1000
@@ -83,6 +88,7 @@ def compute_im3_level(tx1, tx2, rx, f_im3):
 
     return 10 * math.log10(p_sum_mw)
 
+@counted
 def generate_im3_frequencies(tx_list, selected_tx_ids):
     im3_list = []
     for i, j in itertools.combinations(selected_tx_ids, 2):
@@ -92,38 +98,85 @@ def generate_im3_frequencies(tx_list, selected_tx_ids):
         im3_list.append((2 * f2 - f1, j, i))
     return im3_list
 
-def analyze_im3_candidates(site, tx_ids, rx_id, show_levels=False, use_markdown=False):
-    buffer = io.StringIO()
-    with contextlib.redirect_stdout(buffer):
-        site = process_site(site, "DeviceDB.xlsx", "AntennaDN.xlsx")
-        tx_list = site['tx_list']
-        rx = site['rx_list'][rx_id]
-
-        im3_list = generate_im3_frequencies(tx_list, tx_ids)
-        print(f"🔎 Third-order intermodulation frequency analysis for #{rx_id + 1} ({rx['frequency_mhz']} MHz):")
-
-        for f_im3, i, j in im3_list:
-            delta_f = abs(f_im3 - rx['frequency_mhz'])
-            delta_bw = 1.5 * (tx_list[i]['BW_khz'] + rx['BW_khz']) / 1000
-
-            # Формируем строку без HTML, просто с текстом
-            print(f"  ▶ 2f{i + 1} - f{j + 1} = {f_im3:.2f} MHz (|Δf - f_rx| = {delta_f:.2f} MHz)")
-
-            if show_levels:
-                try:
-                    level = compute_im3_level(tx_list[i], tx_list[j], rx, f_im3)
-                    threshold = rx.get('sensitivity_dbm', -100) + 10  # +10 dB for 90% coverage margin
-                    if level > threshold:
-                        print(
-                            f"     ⮑ IM interference level above sensitivity ({threshold:.0f} dBm for 90% coverage): {level:.2f} dBm")
-                    else:
-                        print(f"     ⮑ IM interference level estimate: {level:.2f} dBm")
-                except Exception as e:
-                    print(f"     ⚠️ Error calculating IM level: {e}")
-
-    return buffer.getvalue()
+@counted
+def format_im_report(rx, rx_id, products, levels=None, level_error=None, show_levels=False):
+    """
+    Текст отчёта по IM-продуктам для одного приёмника.
+    levels — уровни продуктов на этом приёмнике (массив длины len(products)).
+    """
+    lines = [f"🔎 Third-order intermodulation frequency analysis for #{rx_id + 1} ({rx['frequency_mhz']} MHz):"]
+    threshold = rx.get('sensitivity_dbm', -100) + 10  # +10 dB for 90% coverage margin
+
+    for n in range(len(products)):
+        f_im3 = products.freq[n]
+        delta_f = abs(f_im3 - rx['frequency_mhz'])
+
+        # Формируем строку без HTML, просто с текстом
+        lines.append(f"  ▶ {products.label(n)} = {f_im3:.2f} MHz (|Δf - f_rx| = {delta_f:.2f} MHz)")
+
+        if show_levels:
+            if level_error is not None:
+                lines.append(f"     ⚠️ Error calculating IM level: {level_error}")
+                continue
+            level = levels[n]
+            if level > threshold:
+                lines.append(
+                    f"     ⮑ IM interference level above sensitivity ({threshold:.0f} dBm for 90% coverage): {level:.2f} dBm")
+            else:
+                lines.append(f"     ⮑ IM interference level estimate: {level:.2f} dBm")
+    return "\n".join(lines) + "\n"
+
+@dataclass
+class IMReport:
+    """
+    Результат IM-анализа для одного приёмника: продукты и их уровни (levels — массив длины len(products)).
+    Текст отчёта формируется только при вызове format().
+    """
+    rx: dict
+    rx_id: int
+    products: IMProducts
+    levels: object = None
+    level_error: Exception = None
+
+    def format(self, show_levels=True):
+        return format_im_report(self.rx, self.rx_id, self.products, self.levels, self.level_error, show_levels)
+
+
+@in_stage("im_search")
+def analyze_im_candidates(site, tx_ids, rx_id, compute_levels=True, orders=(3,), three_tone=False, only_hits=False):
+    """
+    IM-продукты для одного приёмника (IMReport, без форматирования).
+    orders — порядки двухтоновых продуктов (3, 5, 7), three_tone — добавить f1 + f2 - f3.
+    only_hits — строить только продукты, близкие к полосе приёмника (RxWindowIndex).
+    Уровни считаются одним векторным вызовом im_engine.compute_im_levels.
+    """
+    site = process_site(site, "DeviceDB.xlsx", "AntennaDN.xlsx")
+    tx_list = site['tx_list']
+    rx = site['rx_list'][rx_id]
+
+    index = RxWindowIndex.from_units(tx_list, [rx], tx_ids) if only_hits else None
+    products = generate_im_products(tx_list, tx_ids, orders, three_tone, index)
+
+    report = IMReport(rx, rx_id, products)
+    if compute_levels:
+        try:
+            report.levels = compute_im_levels(products, tx_list, [rx])[0][:, 0]
+        except Exception as e:
+            report.level_error = e
+    return report
+
+
+def analyze_im3_candidates(site, tx_ids, rx_id, show_levels=False, use_markdown=False, orders=(3,), three_tone=False,
+                           only_hits=False):
+    """
+    Текстовый отчёт по IM-продуктам для одного приёмника (analyze_im_candidates + IMReport.format).
+    """
+    report = analyze_im_candidates(site, tx_ids, rx_id, show_levels, orders, three_tone, only_hits)
+    return report.format(show_levels)
 
 if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
     try:
         result = analyze_im3_candidates(site, tx_ids=[0, 1, 2], rx_id=0, show_levels=True, use_markdown=False)
         print(result)
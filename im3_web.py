@@ -1,30 +1,37 @@
 # im3_web.py
 
-from im3_analyzer import analyze_im3_candidates
-from site_loader import process_unit
-from ems_local_analyzer import analyze_tx_to_rx, format_ems_result
+from im3_analyzer import format_im_report
+from ems_local_analyzer import format_ems_result
+from interference_aggregate import aggregate_interference, format_aggregate_result
 import pandas as pd
-from antenna_utils import load_antenna_pattern, plot_antenna_patterns
+import numpy as np
+from antenna_utils import plot_antenna_patterns
+from pattern_cache import get_antenna_pattern
 from antenna_viewer import visualize_all_antennas
 from antenna_viewer import check_antenna_position, get_antenna_warnings
 import streamlit as st
-import os
-from fpdf import FPDF
+from pdf_report import build_pdf_report
 import base64
-import tempfile
+import web_cache
+import instrumentation
+from analysis_session import AnalysisSession
+from freq_sweep import sweep_rx_frequency
+from param_sweep import parametric_sweep, SweepAxis, SWEEP_PARAMS, PARAM_LABELS, METRICS
+from field_map import interference_field, plot_field_map
+from jobs import JOBS, JobCancelled, CANCELLED, DONE, ERROR
+import copy
 
 
 # === Завантаження даних ===
-def load_device_names_from_columns(filename, sheet_name=0):
-    df = pd.read_excel(filename, sheet_name=sheet_name, header=0)
-    return list(df.columns[1:])
+def option_index(options, value):
+    """Индекс value в списке выбора; 0, если значение пропало из каталога после перечитывания"""
+    return options.index(value) if value in options else 0
 
-def load_antenna_sheet_names(filename):
-    xls = pd.ExcelFile(filename)
-    return xls.sheet_names
-
-DEVICE_NAMES = load_device_names_from_columns("DeviceDB.xlsx")
-ANTENNA_NAMES = load_antenna_sheet_names("AntennaDN.xlsx")
+# Снимок каталога из реестра (книги перечитываются в фоне при изменении файлов), один на весь rerun
+catalog = web_cache.catalog()
+if st.session_state.get("catalog_version", catalog.version) != catalog.version:
+    st.toast(f"🔄 Каталог оновлено (версія {catalog.version})")
+st.session_state.catalog_version = catalog.version
 
 st.header("Аналізатор ЕМС між радіоелектроними засобами на локальному об'єкті")
 
@@ -36,8 +43,8 @@ st.sidebar.subheader("➕ Додати передавач")
 
 if st.sidebar.button("Додати TX"):
     st.session_state.tx_list.append({
-        'device_name': DEVICE_NAMES[0],
-        'antenna_name': ANTENNA_NAMES[0],
+        'device_name': catalog.device_names[0],
+        'antenna_name': catalog.antenna_names[0],
         'power_dbm': 44.0,
         'frequency_mhz': 160.0,
         'BW_khz': 12.5,
@@ -66,14 +73,59 @@ if st.sidebar.button("Візуалізувати мачту з антенами"
 if st.sidebar.button("Закрити візуалізацію"):
     st.session_state.show_mast = False
 
+# Карта сумарної завади навколо щогли для антени RX (зрізи поруч із видом щогли)
+show_field_map = st.sidebar.checkbox("🌡️ Карта завад для антени RX", value=False, key="show_field_map")
+field_step = st.sidebar.number_input("Крок сітки карти (м)", min_value=0.25, value=1.0, step=0.25, key="field_step",
+                                     disabled=not show_field_map)
+
+with st.sidebar.expander("🗄️ Кеш", expanded=False):
+    stats = web_cache.cache_stats()
+    st.caption(f"Каталог: версія {stats['catalog_version']}, перечитувань {stats['catalog_reloads']} "
+               f"({stats['catalog_watch']})")
+    if stats['catalog_error']:
+        st.caption(f"⚠️ Помилка перечитування: {stats['catalog_error']}")
+    for name in ("catalog", "patterns", "validation", "results", "figures"):
+        c = stats[name]
+        st.caption(f"{name}: {c['size']}/{c['maxsize']} записів, влучань {c['hits']}, промахів {c['misses']}, "
+                   f"витіснено {c['evictions']}")
+    st.caption(f"PNG: {stats['figures']['nbytes'] / 1024:.0f} KB з {stats['figures']['max_bytes'] / 1024 / 1024:.0f} MB")
+    st.caption(f"Скидань кешу: {stats['invalidations']}"
+               + (f" (останнє: {stats['last_invalidation']})" if stats['last_invalidation'] else ""))
+    if st.button("🧹 Очистити кеш", key="clear_cache"):
+        web_cache.clear_all()
+        st.rerun()
+
+# Профілювання: лічильники та час етапів поточного запуску скрипта (instrumentation)
+with st.sidebar.expander("⏱️ Профілювання", expanded=False):
+    profiling = st.checkbox("Увімкнути профілювання", value=False, key="profiling")
+    profile_memory = st.checkbox("Пам'ять (tracemalloc)", value=False, key="profile_memory", disabled=not profiling)
+    profile_panel = st.container()
+# Поки фонові завдання виконуються (або їхні результати ще не забрано), лічильники не скидаються
+# і tracemalloc не зупиняється — інакше час і пам'ять етапів завдання губляться чи діляться між запусками
+if not (JOBS.active() or st.session_state.get("jobs")):
+    instrumentation.disable()
+    if profiling:
+        instrumentation.reset()
+if profiling:
+    instrumentation.enable(trace_memory=profile_memory)
+
 if st.session_state.show_mast:
     tx_list = st.session_state.tx_list
     rx = st.session_state.rx
     if (len(tx_list) == 0 and (not rx or rx == {})):
         st.sidebar.warning("⚠️ Потрібно додати хоча б один передавач або приймач.")
     else:
-        fig = visualize_all_antennas(tx_list, [rx], mast_size=mast_size, show=False)
-        st.pyplot(fig)
+        if show_field_map and tx_list and rx:
+            png = web_cache.cached_figure_png(
+                "field", (tx_list, rx, mast_size, field_step),
+                lambda: plot_field_map(interference_field(tx_list, rx, mast_size, field_step,
+                                                          antenna_file=web_cache.ANTENNA_FILE),
+                                       tx_list, rx, mast_size))
+        else:
+            png = web_cache.cached_figure_png(
+                "mast", (tx_list, rx, mast_size),
+                lambda: visualize_all_antennas(tx_list, [rx], mast_size=mast_size, show=False))
+        st.image(png)
 
 if "rx" not in st.session_state:
     st.session_state.rx = {}
@@ -84,8 +136,8 @@ st.subheader("📡 Налаштування передавачів")
 tx_list = st.session_state.tx_list
 for i, tx in enumerate(tx_list):
     with st.expander(f"📡 Передавач #{i+1}", expanded=False):
-        tx['device_name'] = st.selectbox(f"📻 Пристрій TX #{i+1}", DEVICE_NAMES, index=DEVICE_NAMES.index(tx.get("device_name", DEVICE_NAMES[0])), key=f"device_name_tx_{i}")
-        tx['antenna_name'] = st.selectbox(f"📡 Антена TX #{i+1}", ANTENNA_NAMES, index=ANTENNA_NAMES.index(tx.get("antenna_name", ANTENNA_NAMES[0])), key=f"antenna_tx_{i}")
+        tx['device_name'] = st.selectbox(f"📻 Пристрій TX #{i+1}", catalog.device_names, index=option_index(catalog.device_names, tx.get("device_name")), key=f"device_name_tx_{i}")
+        tx['antenna_name'] = st.selectbox(f"📡 Антена TX #{i+1}", catalog.antenna_names, index=option_index(catalog.antenna_names, tx.get("antenna_name")), key=f"antenna_tx_{i}")
         tx['power_dbm'] = st.number_input(f"🔌 Потужність TX #{i+1} (дБм)", value=tx.get("power_dbm", 44.0), step=0.1, key=f"power_tx_{i}")
         tx['frequency_mhz'] = st.number_input(f"📶 Частота TX #{i+1} (МГц)", value=tx.get("frequency_mhz", 160.0),step=0.1, key=f"freq_tx_{i}")
         tx['BW_khz'] = st.number_input(f"📏 Ширина смуги TX #{i + 1} (кГц)", value=tx.get("BW_khz", 12.5), step=0.1, key=f"bw_tx_{i}")
@@ -104,7 +156,7 @@ for i, tx in enumerate(tx_list):
         tx['loss'] = st.number_input(f"📉 Втрати TX #{i+1} (дБ)", value=tx.get("loss", 4.0),step=0.1, key=f"loss_tx_{i}")
 
         try:
-            process_unit(tx, "DeviceDB.xlsx", "AntennaDN.xlsx", index=i, role="tx")
+            web_cache.validate_unit(tx, role="tx", index=i)
             st.success("✅ Передавач успішно перевірено на відповідність параметрів.")
 
             # Показываем предупреждения по позициям для всех антенн текущего набора:
@@ -119,8 +171,8 @@ for i, tx in enumerate(tx_list):
 st.subheader("📡 Налаштування приймача")
 rx = st.session_state.rx
 with st.expander("📡 Приймач", expanded=st.session_state.expanded_rx):
-    rx['device_name'] = st.selectbox("📻 Пристрій RX", options=DEVICE_NAMES, index=DEVICE_NAMES.index(rx.get("device_name", DEVICE_NAMES[0])), key="device_name_rx")
-    rx['antenna_name'] = st.selectbox("📡 Антена RX", options=ANTENNA_NAMES, index=ANTENNA_NAMES.index(rx.get("antenna_name", ANTENNA_NAMES[0])), key="antenna_rx")
+    rx['device_name'] = st.selectbox("📻 Пристрій RX", options=catalog.device_names, index=option_index(catalog.device_names, rx.get("device_name")), key="device_name_rx")
+    rx['antenna_name'] = st.selectbox("📡 Антена RX", options=catalog.antenna_names, index=option_index(catalog.antenna_names, rx.get("antenna_name")), key="antenna_rx")
     rx['frequency_mhz'] = st.number_input("📶 Частота RX (МГц)", value=rx.get("frequency_mhz", 150.0),step=0.1, key="freq_rx")
     rx['BW_khz'] = st.number_input("📏 Ширина смуги RX (кГц)", value=rx.get("BW_khz", 12.5), step=0.1, key="bw_rx")
     rx['azimuth'] = st.number_input("🧭 Азимут RX (°)", value=rx.get("azimuth", 0.0),step=0.1, key="azimuth_rx")
@@ -138,7 +190,7 @@ with st.expander("📡 Приймач", expanded=st.session_state.expanded_rx):
     rx['sensitivity_dbm'] = st.number_input("🎚️ Чутливість RX (дБм)", value=rx.get("sensitivity_dbm", -117.0),step=0.1, key="sens_rx")
 
     try:
-        process_unit(rx, "DeviceDB.xlsx", "AntennaDN.xlsx", index=0, role="rx")
+        web_cache.validate_unit(rx, role="rx", index=0)
         st.success("✅ Приймач успішно перевірено на відповідність параметрів.")
 
         warnings = get_antenna_warnings(st.session_state.tx_list, [rx], mast_size=(mast_x, mast_y, mast_z))
@@ -155,7 +207,7 @@ st.subheader("📡 Побудова діаграм направленості а
 if "show_antenna_pattern" not in st.session_state:
     st.session_state.show_antenna_pattern = False
 
-antenna_to_plot = st.selectbox("📁 Виберіть антену для побудови ДН", ANTENNA_NAMES)
+antenna_to_plot = st.selectbox("📁 Виберіть антену для побудови ДН", catalog.antenna_names)
 
 if st.button("📈 Побудувати ДН", key="build_pattern"):
     st.session_state.show_antenna_pattern = True
@@ -164,9 +216,11 @@ if st.button("📈 Побудувати ДН", key="build_pattern"):
 
 if st.session_state.show_antenna_pattern:
     try:
-        hor_df, vert_df = load_antenna_pattern("AntennaDN.xlsx", sheet_name=antenna_to_plot)
-        fig = plot_antenna_patterns(hor_df, vert_df, sheet_name=antenna_to_plot)
-        st.pyplot(fig)
+        png = web_cache.cached_figure_png(
+            "pattern", antenna_to_plot,
+            lambda: plot_antenna_patterns(*get_antenna_pattern("AntennaDN.xlsx", antenna_to_plot).to_frames(),
+                                          sheet_name=antenna_to_plot))
+        st.image(png)
 
         if st.button("❌ Закрити ДН", key="close_pattern"):
             st.session_state.show_antenna_pattern = False
@@ -175,6 +229,76 @@ if st.session_state.show_antenna_pattern:
 
 st.markdown("---")
 
+im_orders = st.multiselect("🔢 Порядки IM-продуктів", [3, 5, 7], default=[3], key="im_orders")
+im_three_tone = st.checkbox("➕ Трисигнальні продукти f1 + f2 - f3", value=False, key="im_three_tone")
+im_only_hits = st.checkbox("🎯 Лише продукти поблизу смуги RX", value=True, key="im_only_hits")
+
+# Сесія інкрементального аналізу: перераховуються лише змінені TX/RX.
+# Відбитки юнітів не враховують ДН антен, тож при новій версії каталогу сесія створюється заново
+# (завдання, що ще виконується, дораховує на своїй старій сесії)
+if st.session_state.get("analysis_session_version") != catalog.version:
+    st.session_state.analysis_session = AnalysisSession(web_cache.ANTENNA_FILE)
+    st.session_state.analysis_session_version = catalog.version
+
+# Фонові завдання (jobs.py): у session_state — лише їхні ID, тож завдання переживають перезапуски скрипта
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+
+
+def submit_job(kind, label, func, *args):
+    """Нове завдання виду kind; попереднє завдання того ж виду скасовується"""
+    previous = st.session_state.jobs.get(kind)
+    if previous:
+        JOBS.cancel(previous)
+    # входные TX/RX копируются: скрипт продолжает менять словари виджетами, пока идёт расчёт
+    args = [copy.deepcopy(a) if isinstance(a, (dict, list, tuple)) else a for a in args]
+    st.session_state.jobs[kind] = JOBS.submit(kind, func, *args, label=label).id
+
+
+# Функції build_* лише рахують і кидають винятки: помилка не потрапляє в кеш результатів як звіт
+# (інакше тимчасовий збій показувався б, доки не зміняться вхідні дані чи версія каталогу)
+def im_job(job, tx_list, rx, im_options, session):
+    def build_im_report():
+        job.report(0, 2, "пошук IM-продуктів")
+        im = session.analyze_im(tx_list, [rx], **im_options)
+        job.report(1, 2, "формування звіту")
+        return format_im_report(rx, 0, im.products, im.levels[:, 0], show_levels=True)
+
+    try:
+        return web_cache.cached_result("im", (tx_list, rx, im_options), build_im_report)
+    except JobCancelled:
+        raise
+    except Exception as e:
+        return f"❌ Помилка аналізу IM: {e}\n"
+
+
+def ems_job(job, tx_list, rx, session):
+    step = ["матричного аналізу"]  # етап для тексту помилки
+
+    def build_ems_report():
+        job.report(0, len(tx_list) + 1, "матриця ЕМС")
+        matrix = session.analyze_emc(tx_list, [rx])
+        step[0] = "сумарної завади"
+        for i, tx in enumerate(tx_list):
+            job.report(i + 1, len(tx_list) + 1, f"TX #{i+1}")
+            try:
+                res = matrix.pair(i, 0)
+                job.add_partial(format_ems_result(res, tx_index=i, rx=rx) + "\n\n")
+            except Exception as e:
+                job.add_partial(f"❌ TX #{i+1} → RX: Помилка: {e}\n\n")
+        job.check_cancelled()
+        aggregate = aggregate_interference(tx_list, [rx], web_cache.ANTENNA_FILE, matrix=matrix)
+        job.add_partial(format_aggregate_result(aggregate, 0) + "\n\n")
+        return "".join(job.partial)
+
+    try:
+        return web_cache.cached_result("ems", (tx_list, rx), build_ems_report)
+    except JobCancelled:
+        raise
+    except Exception as e:  # уже готові блоки пар залишаються у звіті, але без кешування
+        return "".join(job.partial) + f"❌ Помилка {step[0]}: {e}\n\n"
+
+
 if st.button("▶️ Виконати аналіз IM"):
     if len(tx_list) < 2:
         warning = "⚠️ At least two transmitters must be selected to perform intermodulation analysis."
@@ -182,15 +306,9 @@ if st.button("▶️ Виконати аналіз IM"):
         st.session_state.report_text = warning
         st.session_state.expand_im3_results = True
     else:
-        result = analyze_im3_candidates(
-            {"tx_list": tx_list, "rx_list": [rx]},
-            tx_ids=list(range(len(tx_list))),
-            rx_id=0,
-            show_levels=True,
-            use_markdown=True
-        )
-        st.session_state.report_text = result
-        st.session_state.expand_im3_results = True
+        im_options = {"orders": tuple(sorted(im_orders)) or (3,), "three_tone": im_three_tone,
+                      "only_hits": im_only_hits}
+        submit_job("im", "Аналіз IM", im_job, tx_list, rx, im_options, st.session_state.analysis_session)
 
 if st.button("📡 Виконати аналіз локальної ЕМС"):
     if not tx_list:
@@ -199,52 +317,70 @@ if st.button("📡 Виконати аналіз локальної ЕМС"):
         st.session_state.report_text = warning
         st.session_state.expand_ems_results = True
     else:
-        full_text = ""
-        for i, tx in enumerate(tx_list):
-            try:
-                res = analyze_tx_to_rx(tx, rx)
-                formatted = format_ems_result(res, tx_index=i, rx=rx)
-                full_text += formatted + "\n\n"
-            except Exception as e:
-                full_text += f"❌ TX #{i+1} → RX: Помилка: {e}\n\n"
-        st.session_state.local_ems_report = full_text
-        st.session_state.expand_ems_results = True
-
+        submit_job("ems", "Аналіз локальної ЕМС", ems_job, tx_list, rx, st.session_state.analysis_session)
+
+
+def apply_finished_jobs():
+    """Результати завершених завдань — у session_state (скасовані — з частковими результатами)"""
+    for kind, job_id in list(st.session_state.jobs.items()):
+        job = JOBS.get(job_id)
+        if job is None or not job.done:
+            if job is None:
+                del st.session_state.jobs[kind]
+            continue
+        del st.session_state.jobs[kind]
+        if job.status == CANCELLED:
+            note = f"⏹ {job.label}: скасовано" + (f" ({job.message})" if job.message else "") + "\n\n"
+        elif job.status == ERROR:
+            note = f"❌ {job.label}: {job.error}\n\n"
+        else:
+            note = ""
+        if kind == "im":
+            st.session_state.report_text = note or job.result
+            st.session_state.expand_im3_results = True
+        elif kind == "ems":
+            st.session_state.local_ems_report = note + "".join(job.partial) if note else job.result
+            st.session_state.expand_ems_results = True
+        elif kind == "sweep":
+            if job.status == DONE:
+                st.session_state.sweep = job.result
+                st.session_state.sweep_inputs = st.session_state.get("sweep_pending_inputs")
+            else:
+                st.session_state.sweep_error = note
+        elif kind == "param":
+            if job.status == DONE:
+                st.session_state.param_sweep = job.result
+                st.session_state.param_inputs = st.session_state.get("param_pending_inputs")
+            else:
+                st.session_state.param_error = note
+        st.session_state.analysis_summary = st.session_state.analysis_session.summary()
+
+
+def render_jobs():
+    """Хід виконання активних завдань сесії; після завершення будь-якого — перезапуск скрипта"""
+    finished = False
+    for kind, job_id in list(st.session_state.jobs.items()):
+        job = JOBS.get(job_id)
+        if job is None or job.done:
+            finished = True
+            continue
+        snap = job.snapshot()
+        text = f"⏳ {snap['label']} [{snap['id']}]: {snap['message'] or snap['status']} ({snap['elapsed_s']:.0f} s)"
+        st.progress(snap['progress'], text=text)
+        if st.button("⏹ Скасувати", key=f"cancel_{job_id}", disabled=snap['cancel_requested']):
+            job.cancel()
+        if snap['partial']:
+            with st.expander(f"Часткові результати ({len(snap['partial'])})", expanded=False):
+                st.markdown("".join(snap['partial']).replace("\n", "<br>"), unsafe_allow_html=True)
+    if finished:
+        st.rerun()
+
+
+apply_finished_jobs()
+jobs_panel = st.container()  # заповнюється в кінці скрипта, коли відомі всі нові завдання
 
 
 
-# === Collect TX/RX info in English ===
-def format_tx_info(tx_list):
-    lines = []
-    for i, tx in enumerate(tx_list):
-        lines.append(f"Transmitter #{i+1}:")
-        lines.append(f"  Device: {tx.get('device_name', '')}")
-        lines.append(f"  Antenna: {tx.get('antenna_name', '')}")
-        lines.append(f"  Power: {tx.get('power_dbm', '')} dBm")
-        lines.append(f"  Frequency: {tx.get('frequency_mhz', '')} MHz")
-        lines.append(f"  Bandwidth: {tx.get('BW_khz', '')} kHz")
-        lines.append(f"  Azimuth: {tx.get('azimuth', '')} °")
-        lines.append(f"  Elevation: {tx.get('elevation', '')} °")
-        x, y, z = tx.get('coords', (0, 0, 0))
-        lines.append(f"  Coordinates: X={x}, Y={y}, Z={z} m")
-        lines.append(f"  Cable loss: {tx.get('loss', '')} dB\n")
-    return "\n".join(lines)
-
-def format_rx_info(rx):
-    lines = []
-    lines.append("Receiver:")
-    lines.append(f"  Device: {rx.get('device_name', '')}")
-    lines.append(f"  Antenna: {rx.get('antenna_name', '')}")
-    lines.append(f"  Frequency: {rx.get('frequency_mhz', '')} MHz")
-    lines.append(f"  Bandwidth: {rx.get('BW_khz', '')} kHz")
-    lines.append(f"  Azimuth: {rx.get('azimuth', '')} °")
-    lines.append(f"  Elevation: {rx.get('elevation', '')} °")
-    x, y, z = rx.get('coords', (0, 0, 0))
-    lines.append(f"  Coordinates: X={x}, Y={y}, Z={z} m")
-    lines.append(f"  Cable loss: {rx.get('loss', '')} dB")
-    lines.append(f"  Sensitivity: {rx.get('sensitivity_dbm', '')} dBm\n")
-    return "\n".join(lines)
-
 if "expand_im3_results" not in st.session_state:
     st.session_state.expand_im3_results = False
 
@@ -253,6 +389,9 @@ if "expand_ems_results" not in st.session_state:
 
 
 # Показываем оба отчёта в разворачиваемых блоках
+if st.session_state.get('analysis_summary'):
+    st.caption(f"♻️ {st.session_state.analysis_summary}")
+
 if 'report_text' in st.session_state:
     with st.expander("📈 Результати IM3", expanded=st.session_state.expand_im3_results):
         st.markdown(st.session_state.report_text.replace("\n", "<br>"), unsafe_allow_html=True)
@@ -262,32 +401,136 @@ if 'local_ems_report' in st.session_state:
         st.markdown(st.session_state.local_ems_report.replace("\n", "<br>"), unsafe_allow_html=True)
 
 
-# === Save PDF Report ===
-if 'report_text' in st.session_state and 'local_ems_report' in st.session_state and 'tx_list' in st.session_state and 'rx' in st.session_state:
-    if st.button("💾 Завантажити звіт в PDF"):
-        try:
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", "", 10)
-            pdf.set_text_color(0, 0, 0)
+# === Розгортка частоти приймача: спектр завад ===
+st.markdown("---")
+st.subheader("📶 Спектр завад на приймачі")
+c1, c2, c3 = st.columns(3)
+sweep_start = c1.number_input("Початок (МГц)", value=140.0, step=1.0, key="sweep_start")
+sweep_stop = c2.number_input("Кінець (МГц)", value=175.0, step=1.0, key="sweep_stop")
+sweep_step = c3.number_input("Крок (кГц)", min_value=0.1, value=6.25, step=0.25, key="sweep_step")
 
-            intro = "EMC Analysis Module - LocalEMS\nAuthor: dikatama.dm@mail.com\n\n"
-            tx_info = format_tx_info(st.session_state.tx_list)
-            rx_info = format_rx_info(st.session_state.rx)
-            im3_analysis = st.session_state.report_text.encode("ascii", errors="ignore").decode("ascii")
-            ems_analysis = st.session_state.local_ems_report.encode("ascii", errors="ignore").decode("ascii")
+def sweep_job(job, tx_list, rx, sweep_options):
+    return web_cache.cached_result("sweep", (tx_list, rx, sweep_options), lambda: sweep_rx_frequency(
+        tx_list, rx, sweep_options["start"], sweep_options["stop"], sweep_options["step_khz"],
+        sweep_options["orders"], sweep_options["three_tone"], web_cache.ANTENNA_FILE,
+        progress=lambda done, total: job.report(done, total, f"{done}/{total} частот")))
 
-            full_text = intro + tx_info + "\n" + rx_info + "\n" + im3_analysis + "\n" + ems_analysis
-            pdf.multi_cell(0, 6, full_text)
 
-            temp_pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
-            pdf.output(temp_pdf_path)
+if st.button("📶 Розрахувати спектр", key="run_sweep"):
+    if not tx_list:
+        st.warning("⚠️ Потрібно додати хоча б один передавач.")
+    else:
+        sweep_options = {"start": sweep_start, "stop": sweep_stop, "step_khz": sweep_step,
+                         "orders": tuple(sorted(im_orders)) or (3,), "three_tone": im_three_tone}
+        st.session_state.sweep_pending_inputs = copy.deepcopy((tx_list, rx, sweep_options))
+        st.session_state.sweep_error = None
+        submit_job("sweep", "Спектр завад", sweep_job, tx_list, rx, sweep_options)
+
+if st.session_state.get("sweep_error"):
+    st.error(st.session_state.sweep_error)
+
+if st.session_state.get("sweep") is not None:
+    sweep = st.session_state.sweep
+    st.image(web_cache.cached_figure_png("sweep", st.session_state.sweep_inputs, sweep.plot))
+    st.caption(f"📊 {sweep.summary()}")
+    ranges = sweep.passing_ranges()
+    with st.expander(f"✅ Вільні частоти ({int(sweep.passed.sum())})", expanded=False):
+        if ranges:
+            st.dataframe(pd.DataFrame(ranges, columns=["від (МГц)", "до (МГц)"]), hide_index=True)
+        else:
+            st.write("Немає частот без завад у заданому діапазоні.")
+        st.download_button("💾 Таблиця спектра (CSV)", sweep.to_dataframe().to_csv(index=False),
+                           file_name="rx_sweep.csv", mime="text/csv", key="sweep_csv")
+
+
+# === Параметричний аналіз «що якщо» ===
+st.markdown("---")
+st.subheader("🎛️ Параметричний аналіз «що якщо»")
+
+# Діапазон за замовчуванням для кожного параметра: (початок, кінець, крок)
+PARAM_DEFAULTS = {'power_dbm': (30.0, 50.0, 1.0), 'azimuth': (0.0, 350.0, 10.0), 'elevation': (-30.0, 30.0, 5.0),
+                  'z': (0.0, 50.0, 2.0), 'loss': (0.0, 10.0, 1.0), 'frequency_mhz': (140.0, 175.0, 0.5)}
+param_units = [f"TX #{i+1}" for i in range(len(tx_list))] + ["RX"]
+
+
+def param_axis_inputs(k):
+    """Віджети однієї осі; повертає SweepAxis"""
+    c1, c2, c3, c4, c5 = st.columns([1.2, 1.6, 1, 1, 1])
+    unit = c1.selectbox("Юніт", param_units, key=f"param_unit_{k}")
+    param = c2.selectbox("Параметр", list(SWEEP_PARAMS.values()), format_func=PARAM_LABELS.get,
+                         index=k, key=f"param_name_{k}")
+    start, stop, step = PARAM_DEFAULTS[param]
+    start = c3.number_input("Від", value=start, key=f"param_start_{k}_{param}")
+    stop = c4.number_input("До", value=stop, key=f"param_stop_{k}_{param}")
+    step = c5.number_input("Крок", min_value=0.01, value=step, key=f"param_step_{k}_{param}")
+    n = int(max(0.0, stop - start) // step) + 1
+    role, index = ('rx', 0) if unit == "RX" else ('tx', param_units.index(unit))
+    return SweepAxis(role, index, param, start + step * np.arange(n))
+
+
+param_axes = []
+if tx_list:
+    param_axes.append(param_axis_inputs(0))
+    if st.checkbox("Друга вісь (2-D карта)", key="param_second_axis"):
+        param_axes.append(param_axis_inputs(1))
+
+
+def param_job(job, tx_list, rx, axes_spec):
+    axes = [SweepAxis(*spec) for spec in axes_spec]
+    return web_cache.cached_result("param", (tx_list, rx, axes_spec), lambda: parametric_sweep(
+        tx_list, [rx], axes, web_cache.ANTENNA_FILE,
+        progress=lambda done, total: job.report(done, total, f"{done}/{total} точок")))
+
+
+if st.button("🎛️ Розрахувати сітку", key="run_param", disabled=not tx_list):
+    axes_spec = [(a.role, a.index, a.param, a.values.tolist()) for a in param_axes]
+    st.session_state.param_pending_inputs = copy.deepcopy((tx_list, rx, axes_spec))
+    st.session_state.param_error = None
+    submit_job("param", "Параметричний аналіз", param_job, tx_list, rx, axes_spec)
+
+if st.session_state.get("param_error"):
+    st.error(st.session_state.param_error)
+
+if st.session_state.get("param_sweep") is not None:
+    result = st.session_state.param_sweep
+    c1, c2 = st.columns(2)
+    param_metric = c1.selectbox("Показник", list(METRICS), format_func=METRICS.get, key="param_metric")
+    pair_options = ["Усі TX"] + [f"TX #{i+1}" for i in range(len(result.tx_names))]
+    swept_tx = [a.index for a in result.axes if a.role == 'tx']
+    pair_tx = c2.selectbox("Пари з передавачем", pair_options, key="param_pair_tx",
+                           index=swept_tx[0] + 1 if swept_tx else 0)
+    param_tx = None if pair_tx == "Усі TX" else pair_options.index(pair_tx) - 1
+    plot_inputs = (st.session_state.param_inputs, param_metric, param_tx)
+    st.image(web_cache.cached_figure_png("param", plot_inputs, lambda: result.plot(param_metric, param_tx, 0)))
+    point, value = result.best_point(tx=param_tx, rx=0)
+    if point is not None:
+        st.caption(f"✅ Найбільший запас {value:.1f} дБ: " + ", ".join(f"{k} = {v:g}" for k, v in point.items()))
+    st.download_button("💾 Таблиця сітки (CSV)", result.to_dataframe(param_tx, 0).to_csv(index=False),
+                       file_name="param_sweep.csv", mime="text/csv", key="param_csv")
 
-            with open(temp_pdf_path, "rb") as f:
-                b64_pdf = base64.b64encode(f.read()).decode("utf-8")
-            os.remove(temp_pdf_path)
+# === Save PDF Report ===
+if 'report_text' in st.session_state and 'local_ems_report' in st.session_state and 'tx_list' in st.session_state and 'rx' in st.session_state:
+    if st.button("💾 Завантажити звіт в PDF"):
+        try:
+            pdf_bytes = build_pdf_report(st.session_state.tx_list, st.session_state.rx,
+                                         st.session_state.report_text, st.session_state.local_ems_report)
+            b64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
 
             href = f'<a href="data:application/pdf;base64,{b64_pdf}" download="EMC_report.pdf">📄 Завантажити звіт в PDF</a>'
             st.markdown(href, unsafe_allow_html=True)
         except Exception as e:
             st.error(f"Error creating PDF: {e}")
+
+# === Фонові завдання: прогрес, скасування, часткові результати (оновлюється щосекунди, поки є активні) ===
+with jobs_panel:
+    st.fragment(render_jobs, run_every=1.0 if st.session_state.jobs else None)()
+
+# === Профіль поточного запуску (панель у боковій колонці) ===
+if profiling:
+    st.session_state.last_profile = instrumentation.report()
+    rows = instrumentation.report_rows(st.session_state.last_profile)
+    with profile_panel:
+        if rows:
+            st.dataframe(pd.DataFrame(rows).round(2), hide_index=True)
+        else:
+            st.caption("Немає даних: усі результати взято з кешу.")
@@ -0,0 +1,321 @@
+# im_engine.py
+#
+# Векторный расчёт интермодуляционных продуктов (IM) и их уровней на всех приёмниках сразу.
+#
+# Продукты:
+#   двухтоновые порядка 2k+1:  (k+1)·f_i − k·f_j   (3-й: 2f1−f2, 5-й: 3f1−2f2, 7-й: 4f1−3f2)
+#   трёхтоновые 3-го порядка:  f_i + f_j − f_k
+#
+# Модель уровня — как в im3_analyzer.compute_im3_level: геометрия и усиления берутся
+# по «ведущему» передатчику i, вклад мощности суммируется по всем участвующим TX.
+
+import numpy as np
+from ems_matrix import (ANTENNA_FILE, unit_column, unit_names, en_rule_columns, polarization_matrix,
+                        directional_gain_matrix)
+from spectrum_loss import fspl_db, en_level_array
+from instrumentation import counted, in_stage
+
+# Подавление IM-продукта относительно мощности TX, дБ.
+# 3-й порядок — значение из compute_im3_level; для 5-го и 7-го принято +10 дБ на каждую ступень порядка.
+IM_OFFSET_DB = {3: 25, 5: 35, 7: 45}
+
+
+class IMProducts:
+    """
+    Набор IM-продуктов в виде массивов длины P.
+    i, j, k — индексы TX в tx_list (k = -1 для двухтоновых), ci, cj, ck — коэффициенты при частотах.
+    """
+
+    def __init__(self, freq, order, i, j, k, ci, cj, ck):
+        self.freq = np.asarray(freq, dtype=float)
+        self.order = np.asarray(order, dtype=int)
+        self.i = np.asarray(i, dtype=int)
+        self.j = np.asarray(j, dtype=int)
+        self.k = np.asarray(k, dtype=int)
+        self.ci = np.asarray(ci, dtype=int)
+        self.cj = np.asarray(cj, dtype=int)
+        self.ck = np.asarray(ck, dtype=int)
+
+    def __len__(self):
+        return len(self.freq)
+
+    def subset(self, mask):
+        return IMProducts(self.freq[mask], self.order[mask], self.i[mask], self.j[mask], self.k[mask],
+                          self.ci[mask], self.cj[mask], self.ck[mask])
+
+    def label(self, n):
+        """Подпись продукта: '2f1 - f2', '3f1 - 2f2', 'f1 + f2 - f3' (нумерация TX с 1)"""
+        coef = lambda c: '' if c == 1 else str(c)
+        i, j, ci, cj = self.i[n] + 1, self.j[n] + 1, self.ci[n], abs(self.cj[n])
+        if self.k[n] < 0:
+            return f"{coef(ci)}f{i} - {coef(cj)}f{j}"
+        return f"f{i} + f{j} - f{self.k[n] + 1}"
+
+    @staticmethod
+    def concat(parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return IMProducts([], [], [], [], [], [], [], [])
+        cat = lambda attr: np.concatenate([getattr(p, attr) for p in parts])
+        return IMProducts(*(cat(a) for a in ('freq', 'order', 'i', 'j', 'k', 'ci', 'cj', 'ck')))
+
+
+def _ordered_pairs(ids):
+    """Пары (i, j) в порядке generate_im3_frequencies: для каждой комбинации i<j — (i, j), затем (j, i)"""
+    ids = np.asarray(ids, dtype=int)
+    a, b = np.triu_indices(len(ids), k=1)
+    first = np.column_stack([ids[a], ids[b]]).ravel()
+    second = np.column_stack([ids[b], ids[a]]).ravel()
+    return first, second
+
+
+def generate_two_tone_products(freqs, ids, order=3):
+    """(k+1)·f_i − k·f_j для всех упорядоченных пар, order = 2k+1"""
+    k = (order - 1) // 2
+    i, j = _ordered_pairs(ids)
+    n = len(i)
+    return IMProducts((k + 1) * freqs[i] - k * freqs[j], np.full(n, order), i, j, np.full(n, -1),
+                      np.full(n, k + 1), np.full(n, -k), np.zeros(n))
+
+
+def generate_three_tone_products(freqs, ids):
+    """f_i + f_j − f_k для i<j и k ∉ {i, j}"""
+    ids = np.asarray(ids, dtype=int)
+    a, b = np.triu_indices(len(ids), k=1)
+    c = np.arange(len(ids))
+    A, C = np.meshgrid(a, c, indexing='ij')
+    B, _ = np.meshgrid(b, c, indexing='ij')
+    keep = (C != A) & (C != B)
+    i, j, k = ids[A[keep]], ids[B[keep]], ids[C[keep]]
+    n = len(i)
+    return IMProducts(freqs[i] + freqs[j] - freqs[k], np.full(n, 3), i, j, k,
+                      np.ones(n), np.ones(n), np.full(n, -1))
+
+
+class RxWindowIndex:
+    """
+    Отсортированный индекс полос приёмников: для каждого RX окно f_rx ± delta_bw,
+    delta_bw = 1.5·(BW_tx + BW_rx)/1000 как в compute_im3_level (BW_tx — максимальная среди TX,
+    поэтому окно — надмножество точного). Пересекающиеся окна сливаются в непересекающиеся интервалы,
+    попадание частоты проверяется бинарным поиском.
+    """
+
+    def __init__(self, rx_freqs, rx_bw_khz, max_tx_bw_khz):
+        rx_freqs = np.asarray(rx_freqs, dtype=float)
+        half = 1.5 * (max_tx_bw_khz + np.asarray(rx_bw_khz, dtype=float)) / 1000
+        self.rx_lo = rx_freqs - half
+        self.rx_hi = rx_freqs + half
+
+        order = np.argsort(self.rx_lo)
+        starts, ends = [], []
+        for lo, hi in zip(self.rx_lo[order], self.rx_hi[order]):
+            if starts and lo <= ends[-1]:
+                ends[-1] = max(ends[-1], hi)
+            else:
+                starts.append(lo)
+                ends.append(hi)
+        self.starts = np.array(starts, dtype=float)
+        self.ends = np.array(ends, dtype=float)
+
+    @classmethod
+    def from_units(cls, tx_list, rx_list, tx_ids=None):
+        ids = list(range(len(tx_list))) if tx_ids is None else list(tx_ids)
+        tx_bw = unit_column(tx_list, 'BW_khz')[ids]
+        return cls(unit_column(rx_list, 'frequency_mhz'), unit_column(rx_list, 'BW_khz'),
+                   np.max(tx_bw) if len(tx_bw) else 0.0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def contains(self, freqs):
+        """Маска: частота лежит хотя бы в одном окне RX"""
+        freqs = np.asarray(freqs, dtype=float)
+        idx = np.searchsorted(self.starts, freqs, side='right') - 1
+        ok = idx >= 0
+        return ok & (freqs <= self.ends[np.where(ok, idx, 0)])
+
+
+def _expand_ranges(lo, hi):
+    """Для диапазонов [lo, hi) возвращает (номер диапазона, позиция) для всех позиций без циклов Python"""
+    counts = np.maximum(hi - lo, 0)
+    owner = np.repeat(np.arange(len(lo)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(lo, counts) + offset
+
+
+def _sorted_ids(freqs, ids):
+    ids = np.asarray(ids, dtype=int)
+    order = np.argsort(freqs[ids], kind='stable')
+    return freqs[ids][order], ids[order]
+
+
+def generate_two_tone_products_indexed(freqs, ids, index, order=3):
+    """
+    (k+1)·f_i − k·f_j только для пар, у которых продукт попадает в окно RX:
+    для каждого i и окна [L, H] допустимые f_j ∈ [((k+1)f_i − H)/k, ((k+1)f_i − L)/k] ищутся бинарным поиском.
+    """
+    k = (order - 1) // 2
+    sf, sid = _sorted_ids(freqs, ids)
+    eps = 1e-9
+    fi = freqs[np.asarray(ids, dtype=int)][:, None]
+    low = ((k + 1) * fi - index.ends[None, :]) / k - eps
+    high = ((k + 1) * fi - index.starts[None, :]) / k + eps
+    a = np.searchsorted(sf, low.ravel(), side='left')
+    b = np.searchsorted(sf, high.ravel(), side='right')
+    owner, pos = _expand_ranges(a, b)
+    i = np.asarray(ids, dtype=int)[owner // len(index)]
+    j = sid[pos]
+    keep = i != j
+    i, j = i[keep], j[keep]
+    n = len(i)
+    return IMProducts((k + 1) * freqs[i] - k * freqs[j], np.full(n, order), i, j, np.full(n, -1),
+                      np.full(n, k + 1), np.full(n, -k), np.zeros(n))
+
+
+def generate_three_tone_products_indexed(freqs, ids, index):
+    """f_i + f_j − f_k (i<j) только с f_k ∈ [f_i + f_j − H, f_i + f_j − L] для окон RX"""
+    ids = np.asarray(ids, dtype=int)
+    sf, sid = _sorted_ids(freqs, ids)
+    eps = 1e-9
+    pa, pb = np.triu_indices(len(ids), k=1)
+    total = (freqs[ids[pa]] + freqs[ids[pb]])[:, None]
+    a = np.searchsorted(sf, (total - index.ends[None, :] - eps).ravel(), side='left')
+    b = np.searchsorted(sf, (total - index.starts[None, :] + eps).ravel(), side='right')
+    owner, pos = _expand_ranges(a, b)
+    pair = owner // len(index)
+    i, j, k = ids[pa[pair]], ids[pb[pair]], sid[pos]
+    keep = (k != i) & (k != j)
+    i, j, k = i[keep], j[keep], k[keep]
+    n = len(i)
+    return IMProducts(freqs[i] + freqs[j] - freqs[k], np.full(n, 3), i, j, k,
+                      np.ones(n), np.ones(n), np.full(n, -1))
+
+
+@counted
+def generate_im_products(tx_list, tx_ids=None, orders=(3,), three_tone=False, index=None):
+    """
+    IM-продукты выбранных передатчиков в виде IMProducts.
+    index (RxWindowIndex) — генерировать только продукты, попадающие в окна приёмников.
+    """
+    freqs = unit_column(tx_list, 'frequency_mhz')
+    ids = list(range(len(tx_list))) if tx_ids is None else list(tx_ids)
+    if index is not None:
+        if not len(index) or len(ids) < 2:
+            return IMProducts.concat([])
+        parts = [generate_two_tone_products_indexed(freqs, ids, index, order) for order in orders]
+        if three_tone and len(ids) >= 3:
+            parts.append(generate_three_tone_products_indexed(freqs, ids, index))
+        products = IMProducts.concat(parts)
+        return products.subset(index.contains(products.freq))  # отсекаем погрешность eps
+    parts = [generate_two_tone_products(freqs, ids, order) for order in orders]
+    if three_tone and len(ids) >= 3:
+        parts.append(generate_three_tone_products(freqs, ids))
+    return IMProducts.concat(parts)
+
+
+@counted
+def compute_im_levels(products, tx_list, rx_list, antenna_file=ANTENNA_FILE, gains=None, offsets=IM_OFFSET_DB):
+    """
+    Уровни IM-продуктов на всех приёмниках: матрица P×M (дБм) + delta_f, delta_bw.
+    gains — готовый результат directional_gain_matrix(..., adjust_tx_gain=False), если уже посчитан.
+    """
+    if gains is None:
+        gains = directional_gain_matrix(tx_list, rx_list, antenna_file, adjust_tx_gain=False)
+    lead = products.i
+
+    d_km = gains['d_km'][lead, :]
+    d_km = np.where(d_km <= 0, 1, d_km)  # как в compute_fspl
+    G = gains['gt'][lead, :] + gains['gr'][lead, :]
+    polar = polarization_matrix(tx_list, rx_list)[lead, :]
+
+    p_tx = unit_column(tx_list, 'power_dbm')
+    loss_tx = unit_column(tx_list, 'loss')
+    f_tx = unit_column(tx_list, 'frequency_mhz')
+    bw_tx = unit_column(tx_list, 'BW_khz')
+
+    loss_rx = unit_column(rx_list, 'loss')[None, :]
+    f_rx = unit_column(rx_list, 'frequency_mhz')[None, :]
+    bw_rx = unit_column(rx_list, 'BW_khz')[None, :]
+    acs_rx = unit_column(rx_list, 'ACS', 0)[None, :]
+
+    has_rule, freq_limit, below, above, en_default = (a[:, None] for a in en_rule_columns(tx_list))
+    en_at_rx = en_level_array(f_rx, has_rule, freq_limit, below, above, en_default)  # N×M
+
+    orders, order_idx = np.unique(products.order, return_inverse=True)
+    offset = np.array([offsets.get(int(o), offsets[3]) for o in orders], dtype=float)[order_idx.ravel()][:, None]
+
+    delta_f = np.abs(products.freq[:, None] - f_rx)
+    delta_bw = 1.5 * (bw_tx[lead][:, None] + bw_rx) / 1000
+    in_band = delta_f < delta_bw
+
+    fspl_rx = fspl_db(d_km, f_rx)
+    base = G - offset - loss_rx
+
+    in_mw = np.zeros(delta_f.shape)
+    out_mw = np.zeros(delta_f.shape)
+    for t in (products.i, products.j, products.k):
+        present = (t >= 0)[:, None]
+        tt = np.where(t >= 0, t, 0)
+        common = base - loss_tx[tt][:, None]
+        fspl_t = fspl_db(d_km, f_tx[tt][:, None])
+        in_mw += np.where(present, 10 ** ((p_tx[tt][:, None] + common - fspl_t - polar) / 10), 0)
+        out_mw += np.where(present, 10 ** ((p_tx[tt][:, None] + common - fspl_t - acs_rx) / 10)
+                           + 10 ** ((en_at_rx[tt, :] + common - fspl_rx) / 10), 0)
+
+    levels = 10 * np.log10(np.where(in_band, in_mw, out_mw))
+    return levels, delta_f, delta_bw
+
+
+class IMResult:
+    """Результат analyze_im_site: продукты + матрицы P×M (уровень, Δf, попадание в полосу RX)"""
+
+    def __init__(self, products, rx_list, levels, delta_f, delta_bw):
+        self.products = products
+        self.levels = levels
+        self.delta_f = delta_f
+        self.in_band = delta_f < delta_bw
+        sens = unit_column(rx_list, 'sensitivity_dbm')
+        self.threshold = np.where(np.isnan(sens), -100, sens)[None, :] + 10  # +10 дБ — запас 90% покрытия
+        self.exceeds = levels > self.threshold
+        self.rx_names = unit_names(rx_list)
+
+    def hits(self):
+        """Индексы (продукт, RX), где продукт попадает в полосу приёмника"""
+        return np.argwhere(self.in_band)
+
+    def to_dataframe(self):
+        import pandas as pd
+        p, m = np.meshgrid(np.arange(len(self.products)), np.arange(len(self.rx_names)), indexing='ij')
+        p, m = p.ravel(), m.ravel()
+        pr = self.products
+        return pd.DataFrame({
+            'product': [pr.label(n) for n in p],
+            'order': pr.order[p],
+            'freq_mhz': pr.freq[p],
+            'rx_index': m,
+            'rx_name': [self.rx_names[r] for r in m],
+            'delta_f_mhz': self.delta_f.ravel(),
+            'in_band': self.in_band.ravel(),
+            'level_dbm': self.levels.ravel(),
+            'threshold_dbm': np.broadcast_to(self.threshold, self.levels.shape).ravel(),
+            'exceeds': self.exceeds.ravel(),
+        })
+
+
+@in_stage("im_search")
+def analyze_im_site(tx_list, rx_list, tx_ids=None, orders=(3, 5, 7), three_tone=True, antenna_file=ANTENNA_FILE,
+                    prune=True):
+    """
+    IM-анализ всего сайта: генерация продуктов и уровни на всех RX за один проход.
+    prune=True — через RxWindowIndex строятся и считаются только продукты, попадающие в полосу хотя бы одного RX.
+    """
+    index = RxWindowIndex.from_units(tx_list, rx_list, tx_ids) if prune else None
+    products = generate_im_products(tx_list, tx_ids, orders, three_tone, index)
+    gains = directional_gain_matrix(tx_list, rx_list, antenna_file, adjust_tx_gain=False)
+    if prune and len(products):
+        # точная проверка с BW ведущего TX (окна индекса построены по максимальной BW)
+        f_rx = unit_column(rx_list, 'frequency_mhz')[None, :]
+        bw = 1.5 * (unit_column(tx_list, 'BW_khz')[products.i][:, None] + unit_column(rx_list, 'BW_khz')[None, :]) / 1000
+        products = products.subset(np.any(np.abs(products.freq[:, None] - f_rx) < bw, axis=1))
+    levels, delta_f, delta_bw = compute_im_levels(products, tx_list, rx_list, antenna_file, gains)
+    return IMResult(products, rx_list, levels, delta_f, delta_bw)
@@ -0,0 +1,197 @@
+# instrumentation.py
+#
+# Лёгкая инструментация горячих функций и этапов анализа:
+#   @counted            — счётчик вызовов и суммарное время функции;
+#   with stage("name")  — время этапа и (опционально) пик памяти tracemalloc внутри него;
+#   @in_stage("name")   — то же для всего вызова функции.
+# По умолчанию выключено: stage() возвращает общий пустой контекст, обёртка @counted делает одну проверку флага.
+#
+#   import instrumentation
+#   instrumentation.enable(trace_memory=True)
+#   ... анализ ...
+#   print(instrumentation.format_report())
+#
+# CLI: ключ --profile (и --profile-memory) — см. profile_from_argv().
+
+import sys
+import time
+import atexit
+import functools
+import threading
+import contextlib
+import tracemalloc
+
+_state = {'enabled': False, 'trace_memory': False, 'started_tracemalloc': False}
+_lock = threading.Lock()
+_functions = {}  # имя -> [вызовы, суммарное время, с]
+_stages = {}     # имя -> {'calls', 'total_s', 'peak_bytes'}
+_NULL = contextlib.nullcontext()
+_local = threading.local()  # стек этапов потока (скрипт и фоновые задания не делят один стек)
+
+
+def enabled():
+    return _state['enabled']
+
+
+def enable(trace_memory=False):
+    _state['enabled'] = True
+    _state['trace_memory'] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state['started_tracemalloc'] = True
+
+
+def disable():
+    _state['enabled'] = False
+    if _state['started_tracemalloc']:
+        tracemalloc.stop()
+        _state['started_tracemalloc'] = False
+    _state['trace_memory'] = False
+
+
+def reset():
+    with _lock:
+        _functions.clear()
+        _stages.clear()
+
+
+def counted(func=None, name=None):
+    """Декоратор: число вызовов и суммарное время функции (только когда инструментация включена)"""
+    if func is None:
+        return functools.partial(counted, name=name)
+    key = name or f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _state['enabled']:
+            return func(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            dt = time.perf_counter() - t0
+            with _lock:
+                entry = _functions.setdefault(key, [0, 0.0])
+                entry[0] += 1
+                entry[1] += dt
+
+    return wrapper
+
+
+def _mem_stack():
+    """Стек вложенных этапов текущего потока: максимальный абсолютный пик, уже сброшенный reset_peak внутри этапа"""
+    stack = getattr(_local, 'mem_stack', None)
+    if stack is None:
+        stack = _local.mem_stack = []
+    return stack
+
+
+@contextlib.contextmanager
+def _timed_stage(name):
+    trace = _state['trace_memory'] and tracemalloc.is_tracing()
+    mem_stack = _mem_stack()
+    if trace:
+        current, peak_so_far = tracemalloc.get_traced_memory()
+        if mem_stack:  # пик внешнего этапа сохраняется до сброса
+            mem_stack[-1] = max(mem_stack[-1], peak_so_far)
+        mem_stack.append(0)
+        before = current
+        tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        peak = None
+        if trace:
+            peak_abs = max(tracemalloc.get_traced_memory()[1], mem_stack.pop())
+            if mem_stack:
+                mem_stack[-1] = max(mem_stack[-1], peak_abs)
+            if tracemalloc.is_tracing():  # tracemalloc мог быть остановлен disable() внутри этапа
+                peak = peak_abs - before
+        with _lock:
+            entry = _stages.setdefault(name, {'calls': 0, 'total_s': 0.0, 'peak_bytes': None})
+            entry['calls'] += 1
+            entry['total_s'] += dt
+            if peak is not None:
+                entry['peak_bytes'] = max(entry['peak_bytes'] or 0, peak)
+
+
+def stage(name):
+    """Контекст этапа: время и пик памяти (прирост над уровнем на входе). Выключено — пустой контекст."""
+    if not _state['enabled']:
+        return _NULL
+    return _timed_stage(name)
+
+
+def in_stage(name):
+    """Декоратор: весь вызов функции — этап name (см. stage)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            with _timed_stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def report():
+    """Снимок счётчиков: {'stages': {...}, 'functions': {имя: {'calls', 'total_s'}}}"""
+    with _lock:
+        return {
+            'stages': {k: dict(v) for k, v in _stages.items()},
+            'functions': {k: {'calls': v[0], 'total_s': v[1]} for k, v in _functions.items()},
+        }
+
+
+def merge(data):
+    """Добавляет снимок report() (например, из процесса пула) к текущим счётчикам"""
+    with _lock:
+        for k, v in data.get('functions', {}).items():
+            entry = _functions.setdefault(k, [0, 0.0])
+            entry[0] += v['calls']
+            entry[1] += v['total_s']
+        for k, v in data.get('stages', {}).items():
+            entry = _stages.setdefault(k, {'calls': 0, 'total_s': 0.0, 'peak_bytes': None})
+            entry['calls'] += v['calls']
+            entry['total_s'] += v['total_s']
+            if v.get('peak_bytes') is not None:
+                entry['peak_bytes'] = max(entry['peak_bytes'] or 0, v['peak_bytes'])
+
+
+def report_rows(data=None):
+    """Плоская таблица для UI: одна строка на этап/функцию, по убыванию времени"""
+    data = data or report()
+    rows = [{'kind': 'stage', 'name': k, 'calls': v['calls'], 'total_ms': v['total_s'] * 1000,
+             'peak_kb': v['peak_bytes'] / 1024 if v['peak_bytes'] is not None else None}
+            for k, v in data['stages'].items()]
+    rows += [{'kind': 'function', 'name': k, 'calls': v['calls'], 'total_ms': v['total_s'] * 1000, 'peak_kb': None}
+             for k, v in data['functions'].items()]
+    return sorted(rows, key=lambda r: (r['kind'] != 'stage', -r['total_ms']))
+
+
+def format_report(data=None):
+    lines = ["⏱ Профіль виконання:"]
+    for r in report_rows(data):
+        mem = f", пік {r['peak_kb']:.0f} KB" if r['peak_kb'] is not None else ""
+        label = "етап" if r['kind'] == 'stage' else "функція"
+        lines.append(f"  {label} {r['name']}: {r['calls']} викл., {r['total_ms']:.1f} ms{mem}")
+    return "\n".join(lines)
+
+
+def profile_from_argv(argv=None):
+    """
+    Для CLI без argparse: если в argv есть --profile (или --profile-memory), убирает ключ,
+    включает инструментацию и печатает отчёт при выходе. Возвращает True, если профилирование включено.
+    """
+    argv = sys.argv if argv is None else argv
+    flags = [a for a in argv if a in ('--profile', '--profile-memory')]
+    if not flags:
+        return False
+    for a in flags:
+        argv.remove(a)
+    enable(trace_memory='--profile-memory' in flags)
+    atexit.register(lambda: print(format_report(), file=sys.stderr))
+    return True
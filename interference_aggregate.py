@@ -0,0 +1,189 @@
+# interference_aggregate.py
+#
+# Суммарная помеха на каждом приёмнике от всех передатчиков сразу. analyze_tx_to_rx / format_ems_result
+# сравнивают с порогом (чувствительность + 10 дБ) каждую пару TX→RX по отдельности, но несколько TX чуть ниже
+# порога вместе могут его превысить. Здесь Pint всех пар, IM-продукты в полосе RX и уровни блокирования
+# складываются по мощности (мВт) по столбцам матриц analyze_site_matrix / analyze_im_site, вклады ранжируются
+# без циклов по парам (argpartition по объединённой матрице «источник × RX»).
+#
+#   agg = aggregate_interference(tx_list, rx_list)            # AggregateResult, массивы длины M
+#   agg.margin_db                                            # запас по суммарной помехе на каждом RX
+#   agg.contributors(0, top=5)                               # главные источники помехи на RX #1
+#   print(format_aggregate_result(agg, 0))
+#
+# CLI (сайт из site_config.py): python interference_aggregate.py [--orders 3 5] [--top 5]
+
+import argparse
+import numpy as np
+from spectrum_loss import dbm_to_mw, mw_to_dbm
+from ems_matrix import ANTENNA_FILE, analyze_site_matrix, pint_mw_matrix, unit_column, unit_names
+from instrumentation import in_stage
+
+TOP_CONTRIBUTORS = 5
+
+
+class AggregateResult:
+    """
+    Суммарные уровни по приёмникам (массивы длины M, дБм; -inf — источников нет):
+    pint_dbm — ΣPint по TX, im_dbm — ΣIM-продуктов в полосе RX, total_dbm — их сумма, threshold — порог RX,
+    margin_db = threshold - total_dbm; block_dbm / block_threshold / block_margin_db — то же для блокирования.
+    Вклады источников — матрица мВт (N + P) × M: строки TX, затем IM-продукты.
+    """
+
+    def __init__(self, tx_names, rx_names, pint_mw, im_mw, block_mw, threshold, block_threshold,
+                 pair_exceeds, source_labels):
+        self.tx_names = tx_names
+        self.rx_names = rx_names
+        self.source_mw = np.vstack([pint_mw, im_mw])
+        self.source_labels = source_labels
+        self.n_tx = pint_mw.shape[0]
+        with np.errstate(divide='ignore'):
+            self.pint_dbm = mw_to_dbm(pint_mw.sum(axis=0))
+            self.im_dbm = mw_to_dbm(im_mw.sum(axis=0))
+            self.total_dbm = mw_to_dbm(self.source_mw.sum(axis=0))
+            self.block_dbm = mw_to_dbm(block_mw.sum(axis=0))
+        self.threshold = threshold
+        self.margin_db = threshold - self.total_dbm
+        self.passed = ~(self.total_dbm > threshold)
+        self.block_threshold = block_threshold
+        self.block_margin_db = block_threshold - self.block_dbm
+        self.block_passed = ~(self.block_dbm > block_threshold)
+        self.n_sources = np.count_nonzero(self.source_mw > 0, axis=0)
+        # превышение только в сумме: каждая пара по отдельности ниже порога
+        self.aggregate_only = ~self.passed & ~pair_exceeds
+
+    def __len__(self):
+        return len(self.rx_names)
+
+    def ranked(self, top=TOP_CONTRIBUTORS):
+        """Номера строк source_mw с наибольшим вкладом на каждом RX: top × M, по убыванию вклада"""
+        n = self.source_mw.shape[0]
+        top = min(top, n)
+        if top < n:  # сначала top крупнейших без полной сортировки, затем порядок внутри них
+            order = np.argpartition(-self.source_mw, top - 1, axis=0)[:top]
+        else:
+            order = np.broadcast_to(np.arange(n)[:, None], self.source_mw.shape)
+        values = np.take_along_axis(self.source_mw, order, axis=0)
+        return np.take_along_axis(order, np.argsort(-values, axis=0, kind='stable'), axis=0)
+
+    def contributors(self, rx, top=TOP_CONTRIBUTORS):
+        """Главные источники помехи на приёмнике rx: [(подпись, уровень дБм, доля от суммы), ...]"""
+        total = self.source_mw[:, rx].sum()
+        rows = []
+        for s in self.ranked(top)[:, rx]:
+            mw = self.source_mw[s, rx]
+            if mw <= 0:
+                break
+            rows.append((self.source_labels[s], float(mw_to_dbm(mw)), float(mw / total)))
+        return rows
+
+    def summary(self):
+        return (f"RX: {len(self)}, з перевищенням сумарної завади: {int((~self.passed).sum())} "
+                f"(лише в сумі: {int(self.aggregate_only.sum())}), блокування: {int((~self.block_passed).sum())}")
+
+    def to_dataframe(self):
+        import pandas as pd
+        dominant = self.ranked(1)
+        return pd.DataFrame({
+            'rx_name': self.rx_names,
+            'pint_sum_dbm': self.pint_dbm,
+            'im_sum_dbm': self.im_dbm,
+            'total_dbm': self.total_dbm,
+            'threshold_dbm': self.threshold,
+            'margin_db': self.margin_db,
+            'passed': self.passed,
+            'aggregate_only': self.aggregate_only,
+            'block_sum_dbm': self.block_dbm,
+            'block_threshold_dbm': self.block_threshold,
+            'block_passed': self.block_passed,
+            'n_sources': self.n_sources,
+            'dominant': [self.source_labels[s] if self.source_mw[s, m] > 0 else ''
+                         for m, s in enumerate(dominant[0])] if len(dominant) else [''] * len(self),
+        })
+
+
+@in_stage("aggregate")
+def aggregate_interference(tx_list, rx_list, antenna_file=ANTENNA_FILE, orders=(3,), three_tone=False,
+                           include_im=True, matrix=None, im=None):
+    """
+    Суммарная помеха на каждом RX от всех TX (словари process_unit или UnitArrays).
+    matrix / im — уже посчитанные analyze_site_matrix / analyze_im_site (иначе считаются здесь;
+    IM — при include_im и не менее двух TX). Возвращает AggregateResult.
+    """
+    if matrix is None:
+        matrix = analyze_site_matrix(tx_list, rx_list, antenna_file)
+    n_tx, n_rx = len(tx_list), len(rx_list)
+    valid = matrix['valid']
+    pint_mw = pint_mw_matrix(matrix)
+    blocking = matrix['block_considered']
+    block_mw = np.where(blocking, dbm_to_mw(np.where(blocking, matrix['Pblock'], 0)), 0)
+
+    tx_names = unit_names(tx_list)
+    labels = [f"TX #{i + 1} {name}" for i, name in enumerate(tx_names)]
+    im_mw = np.zeros((0, n_rx))
+    if im is None and include_im and n_tx >= 2:
+        from im_engine import analyze_im_site
+        im = analyze_im_site(tx_list, rx_list, orders=orders, three_tone=three_tone, antenna_file=antenna_file)
+    if im is not None and len(im.products):
+        hit = im.in_band.any(axis=1)  # в сумму идут только продукты в полосе хотя бы одного RX
+        im_mw = np.where(im.in_band[hit], dbm_to_mw(np.where(im.in_band[hit], im.levels[hit], 0)), 0)
+        products = im.products
+        labels += [f"IM{products.order[p]} {products.label(p)}" for p in np.flatnonzero(hit)]
+
+    sens = unit_column(rx_list, 'sensitivity_dbm')
+    threshold = np.where(np.isnan(sens), -100, sens) + 10
+    block_threshold = sens + unit_column(rx_list, 'Block_Rej')
+    pair_exceeds = np.any(valid & ~matrix['Pint_passed'], axis=0)
+    if im is not None and len(im.products):
+        pair_exceeds |= np.any(im.in_band & im.exceeds, axis=0)
+    return AggregateResult(tx_names, unit_names(rx_list), pint_mw, im_mw, block_mw, threshold, block_threshold,
+                           pair_exceeds, labels)
+
+
+def format_aggregate_result(agg, rx_index=0, top=TOP_CONTRIBUTORS):
+    """Текстовый блок суммарной помехи на приёмнике rx_index (в стиле format_ems_result)"""
+    m = rx_index
+    n_im = int(np.count_nonzero(agg.source_mw[agg.n_tx:, m] > 0))
+    lines = [f"📊 Aggregate interference at RX #{m + 1} ({agg.rx_names[m]}): "
+             f"{agg.n_tx} TX, {n_im} IM products in band"]
+    if agg.n_sources[m] == 0:
+        lines.append("  ℹ️ No interference sources")
+        return "\n".join(lines)
+    total, threshold = agg.total_dbm[m], agg.threshold[m]
+    parts = f"TX {agg.pint_dbm[m]:.2f} dBm" + (f" + IM {agg.im_dbm[m]:.2f} dBm" if np.isfinite(agg.im_dbm[m]) else "")
+    if agg.passed[m]:
+        lines.append(f"  ✅ ΣPint = {total:.2f} dBm ({parts}) ≤ threshold {threshold:.0f} dBm, "
+                     f"margin {agg.margin_db[m]:.2f} dB")
+    else:
+        lines.append(f"  ❌ ΣPint = {total:.2f} dBm ({parts}) > threshold {threshold:.0f} dBm, "
+                     f"margin {agg.margin_db[m]:.2f} dB")
+        if agg.aggregate_only[m]:
+            lines.append("  ⚠️ Every source is below the threshold on its own — the limit is exceeded only in sum!")
+    if np.isfinite(agg.block_dbm[m]) and np.isfinite(agg.block_threshold[m]):
+        mark = "✅" if agg.block_passed[m] else "❌"
+        lines.append(f"  🛑 ΣPblock = {agg.block_dbm[m]:.2f} dBm, threshold = {agg.block_threshold[m]:.2f} dBm {mark}")
+    lines.append("  Dominant contributors:")
+    for n, (label, level, share) in enumerate(agg.contributors(m, top), 1):
+        lines.append(f"    {n}. {label}: {level:.2f} dBm ({share * 100:.1f}%)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    parser = argparse.ArgumentParser(description="Сумарна завада на кожному приймачі від усіх передавачів")
+    parser.add_argument("--orders", type=int, nargs="+", default=[3])
+    parser.add_argument("--three-tone", action="store_true")
+    parser.add_argument("--no-im", action="store_true", help="без IM-продуктів")
+    parser.add_argument("--top", type=int, default=TOP_CONTRIBUTORS)
+    args = parser.parse_args()
+
+    from site_config import site
+    from site_loader import process_site
+    site = process_site(site, "DeviceDB.xlsx", ANTENNA_FILE)
+    agg = aggregate_interference(site['tx_list'], site['rx_list'], orders=tuple(args.orders),
+                                 three_tone=args.three_tone, include_im=not args.no_im)
+    for m in range(len(agg)):
+        print(format_aggregate_result(agg, m, args.top))
+        print()
+    print(f"📊 {agg.summary()}")
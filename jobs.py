@@ -0,0 +1,171 @@
+# jobs.py
+#
+# Фоновые задания веб-приложения: тяжёлые анализы выполняются в пуле потоков процесса Streamlit,
+# а скрипт (im3_web.py) хранит в st.session_state только идентификаторы заданий, поэтому задание
+# переживает перезапуски скрипта при изменении виджетов.
+#
+# Функция задания получает первым аргументом Job и сообщает о ходе выполнения:
+#
+#   def task(job, tx_list, rx):
+#       for i, tx in enumerate(tx_list):
+#           job.report(i, len(tx_list), f"TX #{i + 1}")   # здесь же проверяется отмена
+#           job.add_partial(analyze(tx, rx))
+#       return result
+#
+#   job = JOBS.submit("ems", task, tx_list, rx)
+#   JOBS.get(job.id).snapshot()   # статус, прогресс, частичные результаты
+#   JOBS.cancel(job.id)
+#
+# Отмена кооперативная: report() / check_cancelled() бросают JobCancelled, частичные результаты сохраняются.
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from diagnostics import get_logger
+
+log = get_logger(__name__)
+
+QUEUED, RUNNING, DONE, CANCELLED, ERROR = 'queued', 'running', 'done', 'cancelled', 'error'
+FINISHED = (DONE, CANCELLED, ERROR)
+
+
+class JobCancelled(Exception):
+    """Задание отменено пользователем"""
+
+
+class Job:
+    """Состояние одного задания. Поля меняет поток задания, читает скрипт Streamlit (через snapshot)."""
+
+    def __init__(self, kind, label=''):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.label = label or kind
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.partial = []
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def report(self, done, total, message=None):
+        """Прогресс done/total (+ сообщение); точка отмены"""
+        with self._lock:
+            self.progress = min(1.0, done / total) if total else 1.0
+            if message is not None:
+                self.message = message
+        self.check_cancelled()
+
+    def add_partial(self, item):
+        with self._lock:
+            self.partial.append(item)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def snapshot(self):
+        """Копия состояния для отображения"""
+        with self._lock:
+            return {'id': self.id, 'kind': self.kind, 'label': self.label, 'status': self.status,
+                    'progress': self.progress, 'message': self.message, 'partial': list(self.partial),
+                    'error': self.error, 'elapsed_s': self.elapsed(), 'cancel_requested': self.cancel_requested}
+
+
+class JobManager:
+    """Пул потоков + реестр заданий процесса. Хранятся все активные и max_finished последних завершённых."""
+
+    def __init__(self, max_workers=2, max_finished=32):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _executor(self):
+        """Пул создаётся при первом задании; вызывать под self._lock (сессии Streamlit — разные потоки)"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="localems-job")
+        return self._pool
+
+    def submit(self, kind, func, *args, label='', **kwargs):
+        """Запускает func(job, *args, **kwargs) в фоне; возвращает Job"""
+        job = Job(kind, label)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            pool = self._executor()
+        pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancel_requested:
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.progress = 1.0
+            job.status = DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            log.exception("❌ Помилка фонового завдання %s (%s)", job.id, job.kind)
+            job.error = str(e) or type(e).__name__
+            job.status = ERROR
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def active(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in self.active():
+                job.cancel()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Общий менеджер процесса (как кэши web_cache): задания видны во всех перезапусках скрипта
+JOBS = JobManager()
@@ -0,0 +1,323 @@
+# param_sweep.py
+#
+# Параметрический анализ «что если»: одна или несколько осей параметров выбранных юнитов
+# (мощность, азимут, угол места, высота Z, потери, частота) и полная сетка их комбинаций.
+# Сетка считается пакетно матричной моделью analyze_site_matrix (та же физика, что analyze_tx_to_rx):
+# меняются только пары с участием изменяемых юнитов, поэтому изменяемые юниты размножаются
+# «виртуальными» копиями UnitArrays (по одной на точку сетки) и считаются против всех остальных
+# юнитов блоками с ограничением памяти; пары TX×RX, где изменяются оба юнита, — по диагонали блока.
+#
+#   axes = [SweepAxis('tx', 2, 'power_dbm', np.arange(30, 51, 1)),
+#           SweepAxis('tx', 2, 'azimuth', np.arange(0, 360, 10))]
+#   res = parametric_sweep(tx_list, rx_list, axes)      # ParamSweepResult, массивы (21, 36, N, M)
+#   res.metric('margin_db', rx=0)                      # худший запас на RX #1 по сетке (21, 36)
+#   res.plot('margin_db', rx=0)                        # 1-D линия или 2-D карта
+#
+# CLI (сайт из site_config.py), ось — «роль+номер.параметр=начало:конец:шаг» (номер с 1):
+#   python param_sweep.py tx3.power=30:50:1 tx3.azimuth=0:350:10 [--rx 1] [-o sweep.png]
+
+import argparse
+from dataclasses import dataclass
+import numpy as np
+from site_arrays import UnitArrays, ROW_INDEX
+from ems_matrix import ANTENNA_FILE, analyze_site_matrix, unit_names
+from instrumentation import in_stage
+
+# Параметры, по которым строятся оси: короткое имя -> строка UnitArrays
+SWEEP_PARAMS = {
+    'power': 'power_dbm', 'azimuth': 'azimuth', 'elevation': 'elevation',
+    'z': 'z', 'loss': 'loss', 'frequency': 'frequency_mhz',
+}
+PARAM_LABELS = {
+    'power_dbm': 'Потужність (дБм)', 'azimuth': 'Азимут (°)', 'elevation': 'Кут місця (°)',
+    'z': 'Висота Z (м)', 'loss': 'Втрати (дБ)', 'frequency_mhz': 'Частота (МГц)',
+}
+# Поля analyze_site_matrix, сохраняемые для каждой точки сетки (массивы ... × N × M)
+SWEEP_FIELDS = ('Pint', 'threshold', 'valid', 'Pint_passed', 'block_considered', 'block_passed', 'prx_dbm')
+METRICS = {
+    'margin_db': 'Мінімальний запас (дБ)',
+    'pint_dbm': 'Максимальна завада Pint (дБм)',
+    'violations': 'Кількість порушень',
+}
+
+# Ограничение размера блока: число пар (виртуальный юнит × юнит) за один вызов analyze_site_matrix
+PARAM_SWEEP_MAX_CELLS = 500_000
+
+
+@dataclass
+class SweepAxis:
+    """Ось развёртки: параметр param (ключ SWEEP_PARAMS или строка UnitArrays) юнита role ('tx'/'rx') #index (с 0)"""
+    role: str
+    index: int
+    param: str
+    values: np.ndarray
+
+    def __post_init__(self):
+        self.param = SWEEP_PARAMS.get(self.param, self.param)
+        if self.role not in ('tx', 'rx'):
+            raise ValueError(f"❌ Роль осі має бути 'tx' або 'rx': {self.role}")
+        if self.param not in PARAM_LABELS:
+            raise ValueError(f"❌ Невідомий параметр осі: {self.param} (допустимі: {', '.join(SWEEP_PARAMS)})")
+        self.values = np.atleast_1d(np.asarray(self.values, dtype=float))
+        if not len(self.values):
+            raise ValueError(f"❌ Порожня вісь {self.label}")
+
+    @property
+    def label(self):
+        return f"{self.role.upper()} #{self.index + 1}: {PARAM_LABELS[self.param]}"
+
+
+def parse_axis(spec):
+    """'tx3.power=30:50:1' или 'rx1.azimuth=0,90,180' -> SweepAxis (номер юнита с 1, конец включительно)"""
+    try:
+        target, values = spec.split('=', 1)
+        unit, param = target.split('.', 1)
+        role, number = unit[:2].lower(), int(unit[2:])
+        if ':' in values:
+            start, stop, step = (float(v) for v in values.split(':'))
+            grid = start + np.arange(int(np.floor((stop - start) / step + 1e-9)) + 1) * step
+        else:
+            grid = [float(v) for v in values.split(',')]
+    except ValueError:
+        raise ValueError(f"❌ Некоректна вісь '{spec}', очікується tx3.power=30:50:1") from None
+    return SweepAxis(role, number - 1, param, grid)
+
+
+class ParamSweepResult:
+    """
+    Результат развёртки: для каждой точки сетки — поля SWEEP_FIELDS всех пар TX×RX.
+    fields[name] — массив формы shape + (N, M); dims — подписи осей + ('tx', 'rx').
+    """
+
+    def __init__(self, axes, fields, tx_names, rx_names):
+        self.axes = axes
+        self.fields = fields
+        self.tx_names = tx_names
+        self.rx_names = rx_names
+
+    @property
+    def shape(self):
+        return tuple(len(a.values) for a in self.axes)
+
+    @property
+    def dims(self):
+        return tuple(a.label for a in self.axes) + ('tx', 'rx')
+
+    @property
+    def coords(self):
+        return {a.label: a.values for a in self.axes}
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    @property
+    def margin(self):
+        """Запас по порогу для каждой пары (дБ, NaN — пара не рассчитывается)"""
+        return np.where(self.fields['valid'], self.fields['threshold'] - self.fields['Pint'], np.nan)
+
+    def metric(self, name='margin_db', tx=None, rx=None):
+        """
+        Показатель по сетке (форма shape) для выбранных пар: tx / rx — номер (с 0), список или None (все).
+        margin_db — худший запас, pint_dbm — наибольшая Pint, violations — число пар с превышением Pint
+        или блокированием.
+        """
+        select = lambda a: _select_pairs(a, tx, rx)
+        valid = select(self.fields['valid'])
+        if name == 'margin_db':
+            values = select(self.margin)
+            reduce = np.nanmin
+        elif name == 'pint_dbm':
+            values = np.where(valid, select(self.fields['Pint']), np.nan)
+            reduce = np.nanmax
+        elif name == 'violations':
+            bad = (valid & ~select(self.fields['Pint_passed'])) | \
+                  (select(self.fields['block_considered']) & ~select(self.fields['block_passed']))
+            return np.count_nonzero(bad, axis=(-2, -1))
+        else:
+            raise ValueError(f"❌ Невідомий показник: {name} (допустимі: {', '.join(METRICS)})")
+        flat = values.reshape(self.shape + (-1,))
+        out = np.full(self.shape, np.nan)
+        has = ~np.all(np.isnan(flat), axis=-1)
+        out[has] = reduce(flat[has], axis=-1)
+        return out
+
+    def slice(self, name='margin_db', tx=None, rx=None, fixed=None):
+        """
+        Срез показателя: fixed — {номер оси или подпись: значение} (берётся ближайшая точка сетки).
+        Возвращает (массив, свободные оси).
+        """
+        data = self.metric(name, tx, rx)
+        fixed = {self._axis_number(k): v for k, v in (fixed or {}).items()}
+        index = tuple(int(np.argmin(np.abs(a.values - fixed[k]))) if k in fixed else slice(None)
+                      for k, a in enumerate(self.axes))
+        return data[index], [a for k, a in enumerate(self.axes) if k not in fixed]
+
+    def _axis_number(self, key):
+        if isinstance(key, int):
+            return key
+        return [a.label for a in self.axes].index(key)
+
+    def best_point(self, tx=None, rx=None):
+        """Точка сетки с наибольшим худшим запасом: ({подпись оси: значение}, запас дБ)"""
+        data = self.metric('margin_db', tx, rx)
+        if np.all(np.isnan(data)):
+            return None, np.nan
+        k = np.unravel_index(np.nanargmax(data), data.shape)
+        return {a.label: float(a.values[i]) for a, i in zip(self.axes, k)}, float(data[k])
+
+    def to_dataframe(self, tx=None, rx=None):
+        """Таблица: одна строка на точку сетки, столбцы — значения осей и METRICS"""
+        import pandas as pd
+        grids = np.meshgrid(*(a.values for a in self.axes), indexing='ij')
+        table = {a.label: g.ravel() for a, g in zip(self.axes, grids)}
+        for name in METRICS:
+            table[name] = self.metric(name, tx, rx).ravel()
+        return pd.DataFrame(table)
+
+    def to_xarray(self):
+        """xarray.Dataset с полями SWEEP_FIELDS (если xarray установлен)"""
+        import xarray as xr
+        coords = dict(self.coords, tx=list(self.tx_names), rx=list(self.rx_names))
+        return xr.Dataset({k: (self.dims, v) for k, v in self.fields.items()}, coords=coords)
+
+    @in_stage("plotting")
+    def plot(self, name='margin_db', tx=None, rx=None, fixed=None, ax=None):
+        """1-D (линия) или 2-D (карта с изолинией нулевого запаса) срез показателя; возвращает figure"""
+        import matplotlib.pyplot as plt
+        data, free = self.slice(name, tx, rx, fixed)
+        if len(free) not in (1, 2):
+            raise ValueError(f"❌ Для графіка потрібно 1 або 2 вільні осі, зараз {len(free)}: зафіксуйте решту")
+        if ax is None:
+            fig, ax = plt.subplots(figsize=(10, 5))
+        else:
+            fig = ax.figure
+        if len(free) == 1:
+            ax.plot(free[0].values, data, marker='.', lw=1)
+            if name == 'margin_db':
+                ax.axhline(0, color='black', ls='--', lw=1)
+            ax.set_xlabel(free[0].label)
+            ax.set_ylabel(METRICS[name])
+        else:
+            image = ax.pcolormesh(free[0].values, free[1].values, data.T, shading='nearest',
+                                  cmap='RdYlGn' if name == 'margin_db' else 'inferno')
+            finite = data[np.isfinite(data)]
+            if name == 'margin_db' and len(finite) and finite.min() < 0 < finite.max():
+                ax.contour(free[0].values, free[1].values, data.T, levels=[0], colors='black', linewidths=1)
+            fig.colorbar(image, ax=ax, label=METRICS[name])
+            ax.set_xlabel(free[0].label)
+            ax.set_ylabel(free[1].label)
+        pairs = lambda role, sel: f"{role} #{sel + 1}" if isinstance(sel, (int, np.integer)) else f"усі {role}"
+        ax.set_title(f"{METRICS[name]}: {pairs('TX', tx)} → {pairs('RX', rx)}")
+        ax.grid(True, alpha=0.4)
+        fig.tight_layout()
+        return fig
+
+
+def _select_pairs(array, tx=None, rx=None):
+    """Подмножество пар по последним осям (TX, RX): номер, список номеров или None — все"""
+    for axis, sel in ((-2, tx), (-1, rx)):
+        if sel is not None:
+            array = np.take(array, np.atleast_1d(sel), axis=axis)
+    return array
+
+
+def _virtual_units(units, swept, axes, role, grid, points):
+    """
+    Копии изменяемых юнитов swept роли role для точек сетки points (UnitArrays длины len(points) × len(swept))
+    с параметрами осей в этих точках. Порядок: точка сетки — внешний индекс, юнит — внутренний.
+    """
+    if not swept:
+        return None
+    copies = units.subset(np.tile(swept, len(points)))
+    for k, a in enumerate(axes):
+        if a.role == role:
+            rows = np.flatnonzero(np.tile(np.asarray(swept) == a.index, len(points)))
+            copies.data[ROW_INDEX[a.param], rows] = a.values[grid[k][points]]
+    return copies
+
+
+@in_stage("param_sweep")
+def parametric_sweep(tx_list, rx_list, axes, antenna_file=ANTENNA_FILE, max_cells=PARAM_SWEEP_MAX_CELLS,
+                     progress=None):
+    """
+    Полная сетка комбинаций осей axes (список SweepAxis) для сайта tx_list × rx_list
+    (словари process_unit или UnitArrays). Возвращает ParamSweepResult.
+    progress(done, total) вызывается после каждого блока точек сетки (см. jobs.Job.report).
+    """
+    tx = tx_list if isinstance(tx_list, UnitArrays) else UnitArrays.from_units(tx_list)
+    rx = rx_list if isinstance(rx_list, UnitArrays) else UnitArrays.from_units(rx_list)
+    for a in axes:
+        if not 0 <= a.index < (len(tx) if a.role == 'tx' else len(rx)):
+            raise ValueError(f"❌ {a.role.upper()} #{a.index + 1} відсутній на сайті")
+
+    shape = tuple(len(a.values) for a in axes)
+    grid = [g.ravel() for g in np.meshgrid(*(np.arange(n) for n in shape), indexing='ij')]
+    n_points = int(np.prod(shape))
+    n_tx, n_rx = len(tx), len(rx)
+
+    # Пары без изменяемых юнитов одинаковы во всех точках сетки
+    base = analyze_site_matrix(tx, rx, antenna_file)
+    fields = {key: np.repeat(base[key][None], n_points, axis=0) for key in SWEEP_FIELDS}
+
+    s_tx = sorted({a.index for a in axes if a.role == 'tx'})
+    s_rx = sorted({a.index for a in axes if a.role == 'rx'})
+    per_point = len(s_tx) * n_rx + n_tx * len(s_rx)
+    chunk = max(1, max_cells // max(per_point, 1))
+    if s_tx and s_rx:  # диагональ блока: chunk² × |S_tx| × |S_rx| пар
+        chunk = max(1, min(chunk, int(np.sqrt(max_cells / (len(s_tx) * len(s_rx))))))
+
+    for lo in range(0, n_points, chunk):
+        points = np.arange(lo, min(lo + chunk, n_points))
+        c = len(points)
+        v_tx = _virtual_units(tx, s_tx, axes, 'tx', grid, points)
+        v_rx = _virtual_units(rx, s_rx, axes, 'rx', grid, points)
+        if v_tx is not None:  # изменённые TX × все RX
+            res = analyze_site_matrix(v_tx, rx, antenna_file)
+            for key in SWEEP_FIELDS:
+                fields[key][points[:, None], np.asarray(s_tx)[None, :], :] = res[key].reshape(c, len(s_tx), n_rx)
+        if v_rx is not None:  # все TX × изменённые RX
+            res = analyze_site_matrix(tx, v_rx, antenna_file)
+            for key in SWEEP_FIELDS:  # индексы точек и RX разделены срезом: форма присваивания (c, S_rx, N)
+                block = res[key].reshape(n_tx, c, len(s_rx)).transpose(1, 2, 0)
+                fields[key][points[:, None], :, np.asarray(s_rx)[None, :]] = block
+        if v_tx is not None and v_rx is not None:  # изменённые TX × изменённые RX в одной точке сетки
+            res = analyze_site_matrix(v_tx, v_rx, antenna_file)
+            diag = np.arange(c)
+            for key in SWEEP_FIELDS:
+                block = res[key].reshape(c, len(s_tx), c, len(s_rx))[diag, :, diag, :]
+                fields[key][points[:, None, None], np.asarray(s_tx)[None, :, None],
+                            np.asarray(s_rx)[None, None, :]] = block
+        if progress:
+            progress(points[-1] + 1, n_points)
+
+    fields = {key: value.reshape(shape + (n_tx, n_rx)) for key, value in fields.items()}
+    return ParamSweepResult(list(axes), fields, unit_names(tx), unit_names(rx))
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    parser = argparse.ArgumentParser(description="Параметричний аналіз «що якщо»: сітка параметрів юнітів")
+    parser.add_argument("axes", nargs="+", help="осі: tx3.power=30:50:1, rx1.azimuth=0:350:10, tx2.z=0,5,10 ...")
+    parser.add_argument("--rx", type=int, default=None, help="номер приймача для показника (з 1; за замовчуванням усі)")
+    parser.add_argument("--metric", choices=tuple(METRICS), default='margin_db')
+    parser.add_argument("-o", "--output", default=None, help="PNG зі зрізом (1 або 2 осі)")
+    parser.add_argument("--csv", default=None, help="таблиця сітки")
+    args = parser.parse_args()
+
+    from site_config import site
+    from site_loader import process_site
+    site = process_site(site, "DeviceDB.xlsx", ANTENNA_FILE)
+    axes = [parse_axis(spec) for spec in args.axes]
+    rx = args.rx - 1 if args.rx else None
+    res = parametric_sweep(site['tx_list'], site['rx_list'], axes)
+    print(f"🎛️ Сітка {' × '.join(str(n) for n in res.shape)} = {int(np.prod(res.shape))} точок")
+    point, value = res.best_point(rx=rx)
+    if point is not None:
+        print(f"✅ Найбільший запас {value:.1f} дБ: " + ", ".join(f"{k} = {v:g}" for k, v in point.items()))
+    if args.csv:
+        res.to_dataframe(rx=rx).to_csv(args.csv, index=False)
+        print(f"💾 Таблицю збережено: {args.csv}")
+    if args.output:
+        res.plot(args.metric, rx=rx).savefig(args.output, dpi=100)
+        print(f"🖼️ Графік збережено: {args.output}")
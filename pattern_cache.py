@@ -0,0 +1,121 @@
+# pattern_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+from antenna_utils import load_antenna_library
+from compiled_catalog import find_compiled_catalog
+from instrumentation import counted, in_stage
+
+
+class LRUCache:
+    """
+    Простой потокобезопасный LRU-кэш с ограниченным числом записей и счётчиками попаданий/промахов.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Возвращает значение из кэша или вызывает loader() и кладёт результат в кэш"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class PatternCache(LRUCache):
+    """
+    Кэш ДН антенн на уровне процесса.
+    Ключ — (абсолютный путь, mtime файла, имя листа): после правки AntennaDN.xlsx лист перечитывается.
+    """
+
+    def get_pattern(self, file_path, sheet_name):
+        path = os.path.abspath(file_path)
+        key = (path, os.stat(path).st_mtime_ns, sheet_name)
+        return self.get_or_load(key, lambda: _parse_pattern(path, sheet_name))
+
+
+@in_stage("catalog_load")
+def _parse_pattern(file_path, sheet_name):
+    compiled = find_compiled_catalog(file_path, 'antenna')
+    if compiled is not None:
+        return compiled.pattern(sheet_name)
+    library = get_antenna_library(file_path)
+    if sheet_name not in library:
+        raise KeyError(f"антену '{sheet_name}' не знайдено в {os.path.basename(file_path)}")
+    return library[sheet_name]
+
+
+PATTERN_CACHE = PatternCache(maxsize=64)
+
+# Разобранные книги ДН целиком: (абсолютный путь, mtime) -> {имя листа: AntennaPattern}
+LIBRARY_CACHE = LRUCache(maxsize=2)
+
+
+def get_antenna_library(file_path):
+    """Все ДН книги за один проход по файлу (antenna_utils.load_antenna_library); кэш по пути и mtime"""
+    path = os.path.abspath(file_path)
+    key = (path, os.stat(path).st_mtime_ns)
+    return LIBRARY_CACHE.get_or_load(key, lambda: load_antenna_library(path))
+
+
+def get_antenna_pattern(file_path, sheet_name):
+    """Возвращает AntennaPattern из общего кэша процесса"""
+    return PATTERN_CACHE.get_pattern(file_path, sheet_name)
+
+
+@counted
+def load_antenna_names(file_path):
+    """Список антенн (листов AntennaDN.xlsx); из скомпилированного каталога, если он актуален"""
+    compiled = find_compiled_catalog(file_path, 'antenna')
+    if compiled is not None:
+        return list(compiled.antenna_names)
+    return list(get_antenna_library(file_path))
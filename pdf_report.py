@@ -0,0 +1,67 @@
+# pdf_report.py
+#
+# PDF-отчёт ЕМС (FPDF): параметры TX/RX + тексты отчётов IM и локальной ЕМС.
+# Используется веб-приложением (im3_web.py) и бенчмарком (benchmark.py).
+
+import os
+import tempfile
+from fpdf import FPDF
+
+INTRO = "EMC Analysis Module - LocalEMS\nAuthor: dikatama.dm@mail.com\n\n"
+
+
+# === Collect TX/RX info in English ===
+def format_tx_info(tx_list):
+    lines = []
+    for i, tx in enumerate(tx_list):
+        lines.append(f"Transmitter #{i+1}:")
+        lines.append(f"  Device: {tx.get('device_name', '')}")
+        lines.append(f"  Antenna: {tx.get('antenna_name', '')}")
+        lines.append(f"  Power: {tx.get('power_dbm', '')} dBm")
+        lines.append(f"  Frequency: {tx.get('frequency_mhz', '')} MHz")
+        lines.append(f"  Bandwidth: {tx.get('BW_khz', '')} kHz")
+        lines.append(f"  Azimuth: {tx.get('azimuth', '')} °")
+        lines.append(f"  Elevation: {tx.get('elevation', '')} °")
+        x, y, z = tx.get('coords', (0, 0, 0))
+        lines.append(f"  Coordinates: X={x}, Y={y}, Z={z} m")
+        lines.append(f"  Cable loss: {tx.get('loss', '')} dB\n")
+    return "\n".join(lines)
+
+def format_rx_info(rx):
+    lines = []
+    lines.append("Receiver:")
+    lines.append(f"  Device: {rx.get('device_name', '')}")
+    lines.append(f"  Antenna: {rx.get('antenna_name', '')}")
+    lines.append(f"  Frequency: {rx.get('frequency_mhz', '')} MHz")
+    lines.append(f"  Bandwidth: {rx.get('BW_khz', '')} kHz")
+    lines.append(f"  Azimuth: {rx.get('azimuth', '')} °")
+    lines.append(f"  Elevation: {rx.get('elevation', '')} °")
+    x, y, z = rx.get('coords', (0, 0, 0))
+    lines.append(f"  Coordinates: X={x}, Y={y}, Z={z} m")
+    lines.append(f"  Cable loss: {rx.get('loss', '')} dB")
+    lines.append(f"  Sensitivity: {rx.get('sensitivity_dbm', '')} dBm\n")
+    return "\n".join(lines)
+
+
+def build_pdf_report(tx_list, rx, im3_report, ems_report):
+    """PDF-отчёт (байты). Тексты отчётов приводятся к ASCII — шрифт Arial в FPDF без Unicode."""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "", 10)
+    pdf.set_text_color(0, 0, 0)
+
+    tx_info = format_tx_info(tx_list)
+    rx_info = format_rx_info(rx)
+    im3_analysis = im3_report.encode("ascii", errors="ignore").decode("ascii")
+    ems_analysis = ems_report.encode("ascii", errors="ignore").decode("ascii")
+
+    full_text = INTRO + tx_info + "\n" + rx_info + "\n" + im3_analysis + "\n" + ems_analysis
+    pdf.multi_cell(0, 6, full_text)
+
+    temp_pdf_path = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
+    try:
+        pdf.output(temp_pdf_path)
+        with open(temp_pdf_path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(temp_pdf_path)
@@ -0,0 +1,166 @@
+# placement_optimizer.py
+#
+# Подбор размещения антенн на мачте: высота Z, грань мачты и азимут каждого TX/RX
+# так, чтобы максимизировать наихудший запас (margin) по всем парам TX→RX.
+#
+# Кандидаты одного юнита оцениваются одним вызовом analyze_site_matrix
+# (C вариантов юнита × все остальные), далее — покоординатный спуск с несколькими стартами.
+#
+# Использование:
+#   python placement_optimizer.py
+
+import copy
+import random
+import numpy as np
+from ems_matrix import analyze_site_matrix
+from antenna_viewer import check_antenna_position
+
+# Грани мачты: (направление нормали X, Y, азимут нормали)
+MAST_FACES = {
+    'N': (0, 1, 0),
+    'E': (1, 0, 90),
+    'S': (0, -1, 180),
+    'W': (-1, 0, 270),
+}
+
+
+def pair_margins(res):
+    """
+    Запас (дБ) для каждой пары матрицы ЭМС: минимум из
+    порог − Pint, порог блокирования − Pblock, −10 − Pind (если учитываются).
+    Пары с нулевым расстоянием получают −inf.
+    """
+    margin = res['threshold'] - res['Pint']
+    margin = np.where(res['block_considered'], np.minimum(margin, res['block_threshold'] - res['Pblock']), margin)
+    margin = np.where(res['induced_considered'], np.minimum(margin, -10 - res['Pinduced_dbm']), margin)
+    return np.where(res['valid'], margin, -np.inf)
+
+
+def candidate_positions(mast_size, z_step=1.0, z_min=1.0, face_offset=0.5, azimuth_offsets=(0, -45, 45),
+                        faces=tuple(MAST_FACES)):
+    """Все варианты (x, y, z, azimuth) на гранях мачты в пределах её высоты"""
+    w, d, h = mast_size
+    zs = np.arange(z_min, h + 1e-9, z_step)
+    out = []
+    for face in faces:
+        nx, ny, az = MAST_FACES[face]
+        x = nx * (w / 2 + face_offset)
+        y = ny * (d / 2 + face_offset)
+        for z in zs:
+            for da in azimuth_offsets:
+                out.append((x, y, float(z), (az + da) % 360))
+    return np.array(out, dtype=float)
+
+
+def _apply(unit, cand):
+    unit = dict(unit)
+    unit['coords'] = (float(cand[0]), float(cand[1]), float(cand[2]))
+    unit['azimuth'] = float(cand[3])
+    return unit
+
+
+def _too_close(cands, others, min_separation):
+    """Маска кандидатов, стоящих ближе min_separation к другим антеннам"""
+    if not others:
+        return np.zeros(len(cands), dtype=bool)
+    pts = np.array([u['coords'] for u in others], dtype=float)
+    dist = np.linalg.norm(cands[:, None, :3] - pts[None, :, :], axis=2)
+    return np.any(dist < min_separation, axis=1)
+
+
+def layout_score(tx_list, rx_list):
+    """Наихудший запас по всем парам и пара, на которой он достигается"""
+    margins = pair_margins(analyze_site_matrix(tx_list, rx_list))
+    if margins.size == 0:
+        return np.inf, None
+    worst = np.unravel_index(np.argmin(margins), margins.shape)
+    return float(margins[worst]), (int(worst[0]), int(worst[1]))
+
+
+def _improve_unit(tx_list, rx_list, role, index, cands, min_separation):
+    """Лучший кандидат для одного юнита при фиксированных остальных (один матричный вызов)"""
+    if role == 'tx':
+        rows = [_apply(tx_list[index], c) for c in cands]
+        own = pair_margins(analyze_site_matrix(rows, rx_list)).min(axis=1)
+        rest = np.delete(pair_margins(analyze_site_matrix(tx_list, rx_list)), index, axis=0)
+        others = tx_list[:index] + tx_list[index + 1:] + rx_list
+    else:
+        cols = [_apply(rx_list[index], c) for c in cands]
+        own = pair_margins(analyze_site_matrix(tx_list, cols)).min(axis=0)
+        rest = np.delete(pair_margins(analyze_site_matrix(tx_list, rx_list)), index, axis=1)
+        others = tx_list + rx_list[:index] + rx_list[index + 1:]
+    rest_min = rest.min() if rest.size else np.inf
+    score = np.minimum(own, rest_min)
+    score = np.where(_too_close(cands, others, min_separation), -np.inf, score)
+    best = int(np.argmax(score))
+    return best, float(score[best])
+
+
+def optimize_placement(tx_list, rx_list, mast_size=(5, 5, 50), top_k=5, restarts=8, sweeps=3,
+                       z_step=1.0, min_separation=1.0, movable=None, seed=None, **candidate_kwargs):
+    """
+    Покоординатный поиск размещения. Возвращает top_k лучших раскладок (по убыванию наихудшего запаса):
+    [{'score', 'worst_pair', 'tx_list', 'rx_list', 'warnings'}], tx_list/rx_list готовы для visualize_all_antennas.
+    movable — список ключей ('tx'|'rx', индекс), которые можно двигать (по умолчанию все).
+    """
+    rng = random.Random(seed)
+    cands = candidate_positions(mast_size, z_step=z_step, **candidate_kwargs)
+    movable = list(movable) if movable is not None else \
+        [('tx', i) for i in range(len(tx_list))] + [('rx', j) for j in range(len(rx_list))]
+
+    results = {}
+    for restart in range(restarts):
+        tx = [dict(u) for u in tx_list]
+        rx = [dict(u) for u in rx_list]
+        if restart > 0:  # первый старт — текущая раскладка, остальные — случайные
+            for role, i in movable:
+                units = tx if role == 'tx' else rx
+                units[i] = _apply(units[i], cands[rng.randrange(len(cands))])
+
+        score = layout_score(tx, rx)[0]
+        for _ in range(sweeps):
+            improved = False
+            order = list(movable)
+            rng.shuffle(order)
+            for role, i in order:
+                units = tx if role == 'tx' else rx
+                best, best_score = _improve_unit(tx, rx, role, i, cands, min_separation)
+                if best_score > score + 1e-9:
+                    units[i] = _apply(units[i], cands[best])
+                    score = best_score
+                    improved = True
+            if not improved:
+                break
+
+        score, worst = layout_score(tx, rx)
+        key = tuple(tuple(u['coords']) + (u['azimuth'],) for u in tx + rx)
+        if key not in results:
+            warnings = []
+            for u in tx + rx:
+                warnings.extend(check_antenna_position(u, mast_size))
+            results[key] = {'score': score, 'worst_pair': worst, 'tx_list': tx, 'rx_list': rx,
+                            'warnings': warnings}
+
+    return sorted(results.values(), key=lambda r: -r['score'])[:top_k]
+
+
+if __name__ == "__main__":
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    from site_loader import process_site
+    from site_config import site
+    from antenna_viewer import visualize_all_antennas
+
+    mast = (10, 10, 60)
+    site_data = process_site(copy.deepcopy(site), "DeviceDB.xlsx", "AntennaDN.xlsx")
+    base_score, _ = layout_score(site_data['tx_list'], site_data['rx_list'])
+    print(f"📐 Поточне розміщення: найгірший запас {base_score:.2f} дБ")
+    layouts = optimize_placement(site_data['tx_list'], site_data['rx_list'], mast_size=mast, seed=1)
+    for n, lay in enumerate(layouts, 1):
+        print(f"#{n}: найгірший запас {lay['score']:.2f} дБ, пара TX #{lay['worst_pair'][0] + 1} → RX #{lay['worst_pair'][1] + 1}")
+        for i, u in enumerate(lay['tx_list']):
+            print(f"   TX #{i + 1}: coords={u['coords']}, azimuth={u['azimuth']:.0f}°")
+        for j, u in enumerate(lay['rx_list']):
+            print(f"   RX #{j + 1}: coords={u['coords']}, azimuth={u['azimuth']:.0f}°")
+    if layouts:
+        visualize_all_antennas(layouts[0]['tx_list'], layouts[0]['rx_list'], mast_size=mast, show=True)
@@ -1,4 +1,12 @@
 # polarization_loss.py
+#
+# Поляризации кодируются целыми числами (индекс в POLARIZATIONS) один раз при загрузке ДН антенны
+# (AntennaPattern.polarization_code); потери для всех пар TX×RX — fancy indexing в POLARIZATION_LOSS_MATRIX.
+
+import numpy as np
+from diagnostics import get_logger
+
+log = get_logger(__name__)
 
 POLARIZATION_LOSS_DB = {
     "горизонт": {
@@ -38,19 +46,57 @@ POLARIZATION_LOSS_DB = {
     }
 }
 
+# Коды поляризаций: индекс в POLARIZATIONS; UNKNOWN_POLARIZATION — неизвестная (потери 0)
+POLARIZATIONS = tuple(POLARIZATION_LOSS_DB)
+UNKNOWN_POLARIZATION = len(POLARIZATIONS)
+POLARIZATION_LOSS_MATRIX = np.zeros((len(POLARIZATIONS) + 1, len(POLARIZATIONS) + 1))
+for _i, _tx in enumerate(POLARIZATIONS):
+    for _j, _rx in enumerate(POLARIZATIONS):
+        POLARIZATION_LOSS_MATRIX[_i, _j] = POLARIZATION_LOSS_DB[_tx][_rx]
+POLARIZATION_LOSS_MATRIX.setflags(write=False)
+
+_CODE_BY_NAME = {name: i for i, name in enumerate(POLARIZATIONS)}
+_code_cache = {}  # исходная строка -> код (нормализация .strip().lower() один раз на строку)
+
+
+def polarization_code(pol, source=None):
+    """
+    Код поляризации (индекс в POLARIZATIONS) или UNKNOWN_POLARIZATION.
+    source — имя антенны: неизвестная поляризация сообщается при загрузке её ДН, а не при каждом расчёте.
+    """
+    code = _code_cache.get(pol)
+    if code is None:
+        name = pol.strip().lower() if isinstance(pol, str) else ''
+        code = _code_cache[pol] = _CODE_BY_NAME.get(name, UNKNOWN_POLARIZATION)
+    if code == UNKNOWN_POLARIZATION and source is not None:
+        log.warning("⚠️ Неизвестная поляризация антенны '%s': '%s' (потери поляризации = 0)", source, pol)
+    return code
+
+
+def polarization_codes(values):
+    """Коды для последовательности строк (int массив); повторяющиеся строки разбираются один раз"""
+    return np.array([polarization_code(v) for v in values], dtype=np.intp).reshape(-1)
+
+
+def unit_polarization_code(unit):
+    """Код поляризации юнита: из process_unit (polarization_code) или по строке polarization"""
+    code = unit.get('polarization_code')
+    return polarization_code(unit.get('polarization')) if code is None else code
+
+
+def polarization_loss_matrix(tx_codes, rx_codes):
+    """Потери N×M для кодов TX (N) и RX (M) одним fancy indexing"""
+    return POLARIZATION_LOSS_MATRIX[np.asarray(tx_codes).reshape(-1, 1), np.asarray(rx_codes).reshape(1, -1)]
+
+
+def unit_polarization_loss(tx, rx):
+    """Потери поляризации пары юнитов (словари process_unit)"""
+    return float(POLARIZATION_LOSS_MATRIX[unit_polarization_code(tx), unit_polarization_code(rx)])
+
+
 def get_polarization_loss(tx_pol: str, rx_pol: str) -> float:
     """
     Возвращает потери из-за несовпадения поляризации в дБ.
-    Если неизвестная поляризация — возвращает 0 и предупреждает.
+    Если неизвестная поляризация — возвращает 0 (предупреждение выдаётся при загрузке антенны, см. polarization_code).
     """
-    tx_pol = tx_pol.strip().lower()
-    rx_pol = rx_pol.strip().lower()
-    tx_entry = POLARIZATION_LOSS_DB.get(tx_pol)
-    if tx_entry is None:
-        print(f"⚠️ Неизвестная поляризация передатчика: '{tx_pol}'")
-        return 0
-    loss = tx_entry.get(rx_pol)
-    if loss is None:
-        print(f"⚠️ Неизвестная поляризация приёмника: '{rx_pol}'")
-        return 0
-    return loss
+    return float(POLARIZATION_LOSS_MATRIX[polarization_code(tx_pol), polarization_code(rx_pol)])
@@ -0,0 +1,160 @@
+# site_arrays.py
+#
+# Компактное представление юнитов сайта (struct-of-arrays) вместо списка словарей:
+# все числовые параметры — строки одного непрерывного массива float64 (K × N, NaN — параметр не задан),
+# устройство, антенна и поляризация — целочисленные коды в таблицы имён
+# (коды поляризаций для расчёта потерь — polarization_codes(), см. polarization_loss).
+# Преобразуется в словари process_unit и обратно; матричные движки (ems_matrix, im_engine)
+# принимают UnitArrays вместо списков словарей.
+#
+#   arrays = SiteArrays.from_site(process_site(site, ...))
+#   res = analyze_site_matrix(arrays.tx, arrays.rx)
+
+import numpy as np
+from polarization_loss import polarization_code, UNKNOWN_POLARIZATION
+
+# Числовые параметры юнита (ключи словаря process_unit)
+FLOAT_KEYS = ('power_dbm', 'frequency_mhz', 'BW_khz', 'loss', 'gain_max', 'gain_oob', 'freq_min', 'freq_max',
+              'azimuth', 'elevation', 'sensitivity_dbm', 'ACS', 'Freq_offset_block', 'Block_Rej', 'EN_dBm')
+# Поля EN_dBm_rule и координаты — дополнительные строки того же массива
+RULE_KEYS = (('freq_limit_mhz', 'en_freq_limit'), ('below_limit', 'en_below'), ('above_limit', 'en_above'))
+ROWS = FLOAT_KEYS + tuple(row for _, row in RULE_KEYS) + ('x', 'y', 'z')
+ROW_INDEX = {name: i for i, name in enumerate(ROWS)}
+CODE_KEYS = ('device_name', 'antenna_name', 'polarization')
+
+
+def _encode(values):
+    """Строки → (коды int32, таблица имён); отсутствующее значение → -1"""
+    table = list(dict.fromkeys(v for v in values if v is not None))
+    index = {name: i for i, name in enumerate(table)}
+    codes = np.array([index[v] if v is not None else -1 for v in values], dtype=np.int32)
+    return codes, tuple(table)
+
+
+class UnitArrays:
+    """
+    Список TX или RX в виде массивов.
+    data — float64 K × N (строки по ROWS), codes — int32 3 × N (device, antenna, polarization),
+    tables — таблицы имён для кодов. extra — прочие ключи словарей (label и т.п.), если были.
+    """
+
+    __slots__ = ('data', 'codes', 'tables', 'extra')
+
+    def __init__(self, data, codes, tables, extra=None):
+        self.data = data
+        self.codes = codes
+        self.tables = tables
+        self.extra = extra
+
+    @classmethod
+    def from_units(cls, units):
+        n = len(units)
+        data = np.full((len(ROWS), n), np.nan)
+        for i, u in enumerate(units):
+            for key in FLOAT_KEYS:
+                value = u.get(key)
+                if value is not None:
+                    data[ROW_INDEX[key], i] = value
+            rule = u.get('EN_dBm_rule')
+            if rule:
+                for key, row in RULE_KEYS:
+                    data[ROW_INDEX[row], i] = rule[key]
+            coords = u.get('coords')
+            if coords is not None:
+                data[ROW_INDEX['x']:ROW_INDEX['z'] + 1, i] = coords
+
+        codes = np.empty((len(CODE_KEYS), n), dtype=np.int32)
+        tables = []
+        for k, key in enumerate(CODE_KEYS):
+            codes[k], table = _encode([u.get(key) for u in units])
+            tables.append(table)
+
+        known = set(FLOAT_KEYS) | set(CODE_KEYS) | {'EN_dBm_rule', 'coords', 'polarization_code'}
+        extra = [{k: v for k, v in u.items() if k not in known} for u in units]
+        return cls(data, codes, tuple(tables), extra if any(extra) else None)
+
+    def to_units(self):
+        """Обратно в список словарей (как после process_unit)"""
+        units = []
+        pol_codes = self.polarization_codes()
+        for i in range(len(self)):
+            col = self.data[:, i]
+            u = {}
+            for k, key in enumerate(CODE_KEYS):
+                code = self.codes[k, i]
+                if code >= 0:
+                    u[key] = self.tables[k][code]
+            if 'polarization' in u:
+                u['polarization_code'] = int(pol_codes[i])
+            for key in FLOAT_KEYS:
+                value = col[ROW_INDEX[key]]
+                if not np.isnan(value):
+                    u[key] = float(value)
+            if not np.isnan(col[ROW_INDEX['x']]):
+                u['coords'] = tuple(float(v) for v in col[ROW_INDEX['x']:ROW_INDEX['z'] + 1])
+            if not np.isnan(col[ROW_INDEX['en_freq_limit']]):
+                u['EN_dBm_rule'] = {key: float(col[ROW_INDEX[row]]) for key, row in RULE_KEYS}
+            if self.extra is not None:
+                u.update(self.extra[i])
+            units.append(u)
+        return units
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def column(self, key, default=np.nan):
+        """Столбец параметра (NaN → default); та же семантика, что ems_matrix.unit_column для словарей"""
+        values = self.data[ROW_INDEX[key]]
+        return np.where(np.isnan(values), default, values)
+
+    def coords(self):
+        """Координаты N × 3"""
+        return self.data[ROW_INDEX['x']:ROW_INDEX['z'] + 1].T.copy()
+
+    def names(self, key):
+        """Список имён по коду ('device_name', 'antenna_name', 'polarization'); отсутствующее → ''"""
+        k = CODE_KEYS.index(key)
+        table = self.tables[k]
+        return [table[c] if c >= 0 else '' for c in self.codes[k]]
+
+    def polarization_codes(self):
+        """Коды поляризаций (polarization_loss.POLARIZATIONS) по юнитам: строки таблицы разбираются один раз"""
+        k = CODE_KEYS.index('polarization')
+        lut = np.array([polarization_code(p) for p in self.tables[k]] + [UNKNOWN_POLARIZATION], dtype=np.intp)
+        return lut[self.codes[k]]  # код -1 (нет поляризации) → последний элемент lut
+
+    def subset(self, index):
+        """Подмножество юнитов (индексы или маска); таблицы имён общие"""
+        index = np.arange(len(self))[index]
+        extra = [self.extra[i] for i in index] if self.extra is not None else None
+        return UnitArrays(self.data[:, index].copy(), self.codes[:, index].copy(), self.tables, extra)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.codes.nbytes
+
+
+class SiteArrays:
+    """Сайт: tx и rx как UnitArrays"""
+
+    __slots__ = ('name', 'tx', 'rx')
+
+    def __init__(self, tx, rx, name=None):
+        self.name = name
+        self.tx = tx
+        self.rx = rx
+
+    @classmethod
+    def from_site(cls, site):
+        return cls(UnitArrays.from_units(site.get('tx_list', [])), UnitArrays.from_units(site.get('rx_list', [])),
+                   site.get('name'))
+
+    def to_site(self):
+        site = {'tx_list': self.tx.to_units(), 'rx_list': self.rx.to_units()}
+        if self.name is not None:
+            site['name'] = self.name
+        return site
+
+    @property
+    def nbytes(self):
+        return self.tx.nbytes + self.rx.nbytes
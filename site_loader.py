@@ -1,28 +1,32 @@
 # site_loader.py
 
-import pandas as pd
-from antenna_utils import load_antenna_pattern_with_info
-import sys
+from pattern_cache import get_antenna_pattern
+from device_catalog import load_device_catalog
+from instrumentation import counted, in_stage
+from site_validation import validate_site
+from diagnostics import get_logger
 
+log = get_logger(__name__)
+
+@counted
 def process_unit(unit, device_file, antenna_file, index=None, role='tx'):
-    import sys
+    """
+    Проверяет и дополняет параметры TX/RX из базы устройств и ДН антенн.
+    device_file — путь к DeviceDB.xlsx или уже загруженный DeviceCatalog.
+    Первая найденная ошибка — ValueError; полный отчёт по сайту — site_validation.validate_site.
+    """
 
     device_name = unit.get('device_name', '').strip()
     prefix = f"{role.upper()} #{index+1}" if index is not None else role.upper()
 
-    # === Загрузка базы устройств ===
-    df = pd.read_excel(device_file, header=None)
-    headers = df.iloc[0].dropna().astype(str).str.strip().tolist()
+    # === База устройств (DeviceCatalog или путь к DeviceDB.xlsx) ===
+    catalog = load_device_catalog(device_file)
+    record = catalog.get(device_name)
 
-    if device_name not in headers:
-        print(f"\n📛 Ошибка: {prefix} — пристрій '{device_name}' не знайдено в базі DeviceDB.xlsx", file=sys.stderr)
-        print(f"🔎 Перевірте коректність написання назви пристрою в конфігурації сайта.", file=sys.stderr)
-        sys.exit(1)
+    if record is None:
+        raise ValueError(f"📛 {prefix}: пристрій '{device_name}' не знайдено в базі DeviceDB.xlsx")
 
-    device_col = df.columns[df.iloc[0].astype(str).str.strip() == device_name][0]
-    param_col = df.columns[0]
-    device_params = df[[param_col, device_col]].dropna().iloc[1:]
-    param_dict = dict(zip(device_params.iloc[:, 0].astype(str).str.strip(), device_params.iloc[:, 1]))
+    param_dict = record.params
 
     # === Проверка диапазонов и допустимых значений ===
     prefix = f"{role.upper()} #{index+1}" if index is not None else role.upper()
@@ -58,11 +62,7 @@ def process_unit(unit, device_file, antenna_file, index=None, role='tx'):
                                      'Freq Min (MHz)', 'Freq Max (MHz)', 'Частота')
 
     # === Ширина полосы ===
-    bw_opts = param_dict.get('BW Options (kHz)', '12.5')
-    try:
-        allowed_bw = [float(b.strip()) for b in str(bw_opts).split(',')]
-    except Exception:
-        allowed_bw = [12.5]  # fallback
+    allowed_bw = list(record.bw_options)
     unit['BW_khz'] = validate_choice(unit.get('BW_khz', allowed_bw[0]), allowed_bw, 'Ширина смуги (BW_khz)')
 
     # === Дополнительные параметры ===
@@ -91,21 +91,31 @@ def process_unit(unit, device_file, antenna_file, index=None, role='tx'):
     # === Антенна ===
     ant_name = unit.get('antenna_name', '').strip()
     try:
-        hor, vert, ant_info = load_antenna_pattern_with_info(antenna_file, ant_name)
+        pattern = get_antenna_pattern(antenna_file, ant_name)
     except Exception:
-        print(f"\n📛 Помилка: {prefix} — антена '{ant_name}' не знайдена в базі AntennaDN.xlsx", file=sys.stderr)
-        print(f"🔎 Перевірте коректність написання назви антени в конфигурації сайта.", file=sys.stderr)
-        sys.exit(1)
+        raise ValueError(f"📛 {prefix}: антену '{ant_name}' не знайдено в базі AntennaDN.xlsx") from None
 
+    ant_info = pattern.info
     unit['gain_max'] = ant_info.get('Max Gain (dBi)', 0)
     unit['polarization'] = ant_info.get('Polarisation', 'вертик')
+    unit['polarization_code'] = pattern.polarization_code
     unit['freq_min'] = ant_info.get('Freq Min (MHz)', 0)
     unit['freq_max'] = ant_info.get('Freq Max (MHz)', 0)
     unit['gain_oob'] = ant_info.get('Gain OOB (dBi)', -20)
 
     return unit
 
+@in_stage("validation")
 def process_site(site, device_file, antenna_file):
+    """
+    Проверяет весь сайт (site_validation: все ошибки сразу) и дополняет юниты параметрами из каталога.
+    При ошибках бросает SiteValidationError (ValueError) с полным отчётом, предупреждения пишутся в лог.
+    """
+    device_file = load_device_catalog(device_file)  # книга читается один раз на весь сайт
+    report = validate_site(site, device_file, antenna_file)
+    for issue in report.warnings:
+        log.warning("%s", issue.message)
+    report.raise_if_errors()
     site['tx_list'] = [process_unit(tx, device_file, antenna_file, index=i, role='tx') for i, tx in enumerate(site.get('tx_list', []))]
     site['rx_list'] = [process_unit(rx, device_file, antenna_file, index=i, role='rx') for i, rx in enumerate(site.get('rx_list', []))]
     return site
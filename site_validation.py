@@ -0,0 +1,265 @@
+# site_validation.py
+#
+# Проверка сайтов по каталогу за один проход: все юниты всех сайтов собираются в массивы,
+# параметры устройств — в таблицы DeviceDB (строка на устройство), диапазоны и допустимые значения
+# сверяются векторно. Результат — полный отчёт ошибок и предупреждений; процесс не завершается,
+# исключения не бросаются (кроме явного report.raise_if_errors()).
+#
+# Проверяется (как в site_loader.process_unit, с теми же значениями по умолчанию):
+#   - устройство есть в DeviceDB, антенна есть в AntennaDN;
+#   - мощность TX, чувствительность RX и частота в диапазонах устройства; BW из списка BW Options;
+#   - частота в полосе антенны freq_min..freq_max (предупреждение).
+#
+#   report = validate_site(site, "DeviceDB.xlsx", "AntennaDN.xlsx")
+#   report = validate_sites([site_a, site_b, ...], catalog, "AntennaDN.xlsx")
+#   print(report.format()); report.ok
+#
+# CLI: python site_validation.py [файли/каталоги сайтів JSON/YAML ...]  (без аргументів — site_config.site)
+
+import numbers
+import numpy as np
+from dataclasses import dataclass
+from device_catalog import load_device_catalog
+from pattern_cache import get_antenna_pattern, load_antenna_names
+from instrumentation import in_stage
+
+ERROR, WARNING = 'error', 'warning'
+ROLES = ('tx', 'rx')
+
+# (ключ юнита, роль или None — обе, поле DeviceRecord со значением по умолчанию, запасное значение,
+#  поля минимума и максимума, подпись); порядок — как проверки в process_unit
+RANGE_CHECKS = (
+    ('power_dbm', 'tx', 'tx_power_default', 30.0, 'tx_power_min', 'tx_power_max', 'Потужність передавача'),
+    ('sensitivity_dbm', 'rx', 'rx_sensitivity_default', None, 'rx_sensitivity_min', 'rx_sensitivity_max',
+     'Чутливість приймача'),
+    ('frequency_mhz', None, 'tx_freq_default', 150.0, 'freq_min', 'freq_max', 'Частота'),
+)
+
+
+@dataclass(frozen=True)
+class Issue:
+    """Одна ошибка или предупреждение: сайт, роль и номер юнита (с 0), проверяемый ключ"""
+    severity: str
+    site: str
+    role: str
+    index: int
+    field: str
+    message: str
+
+    @property
+    def prefix(self):
+        return f"{self.role.upper()} #{self.index + 1}"
+
+
+class SiteValidationError(ValueError):
+    """Сайт не прошёл проверку; report — полный ValidationReport"""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(report.format(warnings=False))
+
+
+class ValidationReport:
+    """Результат проверки: список Issue в порядке сайт → TX/RX → юнит → проверка"""
+
+    def __init__(self, issues, n_sites=0, n_units=0):
+        self.issues = list(issues)
+        self.n_sites = n_sites
+        self.n_units = n_units
+
+    @property
+    def errors(self):
+        return [i for i in self.issues if i.severity == ERROR]
+
+    @property
+    def warnings(self):
+        return [i for i in self.issues if i.severity == WARNING]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def for_site(self, site):
+        return ValidationReport([i for i in self.issues if i.site == site], 1, 0)
+
+    def summary(self):
+        return (f"Сайтів: {self.n_sites}, юнітів: {self.n_units}; "
+                f"помилок: {len(self.errors)}, попереджень: {len(self.warnings)}")
+
+    def format(self, warnings=True):
+        lines = []
+        for issue in self.issues:
+            if issue.severity == WARNING and not warnings:
+                continue
+            site = f"[{issue.site}] " if issue.site else ""
+            lines.append(f"{site}{issue.message}")
+        return "\n".join(lines)
+
+    def to_dataframe(self):
+        import pandas as pd
+        return pd.DataFrame([{'severity': i.severity, 'site': i.site, 'role': i.role, 'index': i.index,
+                              'field': i.field, 'message': i.message} for i in self.issues],
+                            columns=['severity', 'site', 'role', 'index', 'field', 'message'])
+
+    def raise_if_errors(self):
+        if self.errors:
+            raise SiteValidationError(self)
+
+
+def _device_table(records, attr):
+    """Значения поля DeviceRecord по устройствам + NaN-строка для неизвестного устройства (индекс -1)"""
+    values = [getattr(r, attr) for r in records]
+    return np.array([np.nan if v is None else v for v in values] + [np.nan], dtype=float)
+
+
+def _bw_table(records):
+    """Допустимые BW: D+1 × B, дополнено NaN"""
+    width = max((len(r.bw_options) for r in records), default=1)
+    table = np.full((len(records) + 1, width), np.nan)
+    for d, r in enumerate(records):
+        table[d, :len(r.bw_options)] = r.bw_options
+    return table
+
+
+def _numeric_column(units, key):
+    """
+    Значения ключа по юнитам: NaN — ключа нет (None — не число); второй результат — номера юнитов с нечисловым значением.
+    Строки (в т.ч. '25') — не числа: process_unit сравнивает значения как есть, без преобразования.
+    """
+    values = np.full(len(units), np.nan)
+    bad = []
+    for u, (_, _, _, unit) in enumerate(units):
+        if key not in unit:
+            continue
+        value = unit[key]
+        if isinstance(value, numbers.Real):
+            values[u] = float(value)
+        else:
+            bad.append(u)
+    return values, bad
+
+
+@in_stage("validation")
+def validate_sites(sites, device_file, antenna_file, names=None):
+    """
+    Проверка списка сайтов (словари как site_config.site) по каталогу.
+    device_file — путь к DeviceDB.xlsx или DeviceCatalog; names — имена сайтов (по умолчанию site['name'] или '#k').
+    Входные сайты не изменяются. Возвращает ValidationReport.
+    """
+    catalog = load_device_catalog(device_file)
+    records = list(catalog)
+    device_index = {r.name: d for d, r in enumerate(records)}
+    antenna_names = set(load_antenna_names(antenna_file))
+    names = names or [site.get('name') or f"#{k + 1}" for k, site in enumerate(sites)]
+
+    units = [(names[k], role, i, unit) for k, site in enumerate(sites) for role in ROLES
+             for i, unit in enumerate(site.get(f'{role}_list', []))]
+    n = len(units)
+    issues = []  # (номер юнита, номер проверки, Issue)
+
+    def add(u, check, severity, field, text):
+        site, role, index, _ = units[u]
+        mark = "❌" if severity == ERROR else "⚠️"
+        text = f"{mark} {role.upper()} #{index + 1}: {text}"
+        issues.append((u, check, Issue(severity, site, role, index, field, text)))
+
+    # === Устройства и антенны ===
+    device_names = [str(unit.get('device_name', '')).strip() for _, _, _, unit in units]
+    antenna = [str(unit.get('antenna_name', '')).strip() for _, _, _, unit in units]
+    dev = np.array([device_index.get(name, -1) for name in device_names], dtype=int)
+    is_tx = np.array([role == 'tx' for _, role, _, _ in units], dtype=bool)
+    for u in np.flatnonzero(dev < 0):
+        add(u, 0, ERROR, 'device_name', f"пристрій '{device_names[u]}' не знайдено в базі DeviceDB.xlsx")
+    for u, name in enumerate(antenna):
+        if name not in antenna_names:
+            add(u, 1, ERROR, 'antenna_name', f"антену '{name}' не знайдено в базі AntennaDN.xlsx")
+    known = dev >= 0
+
+    # === Диапазоны ===
+    values = {}
+    for c, (key, role, default_attr, fallback, min_attr, max_attr, label) in enumerate(RANGE_CHECKS, 2):
+        raw, not_numbers = _numeric_column(units, key)
+        for u in not_numbers:
+            add(u, c, ERROR, key, f"{label} = {units[u][3][key]!r} не є числом")
+        default = _device_table(records, default_attr)[dev]
+        applies = known if role is None else known & (is_tx == (role == 'tx'))
+        if fallback is None:  # чувствительность проверяется только у устройств с её значением по умолчанию
+            applies &= ~np.isnan(default)
+        else:
+            default = np.where(np.isnan(default), fallback, default)
+        value = np.where(np.isnan(raw), default, raw)
+        lo, hi = _device_table(records, min_attr)[dev], _device_table(records, max_attr)[dev]
+        bad = applies & ((value < lo) | (value > hi))
+        for u in np.flatnonzero(bad):
+            add(u, c, ERROR, key, f"{label} = {value[u]:g} поза допустимим діапазоном "
+                                  f"[{_bound(lo[u])}, {_bound(hi[u])}]")
+        values[key] = value
+
+    # === Ширина полосы ===
+    c = 2 + len(RANGE_CHECKS)
+    bw_table = _bw_table(records)[dev]
+    bw_raw, not_numbers = _numeric_column(units, 'BW_khz')
+    for u in not_numbers:
+        add(u, c, ERROR, 'BW_khz', f"Ширина смуги (BW_khz) = {units[u][3]['BW_khz']!r} не є числом")
+    bw = np.where(np.isnan(bw_raw), bw_table[:, 0], bw_raw)
+    allowed = (bw[:, None] == bw_table).any(axis=1)  # точное совпадение, как `in` в process_unit
+    for u in np.flatnonzero(known & ~np.isnan(bw) & ~allowed):
+        options = [float(b) for b in bw_table[u] if not np.isnan(b)]
+        add(u, c, ERROR, 'BW_khz', f"Ширина смуги (BW_khz) = {bw[u]:g} не входить у допустимі значення: {options}")
+
+    # === Полоса антенны (по уникальным антеннам) ===
+    c += 1
+    unique = sorted({name for name in antenna if name in antenna_names})
+    band = np.array([[float(get_antenna_pattern(antenna_file, name).info.get(k, 0) or 0)
+                      for k in ('Freq Min (MHz)', 'Freq Max (MHz)')] for name in unique] + [[0.0, 0.0]])
+    position = {name: a for a, name in enumerate(unique)}
+    ant = np.array([position.get(name, len(unique)) for name in antenna], dtype=int)
+    f_min, f_max = band[ant, 0], band[ant, 1]
+    freq = values['frequency_mhz']
+    outside = (f_max > 0) & ~np.isnan(freq) & ((freq < f_min) | (freq > f_max))
+    for u in np.flatnonzero(outside):
+        add(u, c, WARNING, 'frequency_mhz', f"частота {freq[u]:g} МГц поза смугою антени '{antenna[u]}' "
+                                            f"[{f_min[u]:g}, {f_max[u]:g}] МГц")
+
+    issues.sort(key=lambda item: (item[0], item[1]))
+    return ValidationReport([item[2] for item in issues], len(sites), n)
+
+
+def validate_site(site, device_file, antenna_file):
+    """Проверка одного сайта; возвращает ValidationReport (имя сайта в Issue — пустое)"""
+    return validate_sites([site], device_file, antenna_file, names=[''])
+
+
+def _bound(value):
+    return "—" if np.isnan(value) else f"{value:g}"
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import argparse
+    from instrumentation import profile_from_argv
+    profile_from_argv()
+    parser = argparse.ArgumentParser(description="Перевірка сайтів за каталогом: усі помилки та попередження")
+    parser.add_argument("paths", nargs="*", help="файли або каталоги сайтів (JSON/YAML); без аргументів — site_config")
+    parser.add_argument("--device-file", default="DeviceDB.xlsx")
+    parser.add_argument("--antenna-file", default="AntennaDN.xlsx")
+    parser.add_argument("--csv", default=None, help="зберегти звіт у CSV")
+    args = parser.parse_args()
+
+    if args.paths:
+        from batch_runner import find_site_files, load_site_file
+        files = [f for p in args.paths for f in (find_site_files(p) if os.path.isdir(p) else [p])]
+        sites = [load_site_file(f) for f in files]
+        names = [os.path.basename(f) for f in files]
+    else:
+        from site_config import site
+        sites, names = [site], ['site_config']
+
+    report = validate_sites(sites, args.device_file, args.antenna_file, names=names)
+    if report.issues:
+        print(report.format())
+    print(("✅ " if report.ok else "📛 ") + report.summary())
+    if args.csv:
+        report.to_dataframe().to_csv(args.csv, index=False)
+    sys.exit(0 if report.ok else 1)
@@ -1,14 +1,21 @@
 # spectrum_loss.py
 
 import math
-from polarization_loss import get_polarization_loss
+import numpy as np
+from dataclasses import dataclass
+from polarization_loss import unit_polarization_loss
+from diagnostics import get_logger
+from instrumentation import counted
+
+log = get_logger(__name__)
 
 def dbm_to_mw(p_dbm):
     return 10 ** (p_dbm / 10)
 
 def mw_to_dbm(p_mw):
-    return 10 * math.log10(p_mw)
+    return 10 * np.log10(p_mw)
 
+@counted
 def adjust_tx_gain_by_frequency(tx, rx):
     """
     Корректирует максимальное усиление антенны передатчика, если частота выходит за рабочий диапазон.
@@ -44,6 +51,7 @@ def adjust_tx_gain_by_frequency(tx, rx):
 
 
 
+@counted
 def check_blocking_interference(tx, rx, d_km, gt, gr):
     freq_offset = abs(tx['frequency_mhz'] - rx['frequency_mhz'])
 
@@ -58,7 +66,7 @@ def check_blocking_interference(tx, rx, d_km, gt, gr):
         return None  # Вне зоны блокировки
 
     fspl = 20 * math.log10(d_km) + 20 * math.log10(tx['frequency_mhz']) + 32.44
-    polar_loss = get_polarization_loss(tx.get('polarization'), rx.get('polarization'))
+    polar_loss = unit_polarization_loss(tx, rx)
 
     Pblock = tx['power_dbm'] + gt + gr - tx['loss'] - rx['loss'] - fspl - polar_loss
     threshold = sensitivity + block_rej
@@ -71,7 +79,42 @@ def check_blocking_interference(tx, rx, d_km, gt, gr):
     }
     return result
 
-def compute_interference_level(tx: dict, rx: dict, distance_km: float, gt: float, gr: float) -> float:
+@dataclass
+class InterferenceResult:
+    """
+    Результат compute_interference: суммарная помеха и её составляющие (дБм).
+    При перекрытии полос (overlap=True) Pint1..Pint3 не считаются и равны None.
+    Текст формируется только при вызове format().
+    """
+    Psum: float
+    delta_f: float
+    delta_bw: float
+    overlap: bool
+    polar_loss: float
+    Pint1: float = None
+    Pint2: float = None
+    Pint3: float = None
+
+    def format(self):
+        if self.overlap:
+            return "\n".join([
+                "⚠️ Полосы перекрываются → прямая мощная помеха:",
+                f"  ∆f = {self.delta_f:.3f} МГц, ∆BW = {self.delta_bw:.3f} МГц",
+                f"  Суммарная помеха: {self.Psum:.2f} дБм",
+            ])
+        return "\n".join([
+            "📉 Полосы не перекрываются → внеполосные компоненты учтены:",
+            f"  ∆f = {self.delta_f:.3f} МГц, ∆BW = {self.delta_bw:.3f} МГц",
+            f"  Pint1 = {self.Pint1:.2f} дБм, Pint2 = {self.Pint2:.2f} дБм, Pint3 = {self.Pint3:.2f} дБм",
+            f"  Суммарная помеха: {self.Psum:.2f} дБм",
+        ])
+
+    def __str__(self):
+        return self.format()
+
+
+@counted
+def compute_interference(tx: dict, rx: dict, distance_km: float, gt: float, gr: float) -> InterferenceResult:
     """
     Вычисляет уровень помехи от передатчика tx на приёмник rx,
     с учётом направленных усилений gt и gr.
@@ -81,12 +124,12 @@ def compute_interference_level(tx: dict, rx: dict, distance_km: float, gt: float
     :param distance_km: расстояние между антеннами в км
     :param gt: усиление передающей антенны по направлению на приёмник (дБи)
     :param gr: усиление приёмной антенны по направлению на передатчик (дБи)
-    :return: уровень помехи в дБм
+    :return: InterferenceResult (Psum — уровень помехи в дБм)
     """
 
     fspl_tx = 20 * math.log10(distance_km) + 20 * math.log10(tx['frequency_mhz']) + 32.44
     fspl_rx = 20 * math.log10(distance_km) + 20 * math.log10(rx['frequency_mhz']) + 32.44
-    polar_loss = get_polarization_loss(tx.get('polarization', ''), rx.get('polarization', ''))
+    polar_loss = unit_polarization_loss(tx, rx)
 
 
     delta_f = abs(tx['frequency_mhz'] - rx['frequency_mhz'])  # МГц
@@ -115,20 +158,23 @@ def compute_interference_level(tx: dict, rx: dict, distance_km: float, gt: float
 
         Psum_mw = dbm_to_mw(Pint1) + dbm_to_mw(Pint2) + dbm_to_mw(Pint3)
         Psum = mw_to_dbm(Psum_mw) - polar_loss
+        return InterferenceResult(Psum, delta_f, delta_bw, False, polar_loss, Pint1, Pint2, Pint3)
 
-        print("📉 Полосы не перекрываются → внеполосные компоненты учтены:")
-        print(f"  ∆f = {delta_f:.3f} МГц, ∆BW = {delta_bw:.3f} МГц")
-        print(f"  Pint1 = {Pint1:.2f} дБм, Pint2 = {Pint2:.2f} дБм, Pint3 = {Pint3:.2f} дБм")
-        print(f"  Суммарная помеха: {Psum:.2f} дБм")
-    else:
-        # Прямое наложение
-        Psum = tx['power_dbm'] + gt + gr - tx['loss'] - rx['loss'] - fspl_tx - polar_loss
-        print("⚠️ Полосы перекрываются → прямая мощная помеха:")
-        print(f"  ∆f = {delta_f:.3f} МГц, ∆BW = {delta_bw:.3f} МГц")
-        print(f"  Суммарная помеха: {Psum:.2f} дБм")
+    # Прямое наложение
+    Psum = tx['power_dbm'] + gt + gr - tx['loss'] - rx['loss'] - fspl_tx - polar_loss
+    return InterferenceResult(Psum, delta_f, delta_bw, True, polar_loss)
 
-    return Psum
 
+def compute_interference_level(tx: dict, rx: dict, distance_km: float, gt: float, gr: float) -> float:
+    """
+    Уровень помехи в дБм (см. compute_interference).
+    Разбор по составляющим выводится в диагностику на уровне DEBUG — только если он включён.
+    """
+    result = compute_interference(tx, rx, distance_km, gt, gr)
+    log.debug("%s", result)
+    return result.Psum
+
+@counted
 def check_field_induced_interference(tx, rx, d_km, gt):
     """
     Проверка помехи наведения на приёмную антенну
@@ -170,3 +216,109 @@ def check_field_induced_interference(tx, rx, d_km, gt):
         'passed': Pinduced_dbm < -10,
         'distance_limit': limit
     }
+
+
+
+# === Векторные версии (массивы NumPy, broadcasting TX×RX) ===
+# Формулы повторяют скалярные функции выше один в один.
+
+def fspl_db(distance_km, freq_mhz):
+    return 20 * np.log10(distance_km) + 20 * np.log10(freq_mhz) + 32.44
+
+
+def en_level_array(freq_mhz, has_rule, freq_limit, below, above, en_default):
+    """Уровень EN (дБм) на частоте freq_mhz по правилу EN_dBm_rule или EN_dBm по умолчанию"""
+    by_rule = np.where(freq_mhz <= freq_limit, below, above)
+    return np.where(has_rule, by_rule, en_default)
+
+
+def adjust_tx_gain_by_frequency_array(gain_max, gain_oob, f_min, f_max, f):
+    """Векторная версия adjust_tx_gain_by_frequency; нулевые/отсутствующие f_min, f_max → gain_max"""
+    gain_max, gain_oob, f_min, f_max, f = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (gain_max, gain_oob, f_min, f_max, f)))
+    has_data = (f != 0) & (f_min != 0) & (f_max != 0) & ~np.isnan(f_min) & ~np.isnan(f_max)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f_center = (f_min + f_max) / 2
+        abs_ratio = np.maximum(f / f_center, f_center / f)
+
+    a = np.where(gain_max < 6.01, 1.2, np.where(gain_max < 15.01, 1.15, 1.1))
+    b = np.where(gain_max < 6.01, 2.0, np.where(gain_max < 15.01, 1.75, 1.5))
+    alpha = (abs_ratio - a) / (b - a)
+    gain = np.where(abs_ratio <= a, gain_max,
+                    np.where(abs_ratio >= b, gain_oob, gain_max * (1 - alpha) + gain_oob * alpha))
+    return np.where(has_data, gain, gain_max)
+
+
+@counted
+def compute_interference_level_array(p_tx, loss_tx, f_tx, bw_tx, en_rx, en_avg,
+                                     loss_rx, f_rx, bw_rx, acs_rx,
+                                     distance_km, gt, gr, polar_loss):
+    """
+    Векторная версия compute_interference_level (без печати).
+    en_rx / en_avg — уровни EN на частоте приёмника и на средней частоте (см. en_level_array).
+    """
+    fspl_tx = fspl_db(distance_km, f_tx)
+    fspl_rx = fspl_db(distance_km, f_rx)
+
+    delta_f = np.abs(f_tx - f_rx)
+    delta_bw = 1.5 * (bw_tx + bw_rx) / 1000
+    common = gt + gr - loss_tx - loss_rx
+
+    Pint1 = p_tx + common - fspl_tx - acs_rx
+    Pint2 = en_rx + common - fspl_rx
+    Pint3 = en_avg + common - (fspl_tx + fspl_rx) / 2 - acs_rx
+    Psum_oob = 10 * np.log10(dbm_to_mw(Pint1) + dbm_to_mw(Pint2) + dbm_to_mw(Pint3)) - polar_loss
+
+    Psum_direct = p_tx + common - fspl_tx - polar_loss
+    return np.where(delta_f >= delta_bw, Psum_oob, Psum_direct)
+
+
+@counted
+def check_blocking_interference_array(p_tx, loss_tx, f_tx, loss_rx, f_rx,
+                                      freq_offset_block, block_rej, sensitivity,
+                                      distance_km, gt, gr, polar_loss):
+    """
+    Векторная версия check_blocking_interference.
+    Возвращает dict массивов: considered, Pblock, threshold, passed, freq_offset.
+    NaN в freq_offset_block / block_rej / sensitivity означает «нет данных».
+    """
+    freq_offset = np.abs(f_tx - f_rx)
+    has_data = ~(np.isnan(freq_offset_block) | np.isnan(block_rej) | np.isnan(sensitivity))
+    considered = has_data & (freq_offset <= freq_offset_block)
+
+    fspl = fspl_db(distance_km, f_tx)
+    Pblock = p_tx + gt + gr - loss_tx - loss_rx - fspl - polar_loss
+    threshold = sensitivity + block_rej
+    return {
+        'considered': considered,
+        'Pblock': np.where(considered, Pblock, np.nan),
+        'threshold': np.where(considered, threshold, np.nan),
+        'passed': np.where(considered, Pblock <= threshold, True),
+        'freq_offset': freq_offset,
+    }
+
+
+@counted
+def check_field_induced_interference_array(p_tx, loss_tx, f_tx, gain_max_tx, distance_m, gt):
+    """
+    Векторная версия check_field_induced_interference.
+    Возвращает dict массивов: considered, Pinduced_dbm, passed, lambda, distance_limit.
+    """
+    lambda_m = 3e8 / (f_tx * 1e6)
+    limit = np.where(gain_max_tx < 9.01, 1, np.where(gain_max_tx < 18.01, 3, 10)) * lambda_m
+    considered = distance_m <= limit
+
+    Ptx_mw = dbm_to_mw(p_tx - loss_tx + gt)
+    with np.errstate(divide='ignore'):
+        E = np.sqrt(30 * Ptx_mw) / distance_m
+        Pinduced_mw = (E ** 2) * ((lambda_m ** 2) / (4 * np.pi)) / 377
+        Pinduced_dbm = 10 * np.log10(Pinduced_mw)
+    return {
+        'considered': considered,
+        'Pinduced_dbm': np.where(considered, Pinduced_dbm, np.nan),
+        'threshold_dbm': -10,
+        'passed': np.where(considered, Pinduced_dbm < -10, True),
+        'lambda': lambda_m + np.zeros_like(distance_m),
+        'distance_limit': limit + np.zeros_like(distance_m),
+    }
@@ -0,0 +1,26 @@
+# test_antenna_library.py
+#
+# Потоковое чтение всей книги (load_antenna_library) против постраничного load_antenna_pattern_with_info.
+
+import math
+import numpy as np
+
+ANTENNA_FILE = "AntennaDN.xlsx"
+
+
+def test_antenna_library_matches_per_sheet_loader():
+    from antenna_utils import load_antenna_library, load_antenna_pattern_with_info
+    from pattern_cache import load_antenna_names
+    library = load_antenna_library(ANTENNA_FILE)
+    assert list(library) == list(load_antenna_names(ANTENNA_FILE))
+    for name, pattern in library.items():
+        hor_df, vert_df, info = load_antenna_pattern_with_info(ANTENNA_FILE, name)
+        np.testing.assert_array_equal(pattern.azimuth_deg, hor_df['azimuth_deg'].to_numpy(float), err_msg=name)
+        np.testing.assert_array_equal(pattern.azimuth_att, hor_df['attenuation_db'].to_numpy(float), err_msg=name)
+        np.testing.assert_array_equal(pattern.elevation_deg, vert_df['elevation_deg'].to_numpy(float), err_msg=name)
+        np.testing.assert_array_equal(pattern.elevation_att, vert_df['attenuation_db'].to_numpy(float),
+                                      err_msg=name)
+        assert pattern.info.keys() == info.keys(), name
+        for key, value in info.items():
+            same_nan = isinstance(value, float) and math.isnan(value) and math.isnan(pattern.info[key])
+            assert same_nan or pattern.info[key] == value, f"{name}: {key}"
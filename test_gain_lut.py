@@ -0,0 +1,37 @@
+# test_gain_lut.py
+#
+# LUT ДН (AntennaPattern.azimuth_gain / elevation_gain) против прямой интерполяции interpolate_gain,
+# в том числе углы за пределами таблиц и нечисловые углы.
+
+import math
+import numpy as np
+import pytest
+
+ANTENNA_FILE = "AntennaDN.xlsx"
+
+
+def test_gain_lut_matches_interpolate_gain():
+    from antenna_utils import interpolate_gain, load_antenna_pattern_with_info
+    from pattern_cache import get_antenna_pattern, load_antenna_names
+    az = np.linspace(-30, 400, 1291)  # шаг 1/3° — между узлами LUT, с выходом за [0, 360)
+    el = np.linspace(-95, 95, 571)   # в том числе за пределами таблицы угла места
+    for name in load_antenna_names(ANTENNA_FILE):
+        hor_df, vert_df, _ = load_antenna_pattern_with_info(ANTENNA_FILE, name)
+        pattern = get_antenna_pattern(ANTENNA_FILE, name)
+        expected_az = [interpolate_gain(hor_df, a, 'azimuth_deg') for a in az]
+        expected_el = [interpolate_gain(vert_df, e, 'elevation_deg') for e in el]
+        np.testing.assert_allclose(pattern.azimuth_gain(az), expected_az, atol=1e-6, err_msg=name)
+        np.testing.assert_allclose(pattern.elevation_gain(el), expected_el, atol=1e-6, err_msg=name)
+        assert pattern.azimuth_gain(float(az[7])) == pytest.approx(expected_az[7], abs=1e-6)
+
+
+def test_gain_lut_non_finite_angles():
+    from pattern_cache import get_antenna_pattern, load_antenna_names
+    pattern = get_antenna_pattern(ANTENNA_FILE, load_antenna_names(ANTENNA_FILE)[0])
+    with np.errstate(invalid='ignore'):
+        az = pattern.azimuth_gain(np.array([np.nan, 10.0, np.inf]))
+    assert np.isnan(az[0]) and np.isnan(az[2])
+    assert az[1] == pytest.approx(pattern.azimuth_gain_exact(10.0))
+    el = pattern.elevation_gain(np.array([np.nan, 0.0, -np.inf]))
+    assert np.isnan(el[0]) and np.isnan(el[2])
+    assert math.isnan(pattern.elevation_gain(np.nan))
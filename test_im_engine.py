@@ -0,0 +1,21 @@
+# test_im_engine.py
+#
+# im_engine.compute_im_levels должен давать те же уровни, что и im3_analyzer.compute_im3_level
+# по каждому двухтоновому продукту 3-го порядка и каждому RX (фикстура site — conftest.py).
+
+import pytest
+
+
+def test_im_levels_match_compute_im3_level(site):
+    from im3_analyzer import compute_im3_level
+    from im_engine import generate_im_products, compute_im_levels
+    tx_list, rx_list = site['tx_list'], site['rx_list']
+    products = generate_im_products(tx_list, orders=(3,), three_tone=False)
+    assert len(products)
+    levels, _, _ = compute_im_levels(products, tx_list, rx_list)
+    for p in range(len(products)):
+        tx1, tx2 = tx_list[products.i[p]], tx_list[products.j[p]]
+        for m, rx in enumerate(rx_list):
+            expected = compute_im3_level(tx1, tx2, rx, products.freq[p])
+            assert levels[p, m] == pytest.approx(expected, rel=1e-9, abs=1e-9), \
+                f"{products.label(p)} -> RX #{m + 1}"
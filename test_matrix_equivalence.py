@@ -0,0 +1,67 @@
+# test_matrix_equivalence.py
+#
+# analyze_site_matrix должен давать те же числа, что и analyze_tx_to_rx по каждой паре TX×RX,
+# включая пары на одной вертикали, с нулевым расстоянием и в ближней зоне (фикстура site — conftest.py).
+#
+# Запуск: python -m pytest -q
+
+import numpy as np
+import pytest
+
+SCALAR_FIELDS = ('distance_m', 'az_diff_tx', 'el_diff_tx', 'az_diff_rx', 'el_diff_rx', 'gt', 'gr',
+                 'Pint', 'polar_loss', 'fspl', 'prx_dbm')
+
+
+def _assert_same(a, b, where):
+    if a is None or b is None:
+        assert a is None and b is None, where
+        return
+    if isinstance(a, dict):
+        assert a.keys() == b.keys(), where
+        for key in a:
+            _assert_same(a[key], b[key], f"{where}.{key}")
+        return
+    if isinstance(a, (bool, np.bool_)):
+        assert bool(a) == bool(b), where
+        return
+    assert b == pytest.approx(a, rel=1e-9, abs=1e-9, nan_ok=True), where
+
+
+def test_emc_matrix_matches_scalar(site):
+    from ems_local_analyzer import analyze_tx_to_rx
+    from ems_matrix import analyze_site_matrix
+    tx_list, rx_list = site['tx_list'], site['rx_list']
+    matrix = analyze_site_matrix(tx_list, rx_list)
+    n_zero = 0
+    for i, tx in enumerate(tx_list):
+        for j, rx in enumerate(rx_list):
+            where = f"TX #{i + 1} -> RX #{j + 1}"
+            try:
+                expected = analyze_tx_to_rx(tx, rx)
+            except ValueError:  # нулевое расстояние: матрица помечает пару недействительной
+                n_zero += 1
+                assert not matrix['valid'][i, j], where
+                assert np.isnan(matrix['Pint'][i, j]), where
+                with pytest.raises(ValueError):
+                    matrix.pair(i, j)
+                continue
+            assert matrix['valid'][i, j], where
+            actual = matrix.pair(i, j)
+            for key in SCALAR_FIELDS:
+                _assert_same(expected[key], actual[key], f"{where}: {key}")
+            _assert_same(expected['block_result'], actual['block_result'], f"{where}: block_result")
+            _assert_same(expected['induced_result'], actual['induced_result'], f"{where}: induced_result")
+    assert n_zero == np.count_nonzero(~matrix['valid'])
+
+
+def test_zero_distance_pair_is_invalid(site):
+    from ems_local_analyzer import analyze_tx_to_rx
+    from ems_matrix import analyze_site_matrix
+    tx = site['tx_list'][0]
+    rx = dict(site['rx_list'][0], coords=tx['coords'])
+    with pytest.raises(ValueError):
+        analyze_tx_to_rx(tx, rx)
+    matrix = analyze_site_matrix([tx], [rx])
+    assert not matrix['valid'][0, 0]
+    assert np.isnan(matrix['Pint'][0, 0]) and np.isnan(matrix['distance_m'][0, 0])
+    assert not matrix['block_considered'][0, 0] and not matrix['induced_considered'][0, 0]
@@ -0,0 +1,70 @@
+# test_site_validation.py
+#
+# validate_site (весь сайт за один проход) и process_unit (юнит за юнитом) должны одинаково решать,
+# какой юнит ошибочен: иначе process_site после «чистого» отчёта падает на первой ошибке process_unit.
+
+import copy
+import pytest
+
+DEVICE_FILE = "DeviceDB.xlsx"
+ANTENNA_FILE = "AntennaDN.xlsx"
+
+# (роль, изменения юнита); None — ключ удаляется
+UNIT_CASES = [
+    ('tx', {}),
+    ('rx', {}),
+    ('tx', {'BW_khz': 25.0000001}),
+    ('tx', {'BW_khz': 7}),
+    ('tx', {'BW_khz': '25'}),
+    ('tx', {'BW_khz': None}),
+    ('rx', {'BW_khz': 12.5000001}),
+    ('tx', {'power_dbm': 1000}),
+    ('tx', {'power_dbm': '44'}),
+    ('tx', {'power_dbm': None}),
+    ('tx', {'frequency_mhz': 1e6}),
+    ('rx', {'frequency_mhz': -5}),
+    ('rx', {'sensitivity_dbm': 100}),
+    ('rx', {'sensitivity_dbm': 'low'}),
+    ('tx', {'device_name': 'No_Such_Device'}),
+    ('rx', {'antenna_name': 'No_Such_Antenna'}),
+    ('tx', {'power_dbm': ..., 'frequency_mhz': ..., 'BW_khz': ...}),
+]
+
+
+def _unit(role, changes):
+    from site_config import site
+    unit = copy.deepcopy(site[f'{role}_list'][0])
+    for key, value in changes.items():
+        if value is ...:
+            unit.pop(key, None)
+        else:
+            unit[key] = value
+    return unit
+
+
+@pytest.mark.parametrize("role, changes", UNIT_CASES, ids=[f"{r}-{c}" for r, c in UNIT_CASES])
+def test_validate_site_agrees_with_process_unit(role, changes):
+    from site_loader import process_unit
+    from site_validation import validate_site
+    unit = _unit(role, changes)
+    report = validate_site({'tx_list': [unit]} if role == 'tx' else {'rx_list': [unit]}, DEVICE_FILE, ANTENNA_FILE)
+    try:
+        process_unit(copy.deepcopy(unit), DEVICE_FILE, ANTENNA_FILE, index=0, role=role)
+        rejected = False
+    except (ValueError, TypeError):
+        rejected = True
+    assert (not report.ok) == rejected, report.format()
+
+
+def test_process_site_reports_every_bad_unit():
+    from site_config import site
+    from site_loader import process_site
+    from site_validation import SiteValidationError
+    bad = copy.deepcopy(site)
+    bad['tx_list'][0]['BW_khz'] = 25.0000001
+    bad['tx_list'][1]['power_dbm'] = 1000
+    bad['rx_list'][0]['device_name'] = 'No_Such_Device'
+    with pytest.raises(SiteValidationError) as info:
+        process_site(bad, DEVICE_FILE, ANTENNA_FILE)
+    fields = {(i.role, i.index, i.field) for i in info.value.report.errors}
+    assert fields == {('tx', 0, 'BW_khz'), ('tx', 1, 'power_dbm'), ('rx', 0, 'device_name')}
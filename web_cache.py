@@ -0,0 +1,164 @@
+# web_cache.py
+#
+# Кэши веб-приложения (im3_web.py). Живут на уровне процесса Streamlit и переживают перезапуски скрипта:
+#   - каталог (списки устройств/антенн) — снимок CatalogRegistry, который следит за файлами в фоне;
+#   - проверка юнита (process_unit) — по хэшу его входных параметров;
+#   - результаты анализов и PNG графиков — по хэшу всего набора входных данных.
+# Все ключи включают версию каталога: при изменении DeviceDB.xlsx / AntennaDN.xlsx реестр перечитывает
+# изменившуюся книгу, увеличивает версию, и зависимые кэши сбрасываются.
+
+import io
+import json
+import hashlib
+from pattern_cache import LRUCache, PATTERN_CACHE, LIBRARY_CACHE
+from catalog_registry import CatalogRegistry
+from site_loader import process_unit
+
+DEVICE_FILE = "DeviceDB.xlsx"
+ANTENNA_FILE = "AntennaDN.xlsx"
+
+# Входные параметры юнита, от которых зависит результат process_unit
+UNIT_INPUT_KEYS = ('device_name', 'antenna_name', 'power_dbm', 'frequency_mhz', 'BW_khz', 'sensitivity_dbm',
+                   'azimuth', 'elevation', 'coords', 'loss', 'EN_dBm', 'ACS')
+
+
+class SizedLRUCache(LRUCache):
+    """LRU-кэш с ограничением и по числу записей, и по суммарному размеру значений (байты)"""
+
+    def __init__(self, maxsize=64, max_bytes=64 * 1024 * 1024, sizeof=len):
+        super().__init__(maxsize)
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self.sizeof(self._data[key])
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self.nbytes += self.sizeof(value)
+            while len(self._data) > self.maxsize or (self.nbytes > self.max_bytes and len(self._data) > 1):
+                _, old = self._data.popitem(last=False)
+                self.nbytes -= self.sizeof(old)
+                self.evictions += 1
+
+    def clear(self):
+        super().clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return dict(super().stats(), nbytes=self.nbytes, max_bytes=self.max_bytes)
+
+
+CATALOG_CACHE = LRUCache(maxsize=4)
+VALIDATION_CACHE = LRUCache(maxsize=512)
+RESULT_CACHE = LRUCache(maxsize=64)
+FIGURE_CACHE = SizedLRUCache(maxsize=32, max_bytes=32 * 1024 * 1024)
+
+# Кэши, производные от каталога; LIBRARY_CACHE (ключ — mtime книги) реестр заполняет сам при перечитывании
+DERIVED_CACHES = (CATALOG_CACHE, VALIDATION_CACHE, RESULT_CACHE, FIGURE_CACHE, PATTERN_CACHE)
+
+REGISTRY = CatalogRegistry(DEVICE_FILE, ANTENNA_FILE)
+
+_state = {'catalog_version': None, 'invalidations': 0, 'last_invalidation': None}
+
+
+def input_hash(*parts):
+    """Стабильный хэш произвольных входных данных (dict/list/числа/строки)"""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def catalog():
+    """Текущий снимок каталога (CatalogSnapshot); при первом вызове запускает наблюдение за файлами"""
+    if not REGISTRY.watching:
+        REGISTRY.start()
+    snapshot = REGISTRY.snapshot()
+    if _state['catalog_version'] is not None and snapshot.version != _state['catalog_version']:
+        clear_all(reason=f"каталог змінено (v{snapshot.version})", derived_only=True)
+    _state['catalog_version'] = snapshot.version
+    return snapshot
+
+
+def catalog_version():
+    """
+    Версия каталога — номер снимка CatalogRegistry. При изменении версии производные кэши сбрасываются,
+    а счётчик invalidations увеличивается (видно в боковой панели).
+    """
+    return catalog().version
+
+
+def clear_all(reason="вручну", derived_only=False):
+    for cache in DERIVED_CACHES if derived_only else DERIVED_CACHES + (LIBRARY_CACHE,):
+        cache.clear()
+    _state['invalidations'] += 1
+    _state['last_invalidation'] = reason
+
+
+def catalog_names():
+    """(DEVICE_NAMES, ANTENNA_NAMES) для выпадающих списков"""
+    snapshot = catalog()
+    return CATALOG_CACHE.get_or_load(('names', snapshot.version), lambda: (
+        snapshot.device_names, snapshot.antenna_names))
+
+
+def validate_unit(unit, role, index=None):
+    """
+    process_unit с кэшем по хэшу входных параметров юнита.
+    Дополняет unit результатами проверки; при ошибке бросает ValueError (тоже из кэша).
+    """
+    inputs = {k: unit[k] for k in UNIT_INPUT_KEYS if k in unit}
+    snapshot = catalog()
+    key = input_hash('unit', role, index, inputs, snapshot.version)
+
+    def run():
+        work = dict(inputs)
+        try:
+            process_unit(work, snapshot.devices, ANTENNA_FILE, index=index, role=role)
+        except ValueError as e:
+            return ('error', str(e))
+        return ('ok', work)
+
+    status, payload = VALIDATION_CACHE.get_or_load(key, run)
+    if status == 'error':
+        raise ValueError(payload)
+    unit.update(payload)
+    return unit
+
+
+def cached_result(kind, inputs, compute):
+    """Результат анализа по хэшу (kind, inputs, версия каталога)"""
+    key = input_hash(kind, inputs, catalog_version())
+    return RESULT_CACHE.get_or_load(key, compute)
+
+
+def cached_figure_png(kind, inputs, make_figure, dpi=100):
+    """PNG графика по хэшу входных данных; make_figure() вызывается только при промахе"""
+    key = input_hash('figure', kind, inputs, catalog_version())
+
+    def render():
+        import matplotlib.pyplot as plt
+        fig = make_figure()
+        buf = io.BytesIO()
+        fig.savefig(buf, format='png', dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+        return buf.getvalue()
+
+    return FIGURE_CACHE.get_or_load(key, render)
+
+
+def cache_stats():
+    return {
+        'catalog': CATALOG_CACHE.stats(),
+        'catalog_version': REGISTRY.version,
+        'catalog_reloads': REGISTRY.reloads,
+        'catalog_error': REGISTRY.last_error,
+        'catalog_watch': REGISTRY.mode,
+        'patterns': PATTERN_CACHE.stats(),
+        'validation': VALIDATION_CACHE.stats(),
+        'results': RESULT_CACHE.stats(),
+        'figures': FIGURE_CACHE.stats(),
+        'invalidations': _state['invalidations'],
+        'last_invalidation': _state['last_invalidation'],
+    }